@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends
+import json
+import time
+from typing import AsyncIterator
+
+from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 
+from app.core.metrics import metrics
 from app.db.session import get_session
+from app.llm.orchestrator import AgentEvent
 from app.services.conversation_service import ConversationService
 
 router = APIRouter()
@@ -14,10 +22,43 @@ class ChatIn(BaseModel):
 @router.post("/chat")
 async def chat(
     payload: ChatIn,
+    background: BackgroundTasks,
     session: AsyncSession = Depends(get_session),
     svc: ConversationService = Depends(ConversationService.depends),
 ):
     text = await svc.handle_message(
         session=session, user_id=payload.user_id, from_number=payload.user_id, body=payload.message
     )
-    return {"reply": text}
\ No newline at end of file
+    # la compactación del historial corre después de enviar la respuesta
+    background.add_task(svc.compact_history, payload.user_id)
+    return {"reply": text}
+
+def _sse(event: AgentEvent) -> str:
+    return f"event: {event.type}\ndata: {json.dumps(event.data, ensure_ascii=False)}\n\n"
+
+async def _event_stream(svc: ConversationService, payload: ChatIn) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    # primer byte inmediato: el widget muestra "escribiendo..." sin esperar al modelo
+    yield ": ok\n\n"
+    first_token = True
+    async for event in svc.stream_message(payload.user_id, payload.message):
+        if first_token and event.type in ("token", "reply"):
+            metrics.observe("chat_stream_first_token_seconds", time.perf_counter() - started)
+            first_token = False
+        yield _sse(event)
+
+@router.post("/chat/stream")
+async def chat_stream(
+    payload: ChatIn,
+    svc: ConversationService = Depends(ConversationService.depends),
+):
+    """
+    Server-Sent Events: ``tool_start``/``tool_end`` (progreso), ``token`` (texto de la
+    respuesta final a medida que llega) y ``reply`` con el texto completo ya persistido.
+    """
+    return StreamingResponse(
+        _event_stream(svc, payload),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(svc.compact_history, payload.user_id),
+    )
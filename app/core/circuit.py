@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+import structlog
+
+from app.core.metrics import metrics
+
+log = structlog.get_logger()
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Tras `failure_threshold` fallos seguidos se abre y las llamadas van directo al
+    fallback. Con `probe`, la recuperación se verifica en background cada
+    `reset_timeout_s` sin gastar peticiones reales; sin `probe`, tras el timeout se
+    deja pasar una sola petición de prueba (half-open).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout_s: float = 10.0,
+        probe: Callable[[], Awaitable[Any]] | None = None,
+        probe_timeout_s: float = 2.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.probe_timeout_s = probe_timeout_s
+        self._probe = probe
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_task: asyncio.Task | None = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        if self._state == CLOSED:
+            return True
+        if (
+            self._state == OPEN
+            and self._probe is None
+            and time.monotonic() - self._opened_at >= self.reset_timeout_s
+        ):
+            self._set_state(HALF_OPEN)
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self._state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+            self._open()
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+        if self._probe is not None and (self._probe_task is None or self._probe_task.done()):
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def _probe_loop(self) -> None:
+        while self._state == OPEN:
+            await asyncio.sleep(self.reset_timeout_s)
+            try:
+                await asyncio.wait_for(self._probe(), self.probe_timeout_s)
+            except Exception:
+                continue
+            self.record_success()
+
+    def _set_state(self, state: str) -> None:
+        log.warning("circuit_state", circuit=self.name, state=state, failures=self._failures)
+        self._state = state
+        metrics.set_gauge("circuit_state", _STATE_VALUE[state], circuit=self.name)
+        metrics.inc("circuit_transitions_total", circuit=self.name, state=state)
+
+    def close(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
@@ -8,10 +8,31 @@ class Settings(BaseSettings):
 
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-4o-mini"
-    
+    OPENAI_BASE_URL: str | None = None
+    # Pool HTTP compartido del cliente OpenAI
+    OPENAI_MAX_CONNECTIONS: int = 50
+    OPENAI_MAX_KEEPALIVE: int = 20
+    OPENAI_KEEPALIVE_EXPIRY_S: float = 30.0
+    OPENAI_CONNECT_TIMEOUT_S: float = 5.0
+    OPENAI_TIMEOUT_S: float = 60.0
+    OPENAI_MAX_RETRIES: int = 3
+    OPENAI_RETRY_BACKOFF_S: float = 0.5
+
     QDRANT_URL: str = "http://qdrant:6333"
     QDRANT_COLLECTION: str = "kavak_knowledge"
+    QDRANT_TIMEOUT_S: int = 2
+    # Circuit breaker: fallos seguidos para abrir y cada cuánto probar recuperación
+    QDRANT_CB_FAILURES: int = 3
+    QDRANT_CB_RESET_S: float = 10.0
     EMBED_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # Carga el modelo de embeddings al arrancar (si no, se carga en la primera consulta)
+    EMBED_WARMUP: bool = False
+    EMBED_CACHE_SIZE: int = 2048
+    EMBED_CACHE_REDIS_TTL_S: int = 604_800
+    # Micro-batching de inferencia fuera del event loop
+    EMBED_MAX_BATCH: int = 32
+    EMBED_MAX_WAIT_MS: float = 5.0
+    EMBED_THREADS: int = 2
 
 
     DATABASE_URL: str
@@ -20,8 +41,76 @@ class Settings(BaseSettings):
     TWILIO_ACCOUNT_SID: str
     TWILIO_AUTH_TOKEN: str
     TWILIO_WHATSAPP_FROM: str
+    TWILIO_MAX_CONNECTIONS: int = 20
+    TWILIO_MAX_RETRIES: int = 3
+    TWILIO_RETRY_BACKOFF_S: float = 0.5
+    TWILIO_RETRY_AFTER_MAX_S: float = 30.0
+    # Límite por cuenta (mensajes/s) en cada proceso
+    TWILIO_RATE_PER_S: float = 10.0
+    TWILIO_RATE_BURST: int = 10
+    # Respuestas largas se parten en viñetas (WhatsApp corta en 1600 caracteres)
+    TWILIO_SPLIT_SEGMENTS: bool = True
+    TWILIO_SEGMENT_MAX_CHARS: int = 1500
+    # Worker: enviar el primer segmento mientras el modelo sigue generando
+    WHATSAPP_STREAM_SEGMENTS: bool = False
+    WHATSAPP_FIRST_SEGMENT_MIN_CHARS: int = 200
+
+    # Mensajes en vuelo por proceso worker (usuarios distintos en paralelo)
+    WORKER_CONCURRENCY: int = 16
+
+    # Redis Streams: reintentos, DLQ y recorte
+    QUEUE_MAXLEN: int = 100_000
+    QUEUE_RETENTION_S: int = 86_400
+    QUEUE_MAX_DELIVERIES: int = 5
+    QUEUE_RETRY_BASE_MS: int = 30_000
+    QUEUE_RETRY_MAX_MS: int = 600_000
+    QUEUE_RECLAIM_INTERVAL_S: float = 5.0
+
+    # Vocabulario make/model para normalize_make_model
+    VOCAB_CACHE_TTL_S: float = 300.0
+    VOCAB_REDIS_TTL_S: int = 86_400
 
     RAG_TOP_K: int = 4
+    # Tope al top_k que pide el LLM (cada chunk extra cuesta tokens y latencia)
+    RAG_TOP_K_MAX: int = 6
+    # Candidatos por retriever (denso y léxico) antes de fusionar con RRF
+    RAG_CANDIDATES: int = 12
+    RAG_RRF_K: int = 60
+    RAG_RERANK: bool = False
+    RAG_RERANK_MODEL: str = "Xenova/ms-marco-MiniLM-L-6-v2"
+    RAG_RERANK_BUDGET_MS: float = 150.0
     HISTORY_MAX_TURNS: int = 12
+    # Conversaciones inactivas expiran (historial, resumen y estado)
+    SESSION_TTL_S: int = 7 * 24 * 3600
+
+    # Presupuesto de contexto: "tiktoken" o "heuristic" (~3.5 caracteres por token)
+    TOKENIZER: str = "tiktoken"
+    HISTORY_TOKEN_BUDGET: int = 1200
+    # Mensajes recientes que se conservan literales al compactar el historial
+    HISTORY_KEEP_MESSAGES: int = 4
+    # Sólo se compacta cuando hay al menos estos mensajes viejos por resumir:
+    # evita una llamada de resumen en cada turno cerca del presupuesto
+    HISTORY_COMPACT_MIN_MESSAGES: int = 6
+    # Tope de seguridad del historial en Redis, muy por encima de la ventana de
+    # compactación: sólo recorta si la compactación falla de forma persistente
+    HISTORY_STORE_MAX_MESSAGES: int = 200
+    HISTORY_SUMMARY_MAX_TOKENS: int = 250
+    TOOL_TIMEOUT_S: float = 8.0
+    TOOL_CACHE_SIZE: int = 2048
+    TOOL_CACHE_TTL_S: float = 600.0
+    TOOL_CACHE_REDIS_TTL_S: int = 3600
+
+    # Cache semántico de respuestas a preguntas de conocimiento
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_TTL_S: float = 3600.0
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+
+    # Tope del conteo de resultados de search_catalog (más allá se reporta "N+")
+    CATALOG_COUNT_CAP: int = 200
+    # "sql" (Postgres) o "memory" (snapshot columnar en proceso, ver app.tools.catalog_memory)
+    CATALOG_ENGINE: str = "sql"
+    # Cada cuánto el motor en memoria revisa version:catalog
+    CATALOG_MEMORY_CHECK_S: float = 5.0
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any
+
+# Métricas en proceso (sin dependencias externas). Se exponen en /metrics y
+# se pueden raspar o loguear; en prod se reemplazaría por Prometheus/OTel.
+
+LabelKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict[str, Any]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt(key: LabelKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    inner = ",".join(f"{k}={v}" for k, v in labels)
+    return f"{name}{{{inner}}}"
+
+
+@dataclass
+class _Timing:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._counters: dict[LabelKey, float] = defaultdict(float)
+        self._gauges: dict[LabelKey, float] = {}
+        self._timings: dict[LabelKey, _Timing] = defaultdict(_Timing)
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        self._counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        t = self._timings[_key(name, labels)]
+        t.count += 1
+        t.total += value
+        t.max = max(t.max, value)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        return self._counters.get(_key(name, labels), 0.0)
+
+    def gauge(self, name: str, **labels: Any) -> float:
+        return self._gauges.get(_key(name, labels), 0.0)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        return {
+            "counters": {_fmt(k): v for k, v in self._counters.items()},
+            "gauges": {_fmt(k): v for k, v in self._gauges.items()},
+            "timings": {
+                _fmt(k): {"count": t.count, "avg": t.total / t.count if t.count else 0.0, "max": t.max}
+                for k, t in self._timings.items()
+            },
+        }
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._gauges.clear()
+        self._timings.clear()
+
+
+metrics = Metrics()
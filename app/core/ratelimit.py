@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Rate limiter en proceso: ``rate`` permisos por segundo con ráfagas de hasta ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Espera un permiso; devuelve los segundos esperados."""
+        waited = 0.0
+        # el lock mantiene el orden FIFO entre quienes esperan
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited = delay
+                self._refill()
+            self._tokens -= 1
+        return waited
@@ -0,0 +1,19 @@
+from redis.asyncio import Redis
+
+# Sellos de versión compartidos entre procesos (API, workers, scripts).
+# Los scripts de carga los incrementan y los caches los usan para invalidarse.
+CATALOG = "catalog"
+KNOWLEDGE = "knowledge"
+
+
+def _key(name: str) -> str:
+    return f"version:{name}"
+
+
+async def get_version(redis: Redis, name: str) -> int:
+    raw = await redis.get(_key(name))
+    return int(raw) if raw else 0
+
+
+async def bump_version(redis: Redis, name: str) -> int:
+    return int(await redis.incr(_key(name)))
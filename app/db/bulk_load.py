@@ -0,0 +1,200 @@
+import json
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, AsyncIterable, Iterable
+
+from sqlalchemy import bindparam, delete, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.db.models import Car
+
+# Sincronización del catálogo (cars) contra un feed completo, en una sola transacción:
+# - Postgres: COPY (asyncpg copy_records_to_table) a una tabla staging temporal y
+#   diff en SQL (UPDATE / DELETE / INSERT) keyed en external_id
+# - SQLite/dev: el mismo diff calculado en Python
+# Los lectores ven el catálogo anterior hasta el COMMIT: no hay ventana vacía.
+
+CAR_COLUMNS = (
+    "external_id",
+    "make",
+    "model",
+    "year",
+    "price_mxn",
+    "city",
+    "mileage_km",
+    "transmission",
+    "fuel",
+    "body_type",
+    "features",
+)
+# Columnas comparadas para decidir si un auto cambió
+_DATA_COLUMNS = CAR_COLUMNS[1:]
+
+CarRecord = tuple[Any, ...]  # en el orden de CAR_COLUMNS; features es dict | None
+
+_STAGING = "cars_staging"
+
+_STAGING_DDL = f"""
+CREATE TEMP TABLE {_STAGING} (
+    external_id bigint,
+    make varchar(64),
+    model varchar(64),
+    year integer,
+    price_mxn numeric(12, 2),
+    city varchar(64),
+    mileage_km integer,
+    transmission varchar(32),
+    fuel varchar(32),
+    body_type varchar(32),
+    features json
+) ON COMMIT DROP
+"""
+
+# Si el feed repite un external_id, gana la última fila
+_DEDUP_SQL = f"""
+DELETE FROM {_STAGING} a USING {_STAGING} b
+WHERE a.external_id = b.external_id AND a.ctid < b.ctid
+"""
+
+_UPDATE_SQL = f"""
+UPDATE cars c SET {", ".join(f"{col} = s.{col}" for col in _DATA_COLUMNS)}
+FROM {_STAGING} s
+WHERE c.external_id = s.external_id
+  AND ({", ".join(f"c.{col}" for col in _DATA_COLUMNS[:-1])}, c.features::jsonb)
+      IS DISTINCT FROM ({", ".join(f"s.{col}" for col in _DATA_COLUMNS[:-1])}, s.features::jsonb)
+"""
+
+# Filas sin external_id no tienen llave: se reemplazan completas en cada sync, también
+# con remove_missing=False (si no, un feed parcial las duplicaría en cada corrida)
+_DELETE_UNKEYED_SQL = "DELETE FROM cars WHERE external_id IS NULL"
+
+_DELETE_MISSING_SQL = f"""
+DELETE FROM cars c
+WHERE c.external_id IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM {_STAGING} s WHERE s.external_id = c.external_id)
+"""
+
+_INSERT_SQL = f"""
+INSERT INTO cars ({", ".join(CAR_COLUMNS)})
+SELECT {", ".join(f"s.{col}" for col in CAR_COLUMNS)} FROM {_STAGING} s
+WHERE s.external_id IS NULL
+   OR NOT EXISTS (SELECT 1 FROM cars c WHERE c.external_id = s.external_id)
+"""
+
+
+@dataclass(frozen=True)
+class LoadResult:
+    staged: int
+    inserted: int
+    updated: int
+    removed: int
+
+    @property
+    def unchanged(self) -> int:
+        return self.staged - self.inserted - self.updated
+
+
+async def _batches(source: Iterable[list[CarRecord]] | AsyncIterable[list[CarRecord]]):
+    if hasattr(source, "__aiter__"):
+        async for batch in source:
+            yield batch
+    else:
+        for batch in source:
+            yield batch
+
+
+async def _load_postgres(
+    conn: AsyncConnection,
+    batches: Iterable[list[CarRecord]] | AsyncIterable[list[CarRecord]],
+    remove_missing: bool,
+) -> LoadResult:
+    # un solo loader a la vez
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('cars_sync'))"))
+    await conn.execute(text(_STAGING_DDL))
+
+    raw = (await conn.get_raw_connection()).driver_connection
+    staged = 0
+    async for batch in _batches(batches):
+        records = [r[:-1] + (json.dumps(r[-1], ensure_ascii=False) if r[-1] is not None else None,) for r in batch]
+        await raw.copy_records_to_table(_STAGING, records=records, columns=list(CAR_COLUMNS))
+        staged += len(records)
+
+    deduped = (await conn.execute(text(_DEDUP_SQL))).rowcount
+    updated = (await conn.execute(text(_UPDATE_SQL))).rowcount
+    removed = (await conn.execute(text(_DELETE_UNKEYED_SQL))).rowcount
+    if remove_missing:
+        removed += (await conn.execute(text(_DELETE_MISSING_SQL))).rowcount
+    inserted = (await conn.execute(text(_INSERT_SQL))).rowcount
+    return LoadResult(staged=staged - deduped, inserted=inserted, updated=updated, removed=removed)
+
+
+def _normalize(v: Any) -> Any:
+    # Numeric vuelve como Decimal; se compara por valor (250000.00 == 250000)
+    if isinstance(v, (Decimal, float)):
+        return Decimal(str(v)).normalize()
+    return v
+
+
+async def _load_generic(
+    conn: AsyncConnection,
+    batches: Iterable[list[CarRecord]] | AsyncIterable[list[CarRecord]],
+    remove_missing: bool,
+) -> LoadResult:
+    keyed: dict[int, CarRecord] = {}
+    unkeyed: list[CarRecord] = []
+    async for batch in _batches(batches):
+        for r in batch:
+            if r[0] is None:
+                unkeyed.append(r)
+            else:
+                keyed[r[0]] = r
+
+    cols = [getattr(Car, c) for c in _DATA_COLUMNS]
+    existing = (await conn.execute(select(Car.id, Car.external_id, *cols).where(Car.external_id.is_not(None)))).all()
+
+    updates: list[dict[str, Any]] = []
+    remove_ids: list[int] = []
+    seen: set[int] = set()
+    for row in existing:
+        rec = keyed.get(row.external_id)
+        if rec is None:
+            remove_ids.append(row.id)
+            continue
+        seen.add(row.external_id)
+        current = tuple(row[2:])
+        if tuple(_normalize(v) for v in current) != tuple(_normalize(v) for v in rec[1:]):
+            updates.append({"_id": row.id, **{f"_{c}": v for c, v in zip(_DATA_COLUMNS, rec[1:])}})
+
+    if updates:
+        cars = Car.__table__
+        stmt = update(cars).where(cars.c.id == bindparam("_id")).values({c: bindparam(f"_{c}") for c in _DATA_COLUMNS})
+        await conn.execute(stmt, updates)
+    updated = len(updates)
+
+    # sin llave: se reemplazan en ambos modos (ver _DELETE_UNKEYED_SQL)
+    removed = (await conn.execute(delete(Car).where(Car.external_id.is_(None)))).rowcount
+    if remove_missing and remove_ids:
+        removed += (await conn.execute(delete(Car).where(Car.id.in_(remove_ids)))).rowcount
+
+    new = [r for k, r in keyed.items() if k not in seen] + unkeyed
+    if new:
+        await conn.execute(insert(Car.__table__), [dict(zip(CAR_COLUMNS, r)) for r in new])
+
+    return LoadResult(staged=len(keyed) + len(unkeyed), inserted=len(new), updated=updated, removed=removed)
+
+
+async def sync_cars(
+    engine: AsyncEngine,
+    batches: Iterable[list[CarRecord]] | AsyncIterable[list[CarRecord]],
+    remove_missing: bool = True,
+) -> LoadResult:
+    """
+    Aplica un feed de autos (lotes de ``CarRecord``) a la tabla cars de forma atómica:
+    inserta los external_id nuevos, actualiza los que cambiaron y, con
+    ``remove_missing``, borra los que ya no vienen en el feed. Las filas sin
+    external_id se reemplazan siempre por las del feed.
+    """
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            return await _load_postgres(conn, batches, remove_missing)
+        return await _load_generic(conn, batches, remove_missing)
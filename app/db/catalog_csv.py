@@ -0,0 +1,241 @@
+import csv
+import math
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Any, Iterator
+
+from app.db.bulk_load import CarRecord
+
+# Parseo/validación del CSV de inventario. Sin dependencias de Settings ni de la DB:
+# se importa en los procesos del pool de parseo (ver parse_range).
+
+# price_mxn es numeric(12,2), year/mileage_km integer y external_id bigint: fuera de
+# rango el COPY abortaría la carga completa
+_MAX_PRICE = Decimal(10) ** 10
+_MAX_INT32 = 2**31 - 1
+_MAX_INT64 = 2**63 - 1
+_MIN_YEAR = 1900
+
+
+def _strip(v: Any) -> str:
+    return str(v).strip() if v is not None else ""
+
+
+def _to_int(v: Any) -> int | None:
+    s = _strip(v)
+    if not s:
+        return None
+    try:
+        # soporta "77,400" o "77400.0"
+        s = s.replace(",", "")
+        f = float(s)
+    except ValueError:
+        return None
+    # "nan"/"inf" son float válidos pero no enteros
+    return int(f) if math.isfinite(f) else None
+
+
+def _to_decimal(v: Any) -> Decimal | None:
+    s = _strip(v)
+    if not s:
+        return None
+    try:
+        # soporta "461999.0" y "461,999.0"
+        s = s.replace(",", "")
+        d = Decimal(s)
+    except (InvalidOperation, ValueError):
+        return None
+    return d if d.is_finite() else None
+
+
+def _to_bool(v: Any) -> bool | None:
+    s = _strip(v).lower()
+    if not s:
+        return None
+    if s in {"si", "sí", "true", "1", "yes", "y"}:
+        return True
+    if s in {"no", "false", "0", "n"}:
+        return False
+    return None
+
+
+def sniff_delimiter(csv_path: str) -> str:
+    # intenta detectar si es ',' o ';'
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        sample = f.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=[",", ";", "\t"])
+        return dialect.delimiter
+    except Exception:
+        return ","
+
+
+def validate_row(row: dict[str, Any]) -> tuple[CarRecord | None, str | None]:
+    """Fila del CSV -> (``CarRecord`` en orden de CAR_COLUMNS, None) o (None, motivo de rechazo)."""
+    make = _strip(row.get("make"))
+    model = _strip(row.get("model"))
+    year = _to_int(row.get("year"))
+
+    # Soporta price o price_mxn
+    price = _to_decimal(row.get("price")) or _to_decimal(row.get("price_mxn"))
+
+    # Filtros mínimos de calidad
+    if not make:
+        return None, "missing_make"
+    if not model:
+        return None, "missing_model"
+    if not year or not _MIN_YEAR <= year <= date.today().year + 1:
+        return None, "invalid_year"
+    if not price or price <= 0 or price >= _MAX_PRICE:
+        return None, "invalid_price"
+
+    # Soporta km o mileage_km
+    mileage = _to_int(row.get("km")) or _to_int(row.get("mileage_km"))
+    if mileage is not None and not 0 <= mileage <= _MAX_INT32:
+        return None, "invalid_mileage"
+
+    stock_id = _to_int(row.get("stock_id"))
+    if stock_id is not None and not -_MAX_INT64 - 1 <= stock_id <= _MAX_INT64:
+        return None, "invalid_stock_id"
+
+    # Algunos CSV no traen city; default demo
+    city = _strip(row.get("city")) or "N/A"
+
+    # Extras a features (para no perder info)
+    features = {
+        "stock_id": stock_id,
+        "version": _strip(row.get("version")),
+        "bluetooth": _to_bool(row.get("bluetooth")),
+        "car_play": _to_bool(row.get("car_play")),
+        "largo": _to_int(row.get("largo")),
+        "ancho": _to_int(row.get("ancho")),
+        "altura": _to_int(row.get("altura")),
+    }
+
+    # limpia features vacías
+    features = {k: v for k, v in features.items() if v not in (None, "", [])}
+
+    record = (
+        features.get("stock_id"),
+        make,
+        model,
+        year,
+        price,
+        city,
+        mileage,
+        _strip(row.get("transmission")) or None,
+        _strip(row.get("fuel")) or None,
+        _strip(row.get("body_type")) or None,
+        features or None,
+    )
+    return record, None
+
+
+def parse_row(row: dict[str, Any]) -> CarRecord | None:
+    return validate_row(row)[0]
+
+
+@dataclass(frozen=True)
+class RejectedRow:
+    # línea (parseo secuencial) u offset en bytes (parseo por rangos) de la fila
+    position: int
+    reason: str
+    raw: str
+
+
+@dataclass
+class ParsedChunk:
+    rows_read: int = 0
+    records: list[CarRecord] = field(default_factory=list)
+    rejected: list[RejectedRow] = field(default_factory=list)
+
+
+def _check(header: list[str], values: list[str], position: int, raw: str, out: ParsedChunk) -> None:
+    out.rows_read += 1
+    if len(values) != len(header):
+        out.rejected.append(RejectedRow(position, "malformed", raw))
+        return
+    try:
+        record, reason = validate_row(dict(zip(header, values)))
+    except Exception:
+        # una celda inesperada no debe tumbar la carga (ni el proceso del pool)
+        record, reason = None, "malformed"
+    if record is None:
+        out.rejected.append(RejectedRow(position, reason or "invalid", raw))
+    else:
+        out.records.append(record)
+
+
+def normalize_header(values: list[str]) -> list[str]:
+    # BOM de Excel y espacios alrededor de los nombres de columna
+    return [v.replace("\ufeff", "").strip() for v in values]
+
+
+def iter_chunks(csv_path: str, delimiter: str, batch_size: int) -> Iterator[ParsedChunk]:
+    """Parseo secuencial por lotes (soporta campos con saltos de línea entre comillas)."""
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = normalize_header(next(reader, []))
+        chunk = ParsedChunk()
+        for values in reader:
+            _check(header, values, reader.line_num, delimiter.join(values), chunk)
+            if len(chunk.records) >= batch_size:
+                yield chunk
+                chunk = ParsedChunk()
+        if chunk.rows_read:
+            yield chunk
+
+
+def read_header(csv_path: str, delimiter: str) -> tuple[list[str], int]:
+    """Encabezado y offset (bytes) donde empiezan los datos."""
+    with open(csv_path, "rb") as f:
+        first = f.readline()
+    header = next(csv.reader([first.decode("utf-8")], delimiter=delimiter))
+    return normalize_header(header), len(first)
+
+
+def byte_ranges(csv_path: str, data_start: int, chunk_bytes: int) -> list[tuple[int, int]]:
+    """
+    Parte el archivo en rangos [start, end) alineados a inicio de línea. Asume que
+    ningún campo entre comillas contiene saltos de línea (si no, usar iter_chunks).
+    """
+    size = os.path.getsize(csv_path)
+    ranges: list[tuple[int, int]] = []
+    with open(csv_path, "rb") as f:
+        start = data_start
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()  # avanza al siguiente inicio de línea
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(csv_path: str, start: int, end: int, header: list[str], delimiter: str) -> ParsedChunk:
+    """Parsea y valida las líneas de [start, end). Corre en un proceso del pool."""
+    with open(csv_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    out = ParsedChunk()
+    positions: list[int] = []
+
+    def lines() -> Iterator[str]:
+        # un solo csv.reader para todo el rango; se registra el offset de cada línea
+        offset = start
+        for raw in data.splitlines(keepends=True):
+            positions.append(offset)
+            offset += len(raw)
+            yield raw.decode("utf-8")
+
+    reader = csv.reader(lines(), delimiter=delimiter)
+    for values in reader:
+        if not values:
+            continue
+        _check(header, values, positions[-1], delimiter.join(values), out)
+    return out
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, Numeric, Text, JSON, BigInteger, Index
+from sqlalchemy import String, Integer, Numeric, Text, JSON, BigInteger, Index, func
 
 class Base(DeclarativeBase):
     pass
@@ -9,20 +9,43 @@ class Car(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     external_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True, index=True)
-    make: Mapped[str] = mapped_column(String(64), index=True)
-    model: Mapped[str] = mapped_column(String(64), index=True)
+    make: Mapped[str] = mapped_column(String(64))
+    model: Mapped[str] = mapped_column(String(64))
     year: Mapped[int] = mapped_column(Integer, index=True)
-    price_mxn: Mapped[float] = mapped_column(Numeric(12, 2), index=True)
-    city: Mapped[str] = mapped_column(String(64), index=True)
+    price_mxn: Mapped[float] = mapped_column(Numeric(12, 2))
+    city: Mapped[str] = mapped_column(String(64))
     mileage_km: Mapped[int | None] = mapped_column(Integer, nullable=True)
     transmission: Mapped[str | None] = mapped_column(String(32), nullable=True)
     fuel: Mapped[str | None] = mapped_column(String(32), nullable=True)
     body_type: Mapped[str | None] = mapped_column(String(32), nullable=True)
     features: Mapped[dict | None] = mapped_column(JSON, nullable=True)
 
-# Índices compuestos útiles para búsquedas frecuentes
-Index("ix_cars_make_model", Car.make, Car.model)
-Index("ix_cars_make_model_year", Car.make, Car.model, Car.year)
+# Índices compuestos para search_catalog. Los filtros de texto comparan
+# lower(col) = valor en minúsculas (ver app.tools.catalog), por eso los índices
+# son sobre lower(); terminan en (llave de orden, id) para la paginación keyset.
+Index("ix_cars_lmake_price", func.lower(Car.make), Car.price_mxn, Car.id)
+Index("ix_cars_lmake_lmodel_price", func.lower(Car.make), func.lower(Car.model), Car.price_mxn, Car.id)
+Index("ix_cars_lmake_lmodel_year", func.lower(Car.make), func.lower(Car.model), Car.year, Car.id)
+Index("ix_cars_lcity_price", func.lower(Car.city), Car.price_mxn, Car.id)
+Index("ix_cars_price_id", Car.price_mxn, Car.id)
+# Parcial: muchos autos no traen transmisión
+Index(
+    "ix_cars_ltransmission_price",
+    func.lower(Car.transmission),
+    Car.price_mxn,
+    postgresql_where=Car.transmission.is_not(None),
+    sqlite_where=Car.transmission.is_not(None),
+)
+
+# Reemplazados por los índices sobre lower() (init_db los borra)
+OBSOLETE_INDEXES = (
+    "ix_cars_make_model",
+    "ix_cars_make_model_year",
+    "ix_cars_price_mxn",
+    "ix_cars_make",
+    "ix_cars_model",
+    "ix_cars_city",
+)
 
 class KnowledgeChunk(Base):
     __tablename__ = "knowledge_chunks"
@@ -31,4 +54,5 @@ class KnowledgeChunk(Base):
     source: Mapped[str] = mapped_column(String(256), index=True)
     title: Mapped[str | None] = mapped_column(String(256), nullable=True)
     content: Mapped[str] = mapped_column(Text)
-    # Nota: embedding omitido para challenge base (prod: pgvector)
\ No newline at end of file
+    # Nota: embedding omitido para challenge base (prod: pgvector)
+    # En Postgres init_db agrega search_tsv (tsvector español) + GIN; ver app.rag.lexical
\ No newline at end of file
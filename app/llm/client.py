@@ -1,5 +1,112 @@
-from openai import AsyncOpenAI
+import time
+from typing import Any, AsyncIterator
+
+from openai import (
+    APIConnectionError,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    InternalServerError,
+    RateLimitError,
+)
+import httpx
+import structlog
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
 from app.core.config import settings
+from app.core.metrics import metrics
+
+log = structlog.get_logger()
+
+# Un solo cliente por proceso: reutiliza el pool httpx (keep-alive + TLS) entre
+# mensajes en lugar de abrir conexiones nuevas en cada turno.
+_client: AsyncOpenAI | None = None
+_inflight = 0
+
+# APITimeoutError hereda de APIConnectionError
+_RETRYABLE = (APIConnectionError, RateLimitError, InternalServerError)
+
+
+def build_openai_client(base_url: str | None = None) -> AsyncOpenAI:
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_S,
+        ),
+        timeout=httpx.Timeout(settings.OPENAI_TIMEOUT_S, connect=settings.OPENAI_CONNECT_TIMEOUT_S),
+    )
+    # Los reintentos los hace tenacity (create_chat_completion) para no duplicarlos
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=base_url or settings.OPENAI_BASE_URL,
+        http_client=http_client,
+        max_retries=0,
+    )
+
+
+async def init_openai_client() -> AsyncOpenAI:
+    return get_openai_client()
+
 
 def get_openai_client() -> AsyncOpenAI:
-    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
\ No newline at end of file
+    global _client
+    if _client is None:
+        _client = build_openai_client()
+    return _client
+
+
+async def close_openai_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _report_inflight() -> None:
+    metrics.set_gauge("openai_inflight", _inflight)
+    metrics.set_gauge("openai_pool_utilization", _inflight / settings.OPENAI_MAX_CONNECTIONS)
+
+
+async def create_chat_completion(client: AsyncOpenAI | None = None, **kwargs: Any) -> Any:
+    global _inflight
+    client = client or get_openai_client()
+
+    async for attempt in AsyncRetrying(
+        stop=stop_after_attempt(settings.OPENAI_MAX_RETRIES + 1),
+        wait=wait_random_exponential(multiplier=settings.OPENAI_RETRY_BACKOFF_S, max=8.0),
+        retry=retry_if_exception_type(_RETRYABLE),
+        reraise=True,
+    ):
+        with attempt:
+            if attempt.retry_state.attempt_number > 1:
+                metrics.inc("openai_retries_total")
+
+            _inflight += 1
+            _report_inflight()
+            if _inflight > settings.OPENAI_MAX_CONNECTIONS:
+                # La petición espera turno en el pool httpx
+                metrics.inc("openai_pool_saturated_total")
+                log.warning("openai_pool_saturated", inflight=_inflight, max=settings.OPENAI_MAX_CONNECTIONS)
+
+            started = time.perf_counter()
+            try:
+                return await client.chat.completions.create(**kwargs)
+            except Exception as e:
+                metrics.inc("openai_errors_total", error=type(e).__name__)
+                raise
+            finally:
+                _inflight -= 1
+                _report_inflight()
+                metrics.observe("openai_request_seconds", time.perf_counter() - started)
+
+
+async def stream_chat_completion(client: AsyncOpenAI | None = None, **kwargs: Any) -> AsyncIterator[Any]:
+    """Chunks de una completion con ``stream=True``; los reintentos aplican al abrir el stream."""
+    stream = await create_chat_completion(client, stream=True, **kwargs)
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
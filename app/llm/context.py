@@ -0,0 +1,107 @@
+import math
+from functools import lru_cache
+from typing import Any
+
+import structlog
+
+from app.core.config import settings
+from app.llm.client import create_chat_completion
+from app.llm.prompts import SUMMARY_PROMPT
+
+log = structlog.get_logger()
+
+# Tokens extra por mensaje en el formato chat (rol, separadores)
+_MESSAGE_OVERHEAD = 4
+# Heurística sin tokenizer: ~3.5 caracteres por token en español
+_CHARS_PER_TOKEN = 3.5
+
+
+@lru_cache(maxsize=1)
+def _encoder() -> Any:
+    if settings.TOKENIZER != "tiktoken":
+        return None
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # sin tiktoken o sin acceso a los archivos de encoding: se usa la heurística
+        log.warning("tokenizer_fallback", error=str(e))
+        return None
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text))
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def message_tokens(message: dict[str, Any]) -> int:
+    return _MESSAGE_OVERHEAD + count_tokens(message.get("content") or "")
+
+
+def history_tokens(history: list[dict[str, Any]]) -> int:
+    return sum(message_tokens(m) for m in history)
+
+
+def fit_history(history: list[dict[str, Any]], budget: int) -> list[dict[str, Any]]:
+    """Los turnos más recientes que caben en ``budget`` tokens (en orden cronológico)."""
+    out: list[dict[str, Any]] = []
+    used = 0
+    for m in reversed(history[-(settings.HISTORY_MAX_TURNS * 2):]):
+        cost = message_tokens(m)
+        if used + cost > budget:
+            break
+        out.append(m)
+        used += cost
+    out.reverse()
+    return out
+
+
+def build_messages(
+    system_prompt: str,
+    history: list[dict[str, Any]],
+    user_message: str,
+    summary: str | None = None,
+    state: str | None = None,
+) -> list[dict[str, Any]]:
+    messages: list[dict[str, Any]] = [{"role": "system", "content": system_prompt}]
+    budget = settings.HISTORY_TOKEN_BUDGET
+    if summary:
+        messages.append({"role": "system", "content": f"Resumen de la conversación previa:\n{summary}"})
+        budget -= count_tokens(summary)
+    if state:
+        # resultados estructurados de tools de turnos anteriores (ConversationState)
+        messages.append({"role": "system", "content": state})
+        budget -= count_tokens(state)
+
+    turns = [m for m in history if m.get("role") in ("user", "assistant") and m.get("content")]
+    messages.extend({"role": m["role"], "content": m["content"]} for m in fit_history(turns, budget))
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def split_for_compaction(history: list[dict[str, Any]]) -> list[dict[str, Any]] | None:
+    """Turnos viejos a resumir cuando el historial excede el presupuesto; None si no hace falta."""
+    keep = settings.HISTORY_KEEP_MESSAGES
+    if len(history) - keep < max(1, settings.HISTORY_COMPACT_MIN_MESSAGES):
+        return None
+    if history_tokens(history) <= settings.HISTORY_TOKEN_BUDGET:
+        return None
+    return history[:-keep]
+
+
+async def summarize(previous: str | None, turns: list[dict[str, Any]]) -> str:
+    transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in turns)
+    content = f"Resumen previo:\n{previous or '(vacío)'}\n\nTurnos nuevos:\n{transcript}"
+    resp = await create_chat_completion(
+        model=settings.OPENAI_MODEL,
+        messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": content}],
+        temperature=0,
+        max_tokens=settings.HISTORY_SUMMARY_MAX_TOKENS,
+    )
+    return (resp.choices[0].message.content or "").strip()
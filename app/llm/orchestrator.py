@@ -1,127 +1,197 @@
+import asyncio
 import json
-from decimal import Decimal
-from typing import Any
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
 import structlog
+from pydantic import ValidationError
 
 from app.core.config import settings
-from app.llm.client import get_openai_client
+from app.core.metrics import metrics
+from app.llm.client import create_chat_completion, stream_chat_completion
+from app.llm.context import build_messages
+from app.llm import tool_cache
 from app.llm.prompts import SYSTEM_PROMPT
-from app.llm.schemas import ToolCatalogArgs, ToolFinancingArgs, ToolRagArgs, ToolNormalizeArgs
-from app.tools.catalog import CatalogQuery, search_catalog, known_make_model_pairs
-from app.tools.financing import calc_financing
-from app.tools.normalize import normalize_make_model
-from app.tools.rag import retrieve_kavak_knowledge
-from sqlalchemy.ext.asyncio import AsyncSession
+from app.llm.tools import ToolContext, get_tool, tool_definitions
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 log = structlog.get_logger()
 
-def _tool_defs() -> list[dict[str, Any]]:
-    return [
-        {
-            "type": "function",
-            "function": {
-                "name": "search_catalog",
-                "description": "Busca autos disponibles en el catálogo usando filtros estructurados.",
-                "parameters": ToolCatalogArgs.model_json_schema(),
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "calc_financing",
-                "description": "Calcula opciones de financiamiento con tasa anual fija y plazos 3 a 6 años.",
-                "parameters": ToolFinancingArgs.model_json_schema(),
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "retrieve_kavak_knowledge",
-                "description": "Recupera información oficial para responder sobre Kavak (propuesta de valor, sedes, políticas).",
-                "parameters": ToolRagArgs.model_json_schema(),
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "normalize_make_model",
-                "description": "Normaliza marca/modelo con fuzzy matching para tolerar errores del usuario.",
-                "parameters": ToolNormalizeArgs.model_json_schema(),
-            },
-        },
-    ]
-
-async def run_agent(session: AsyncSession, history: list[dict[str, str]], user_message: str) -> str:
-    client = get_openai_client()
-
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    for m in history[-(settings.HISTORY_MAX_TURNS * 2):]:
-        if m.get("role") in ("user", "assistant") and m.get("content"):
-            messages.append({"role": m["role"], "content": m["content"]})
-    messages.append({"role": "user", "content": user_message})
-
-    tools = _tool_defs()
+@dataclass
+class AgentTrace:
+    # Tools ejecutadas en el turno: (nombre, args, resultado)
+    tool_calls: list[tuple[str, dict[str, Any], Any]] = field(default_factory=list)
+
+    @property
+    def tools_used(self) -> set[str]:
+        return {name for name, _, _ in self.tool_calls}
+
+    @property
+    def has_errors(self) -> bool:
+        return any(isinstance(out, dict) and "error" in out for _, _, out in self.tool_calls)
+
+@dataclass(frozen=True)
+class ToolCall:
+    id: str
+    name: str
+    arguments: str
+
+    def as_message(self) -> dict[str, Any]:
+        return {"id": self.id, "type": "function", "function": {"name": self.name, "arguments": self.arguments}}
+
+@dataclass(frozen=True)
+class AgentEvent:
+    # "tool_start" | "tool_end" | "token" | "reset" | "reply"
+    # "reset": los tokens emitidos en el paso eran preámbulo de tool calls; descartarlos
+    type: str
+    data: dict[str, Any]
+
+def _session_factory(session: AsyncSession) -> async_sessionmaker[AsyncSession]:
+    # Una AsyncSession no admite uso concurrente: cada tool paralela abre la suya sobre el mismo engine
+    return async_sessionmaker(session.bind, expire_on_commit=False, class_=AsyncSession)
+
+async def _run_tool_call(
+    tc: "ToolCall",
+    session: AsyncSession,
+    factory: async_sessionmaker[AsyncSession] | None,
+    redis: Redis | None,
+) -> tuple[str, dict[str, Any], Any]:
+    name = tc.name
+    spec = get_tool(name)
+    if spec is None:
+        metrics.inc("tool_calls_total", tool=name, outcome="unknown")
+        return name, {}, {"error": "unknown_tool"}
+    try:
+        args = json.loads(tc.arguments or "{}")
+        parsed = spec.args_model(**args)
+    except (json.JSONDecodeError, TypeError, ValidationError):
+        metrics.inc("tool_calls_total", tool=name, outcome="invalid_arguments")
+        return name, {}, {"error": "invalid_arguments"}
+
+    timeout = spec.timeout_s or settings.TOOL_TIMEOUT_S
+    started = time.perf_counter()
+    outcome = "ok"
+
+    async def compute() -> Any:
+        nonlocal outcome
+        try:
+            if factory is None:
+                out = await asyncio.wait_for(spec.handler(ToolContext(session, redis), parsed), timeout)
+            else:
+                async with factory() as own_session:
+                    out = await asyncio.wait_for(spec.handler(ToolContext(own_session, redis), parsed), timeout)
+            return spec.serialize(out)
+        except asyncio.TimeoutError:
+            log.warning("tool_timeout", tool=name, timeout_s=timeout)
+            outcome = "timeout"
+            return {"error": "timeout"}
+        except Exception as e:
+            log.exception("tool_failed", tool=name, error=str(e))
+            outcome = "error"
+            return {"error": "tool_failed"}
+
+    if spec.cacheable:
+        out = await tool_cache.get_or_compute(name, parsed, spec.depends_on, redis, compute)
+    else:
+        out = await compute()
+    metrics.observe("tool_latency_seconds", time.perf_counter() - started, tool=name)
+    metrics.inc("tool_calls_total", tool=name, outcome=outcome)
+    return name, args, out
+
+FALLBACK_REPLY = "Lo siento, tuve un problema procesando tu solicitud. ¿Podrías reformularla en una frase?"
+
+async def _complete(messages: list[dict[str, Any]], tools: list[dict[str, Any]]) -> tuple[str, list[ToolCall]]:
+    resp = await create_chat_completion(
+        model=settings.OPENAI_MODEL,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        temperature=0.2,
+    )
+    msg = resp.choices[0].message
+    calls = [ToolCall(tc.id, tc.function.name, tc.function.arguments) for tc in getattr(msg, "tool_calls", None) or []]
+    return msg.content or "", calls
+
+async def _complete_streaming(
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]],
+) -> AsyncIterator[str | tuple[str, list[ToolCall]]]:
+    # Emite los tokens de texto a medida que llegan y, al final, (contenido, tool calls).
+    # Las tool calls llegan fragmentadas por índice y se arman al terminar el stream.
+    content: list[str] = []
+    parts: dict[int, dict[str, Any]] = {}
+    async for chunk in stream_chat_completion(
+        model=settings.OPENAI_MODEL,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        temperature=0.2,
+    ):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content.append(delta.content)
+            yield delta.content
+        for d in delta.tool_calls or []:
+            part = parts.setdefault(d.index, {"id": "", "name": "", "arguments": ""})
+            if d.id:
+                part["id"] = d.id
+            if d.function is not None:
+                part["name"] += d.function.name or ""
+                part["arguments"] += d.function.arguments or ""
+    yield "".join(content), [ToolCall(p["id"], p["name"], p["arguments"]) for _, p in sorted(parts.items())]
+
+async def iter_agent(
+    session: AsyncSession,
+    history: list[dict[str, str]],
+    user_message: str,
+    redis: Redis | None = None,
+    trace: AgentTrace | None = None,
+    summary: str | None = None,
+    state: str | None = None,
+    stream: bool = False,
+) -> AsyncIterator[AgentEvent]:
+    """
+    Tool loop como secuencia de eventos: progreso de tools, tokens (si ``stream``)
+    y al final un evento "reply" con la respuesta completa.
+    """
+    # historial recortado a HISTORY_TOKEN_BUDGET; lo anterior llega como resumen
+    messages = build_messages(SYSTEM_PROMPT, history, user_message, summary, state)
+
+    tools = tool_definitions()
 
     for step in range(6):  # tool loop acotado
-        resp = await client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=messages,
-            tools=tools,
-            tool_choice="auto",
-            temperature=0.2,
-        )
-        choice = resp.choices[0]
-        msg = choice.message
-
-        if not getattr(msg, "tool_calls", None):
-            return (msg.content or "").strip()
-
-        messages.append({"role": "assistant", "content": msg.content or "", "tool_calls": msg.tool_calls})
-
-        for tc in msg.tool_calls:
-            name = tc.function.name
-            args = json.loads(tc.function.arguments or "{}")
-            out: Any
-
-            if name == "search_catalog":
-                parsed = ToolCatalogArgs(**args)
-                q = CatalogQuery(**parsed.model_dump())
-                out = await search_catalog(session, q)
-
-            elif name == "calc_financing":
-                parsed = ToolFinancingArgs(**args)
-                options = calc_financing(
-                    price_mxn=Decimal(str(parsed.price_mxn)),
-                    down_payment=Decimal(str(parsed.down_payment)),
-                    annual_rate=Decimal(str(parsed.annual_rate)),
-                )
-                out = [
-                    {
-                        "years": o.years,
-                        "months": o.months,
-                        "monthly_payment": str(o.monthly_payment),
-                        "total_paid": str(o.total_paid),
-                        "total_interest": str(o.total_interest),
-                    }
-                    for o in options
-                ]
-
-            elif name == "retrieve_kavak_knowledge":
-                parsed = ToolRagArgs(**args)
-                out = await retrieve_kavak_knowledge(session, parsed.query, parsed.top_k)
-
-            elif name == "normalize_make_model":
-                parsed = ToolNormalizeArgs(**args)
-                pairs = await known_make_model_pairs(session)
-                norm = normalize_make_model(parsed.make, parsed.model, pairs)
-                out = {
-                    "make": norm.make,
-                    "model": norm.model,
-                    "confidence": norm.confidence,
-                    "candidates": norm.candidates,
-                }
-            else:
-                out = {"error": "unknown_tool"}
+        streamed = False
+        if stream:
+            async for item in _complete_streaming(messages, tools):
+                if isinstance(item, str):
+                    streamed = True
+                    yield AgentEvent("token", {"text": item})
+                else:
+                    content, calls = item
+        else:
+            content, calls = await _complete(messages, tools)
+
+        if not calls:
+            yield AgentEvent("reply", {"text": content.strip()})
+            return
+        if streamed:
+            # el texto del paso no es la respuesta: los tokens siguientes empiezan de cero
+            yield AgentEvent("reset", {})
+
+        messages.append({"role": "assistant", "content": content, "tool_calls": [tc.as_message() for tc in calls]})
+        for tc in calls:
+            yield AgentEvent("tool_start", {"tool": tc.name})
+
+        # Las tool calls de un paso son independientes: se ejecutan en paralelo
+        # y los mensajes "tool" se agregan en el orden en que las pidió el modelo
+        factory = _session_factory(session) if len(calls) > 1 else None
+        results = await asyncio.gather(*(_run_tool_call(tc, session, factory, redis) for tc in calls))
+        for tc, (name, args, out) in zip(calls, results):
+            if trace is not None:
+                trace.tool_calls.append((name, args, out))
 
             messages.append(
                 {
@@ -130,7 +200,24 @@ async def run_agent(session: AsyncSession, history: list[dict[str, str]], user_m
                     "content": json.dumps(out, ensure_ascii=False),
                 }
             )
-
-        log.info("agent_tool_step", step=step, tool_calls=[t.function.name for t in msg.tool_calls])
-
-    return "Lo siento, tuve un problema procesando tu solicitud. ¿Podrías reformularla en una frase?"
\ No newline at end of file
+            failed = isinstance(out, dict) and "error" in out
+            yield AgentEvent("tool_end", {"tool": name, "ok": not failed})
+
+        log.info("agent_tool_step", step=step, tool_calls=[tc.name for tc in calls])
+
+    yield AgentEvent("reply", {"text": FALLBACK_REPLY})
+
+async def run_agent(
+    session: AsyncSession,
+    history: list[dict[str, str]],
+    user_message: str,
+    redis: Redis | None = None,
+    trace: AgentTrace | None = None,
+    summary: str | None = None,
+    state: str | None = None,
+) -> str:
+    reply = FALLBACK_REPLY
+    async for event in iter_agent(session, history, user_message, redis, trace, summary, state):
+        if event.type == "reply":
+            reply = event.data["text"]
+    return reply
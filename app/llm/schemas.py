@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
 
 class ToolCatalogArgs(BaseModel):
     make: Optional[str] = None
@@ -11,6 +11,9 @@ class ToolCatalogArgs(BaseModel):
     city: Optional[str] = None
     transmission: Optional[str] = None
     limit: int = Field(default=5, ge=1, le=10)
+    sort: Literal["price_asc", "price_desc", "year_desc", "year_asc", "mileage_asc"] = "price_asc"
+    # next_cursor de la página anterior (mismos filtros y orden) para ver más resultados
+    cursor: Optional[str] = None
 
 class ToolFinancingArgs(BaseModel):
     price_mxn: float
@@ -21,6 +24,12 @@ class ToolRagArgs(BaseModel):
     query: str
     top_k: int = 4
 
+class ToolNormalizeItem(BaseModel):
+    make: Optional[str] = None
+    model: Optional[str] = None
+
 class ToolNormalizeArgs(BaseModel):
     make: Optional[str] = None
-    model: Optional[str] = None
\ No newline at end of file
+    model: Optional[str] = None
+    # Varios autos a la vez (p.ej. comparaciones); se normalizan en lote
+    items: Optional[list[ToolNormalizeItem]] = None
\ No newline at end of file
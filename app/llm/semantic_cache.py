@@ -0,0 +1,151 @@
+import re
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.rag.lexical import tokenize
+from app.tools.normalize import ALIASES
+
+# Palabras que indican que el mensaje depende de la conversación previa
+# ("¿y el segundo?", "ese en 48 meses", "otro más barato")
+_FOLLOW_UP_MARKERS = frozenset(
+    """
+    ese esa eso esos esas este esta esto estos estas aquel aquella primero primer segundo tercero ultimo
+    otro otra otros otras mismo misma tambien entonces anterior dicho dicha
+    """.split()
+)
+_MIN_CONTENT_WORDS = 2
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# Entidades que distinguen preguntas que el embedding confunde ("sedes en Monterrey"
+# vs "en Guadalajara"): ciudades y marcas frecuentes; los modelos salen del vocabulario
+_ENTITY_WORDS = frozenset(
+    tokenize(
+        """
+        cdmx monterrey guadalajara puebla queretaro leon toluca cuernavaca tijuana merida cancun
+        aguascalientes potosi saltillo hermosillo chihuahua culiacan morelia veracruz pachuca
+        nissan volkswagen chevrolet ford toyota honda mazda kia hyundai bmw audi mercedes benz seat
+        renault peugeot jeep dodge ram suzuki mitsubishi fiat tesla volvo buick gmc cadillac mini subaru
+        """
+    )
+) | frozenset(tokenize(" ".join(ALIASES)))
+# (pares del vocabulario, sus tokens): el vocabulario sólo cambia con el catálogo
+_vocab_words: tuple[tuple, frozenset[str]] = ((), frozenset())
+
+
+def is_self_contained(message: str, history: list[dict]) -> bool:
+    """Heurística: ¿el mensaje se entiende sin el historial? Sólo esos se sirven desde cache."""
+    if not history:
+        return True
+    words = message.lower().split()
+    if words and words[0] in ("y", "¿y"):
+        return False
+    if any(w.strip("¿?¡!.,;:") in _FOLLOW_UP_MARKERS for w in words):
+        return False
+    return len(tokenize(message)) >= _MIN_CONTENT_WORDS
+
+
+def _vocabulary_words(pairs: tuple[tuple[str, str], ...]) -> frozenset[str]:
+    global _vocab_words
+    if _vocab_words[0] is not pairs:
+        _vocab_words = (pairs, frozenset(tokenize(" ".join(f"{mk} {md}" for mk, md in pairs))))
+    return _vocab_words[1]
+
+
+def cache_guard(message: str, pairs: tuple[tuple[str, str], ...] = ()) -> frozenset[str]:
+    """
+    Números, ciudades, marcas y modelos (de ``pairs``) del mensaje: deben coincidir
+    exactamente para servir un hit. El resto de la redacción lo decide el umbral del
+    embedding, así las paráfrasis siguen pegando.
+    """
+    numbers = _NUMBER.findall(message.replace(",", ""))
+    entities = frozenset(tokenize(message)) & (_ENTITY_WORDS | _vocabulary_words(pairs))
+    return entities | frozenset(numbers)
+
+
+class SemanticCache:
+    """
+    Índice en proceso de respuestas previas: matriz de embeddings normalizados
+    (buffer circular) y búsqueda por similitud coseno con un producto matriz-vector.
+    Cada entrada recuerda la versión de conocimiento con la que se generó.
+    """
+
+    def __init__(self, threshold: float, ttl_s: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._vectors: np.ndarray | None = None
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._versions = np.full(max_entries, -1, dtype=np.int64)
+        self._answers: list[str | None] = [None] * max_entries
+        self._guards: list[frozenset[str] | None] = [None] * max_entries
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize(vec: np.ndarray) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def lookup(self, vec: np.ndarray, knowledge_version: int, guard: frozenset[str] = frozenset()) -> str | None:
+        if self._vectors is None or self._size == 0:
+            return None
+        sims = self._vectors[: self._size] @ self._normalize(vec)
+        valid = (self._expires[: self._size] > time.monotonic()) & (self._versions[: self._size] == knowledge_version)
+        sims = np.where(valid, sims, -np.inf)
+        above = np.flatnonzero(sims >= self.threshold)
+        # el más similar cuyas entidades/números coinciden exactamente
+        for i in above[np.argsort(-sims[above])]:
+            if self._guards[i] == guard:
+                return self._answers[i]
+        return None
+
+    def store(
+        self, vec: np.ndarray, answer: str, knowledge_version: int, guard: frozenset[str] = frozenset()
+    ) -> None:
+        v = self._normalize(vec)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, v.shape[0]), dtype=np.float32)
+        i = self._next
+        self._vectors[i] = v
+        self._expires[i] = time.monotonic() + self.ttl_s
+        self._versions[i] = knowledge_version
+        self._answers[i] = answer
+        self._guards[i] = guard
+        self._next = (i + 1) % self.max_entries
+        self._size = min(self._size + 1, self.max_entries)
+
+    def clear(self) -> None:
+        self._vectors = None
+        self._versions[:] = -1
+        self._answers = [None] * self.max_entries
+        self._guards = [None] * self.max_entries
+        self._next = 0
+        self._size = 0
+
+
+_cache: SemanticCache | None = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _cache
+    if _cache is None:
+        _cache = SemanticCache(
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            ttl_s=settings.SEMANTIC_CACHE_TTL_S,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+        )
+    return _cache
+
+
+def record_outcome(outcome: str) -> None:
+    metrics.inc("semantic_cache_total", outcome=outcome)
+    hits = metrics.counter("semantic_cache_total", outcome="hit")
+    misses = metrics.counter("semantic_cache_total", outcome="miss")
+    if hits + misses:
+        metrics.set_gauge("semantic_cache_hit_rate", hits / (hits + misses))
@@ -0,0 +1,76 @@
+import hashlib
+import json
+from typing import Any, Awaitable, Callable
+
+import structlog
+from pydantic import BaseModel
+from redis.asyncio import Redis
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.versions import get_version
+
+log = structlog.get_logger()
+
+# Resultados ya serializados de tools deterministas. La clave incluye los sellos
+# de versión de los datos de los que depende la tool (catálogo / conocimiento):
+# al recargar datos cambia la clave y las entradas viejas simplemente expiran.
+_memory = LRUCache(settings.TOOL_CACHE_SIZE, ttl_s=settings.TOOL_CACHE_TTL_S)
+
+
+def canonical_args(args: BaseModel) -> str:
+    # con defaults aplicados y llaves ordenadas: {"make": "Nissan"} == {"limit": 5, "make": "Nissan"}
+    return json.dumps(args.model_dump(mode="json"), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+async def cache_key(name: str, args: BaseModel, depends_on: tuple[str, ...], redis: Redis | None) -> str:
+    stamps = []
+    for dep in depends_on:
+        version = await get_version(redis, dep) if redis is not None else 0
+        stamps.append(f"{dep}={version}")
+    digest = hashlib.sha1(canonical_args(args).encode("utf-8")).hexdigest()
+    return f"tool:{name}:{','.join(stamps)}:{digest}"
+
+
+async def get_or_compute(
+    name: str,
+    args: BaseModel,
+    depends_on: tuple[str, ...],
+    redis: Redis | None,
+    compute: Callable[[], Awaitable[Any]],
+) -> Any:
+    try:
+        key = await cache_key(name, args, depends_on, redis)
+        cached = _memory.get(key)
+        if cached is None and redis is not None:
+            raw = await redis.get(key)
+            if raw:
+                cached = json.loads(raw)
+                _memory.set(key, cached)
+                metrics.inc("tool_cache_total", tool=name, tier="redis")
+                return cached
+    except Exception as e:
+        # el cache es una optimización: sin Redis se calcula directo, sin cachear
+        log.warning("tool_cache_unavailable", tool=name, error=str(e))
+        metrics.inc("tool_cache_total", tool=name, tier="bypass")
+        return await compute()
+    if cached is not None:
+        metrics.inc("tool_cache_total", tool=name, tier="memory")
+        return cached
+
+    metrics.inc("tool_cache_total", tool=name, tier="miss")
+    out = await compute()
+    # no se cachean errores (timeouts, fallas de dependencias)
+    if not (isinstance(out, dict) and "error" in out):
+        _memory.set(key, out)
+        if redis is not None:
+            try:
+                await redis.set(key, json.dumps(out, ensure_ascii=False), ex=settings.TOOL_CACHE_REDIS_TTL_S)
+            except Exception as e:
+                log.warning("tool_cache_write_failed", tool=name, error=str(e))
+    return out
+
+
+def clear_tool_cache() -> None:
+    _memory.clear()
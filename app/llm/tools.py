@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Awaitable, Callable
+
+from pydantic import BaseModel
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.versions import CATALOG
+from app.llm.schemas import ToolCatalogArgs, ToolFinancingArgs, ToolRagArgs, ToolNormalizeArgs
+from app.tools.catalog import CatalogQuery, InvalidCursor, search_catalog_page
+from app.tools.catalog_memory import search_catalog_page_memory
+from app.tools.financing import FinancingOption, calc_financing
+from app.tools.normalize import NormalizedMakeModel, normalize_make_model
+from app.tools.rag import retrieve_kavak_knowledge
+from app.tools.vocabulary import get_vocabulary
+
+
+@dataclass(frozen=True)
+class ToolContext:
+    session: AsyncSession
+    redis: Redis | None = None
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """Declaración de una tool: el orquestador sólo despacha a través del registro."""
+
+    name: str
+    description: str
+    args_model: type[BaseModel]
+    handler: Callable[[ToolContext, Any], Awaitable[Any]]
+    # None: usa TOOL_TIMEOUT_S
+    timeout_s: float | None = None
+    # Resultado determinista dados los args (y la versión de los datos): se puede cachear
+    cacheable: bool = False
+    # Sellos de versión (app.core.versions) que invalidan los resultados cacheados
+    depends_on: tuple[str, ...] = ()
+    # Convierte el resultado del handler en algo serializable a JSON
+    serialize: Callable[[Any], Any] = lambda out: out
+
+    def definition(self) -> dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.args_model.model_json_schema(),
+            },
+        }
+
+
+TOOLS: dict[str, ToolSpec] = {}
+_TOOL_DEFS: list[dict[str, Any]] = []
+
+
+def register(spec: ToolSpec) -> ToolSpec:
+    TOOLS[spec.name] = spec
+    # los schemas se generan una vez al registrar, no en cada mensaje
+    _TOOL_DEFS[:] = [s.definition() for s in TOOLS.values()]
+    return spec
+
+
+def get_tool(name: str) -> ToolSpec | None:
+    return TOOLS.get(name)
+
+
+def tool_definitions() -> list[dict[str, Any]]:
+    return _TOOL_DEFS
+
+
+# --- handlers ---
+
+async def _search_catalog(ctx: ToolContext, args: ToolCatalogArgs) -> dict[str, Any]:
+    try:
+        q = CatalogQuery(**args.model_dump())
+        if settings.CATALOG_ENGINE == "memory":
+            page = await search_catalog_page_memory(ctx.session, q, ctx.redis)
+        else:
+            page = await search_catalog_page(ctx.session, q)
+    except InvalidCursor:
+        # el modelo reintenta sin cursor; los errores no se cachean
+        return {"error": "invalid_cursor"}
+    return page.as_dict()
+
+
+async def _calc_financing(ctx: ToolContext, args: ToolFinancingArgs) -> list[FinancingOption]:
+    return calc_financing(
+        price_mxn=Decimal(str(args.price_mxn)),
+        down_payment=Decimal(str(args.down_payment)),
+        annual_rate=Decimal(str(args.annual_rate)),
+    )
+
+
+def _financing_dicts(options: list[FinancingOption]) -> list[dict[str, Any]]:
+    return [
+        {
+            "years": o.years,
+            "months": o.months,
+            "monthly_payment": str(o.monthly_payment),
+            "total_paid": str(o.total_paid),
+            "total_interest": str(o.total_interest),
+        }
+        for o in options
+    ]
+
+
+async def _retrieve_knowledge(ctx: ToolContext, args: ToolRagArgs) -> list[dict[str, Any]]:
+    return await retrieve_kavak_knowledge(ctx.session, args.query, args.top_k, redis=ctx.redis)
+
+
+def _normalized_dict(norm: NormalizedMakeModel) -> dict[str, Any]:
+    return {
+        "make": norm.make,
+        "model": norm.model,
+        "confidence": norm.confidence,
+        "candidates": norm.candidates,
+    }
+
+
+async def _normalize(ctx: ToolContext, args: ToolNormalizeArgs) -> NormalizedMakeModel | list[NormalizedMakeModel]:
+    vocab = await get_vocabulary(ctx.session, ctx.redis)
+    if args.items:
+        return vocab.index.normalize_many([(i.make, i.model) for i in args.items])
+    return normalize_make_model(args.make, args.model, vocab.index)
+
+
+def _normalize_serialize(out: NormalizedMakeModel | list[NormalizedMakeModel]) -> dict[str, Any]:
+    if isinstance(out, list):
+        return {"results": [_normalized_dict(n) for n in out]}
+    return _normalized_dict(out)
+
+
+register(
+    ToolSpec(
+        name="search_catalog",
+        description=(
+            "Busca autos disponibles en el catálogo usando filtros estructurados. Devuelve una página de "
+            "resultados, el total y next_cursor; para ver más, repite la búsqueda con cursor=next_cursor."
+        ),
+        args_model=ToolCatalogArgs,
+        handler=_search_catalog,
+        timeout_s=5.0,
+        cacheable=True,
+        depends_on=(CATALOG,),
+    )
+)
+register(
+    ToolSpec(
+        name="calc_financing",
+        description="Calcula opciones de financiamiento con tasa anual fija y plazos 3 a 6 años.",
+        args_model=ToolFinancingArgs,
+        handler=_calc_financing,
+        timeout_s=2.0,
+        cacheable=True,
+        serialize=_financing_dicts,
+    )
+)
+register(
+    ToolSpec(
+        name="retrieve_kavak_knowledge",
+        description="Recupera información oficial para responder sobre Kavak (propuesta de valor, sedes, políticas).",
+        args_model=ToolRagArgs,
+        handler=_retrieve_knowledge,
+        timeout_s=6.0,
+        # no cacheable: el resultado depende del breaker de Qdrant y del presupuesto del
+        # rerank; un resultado degradado (sólo léxico) no debe servirse durante una hora
+        cacheable=False,
+    )
+)
+register(
+    ToolSpec(
+        name="normalize_make_model",
+        description="Normaliza marca/modelo con fuzzy matching para tolerar errores del usuario.",
+        args_model=ToolNormalizeArgs,
+        handler=_normalize,
+        timeout_s=3.0,
+        cacheable=True,
+        depends_on=(CATALOG,),
+        serialize=_normalize_serialize,
+    )
+)
@@ -4,6 +4,10 @@ import structlog
 
 from app.core.config import settings
 from app.core.logging import configure_logging
+from app.core.metrics import metrics
+from app.llm.client import init_openai_client, close_openai_client
+from app.rag.embeddings import get_embedding_service, close_embedding_service
+from app.rag.qdrant_store import close_client as close_qdrant_client
 from app.api.routes_twilio import router as twilio_router
 from app.api.routes_chat import router as chat_router
 
@@ -14,17 +18,27 @@ def create_app() -> FastAPI:
     @app.on_event("startup")
     async def _startup():
         app.state.redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+        await init_openai_client()
+        if settings.EMBED_WARMUP:
+            await get_embedding_service().warmup()
         structlog.get_logger().info("startup", env=settings.ENV)
 
     @app.on_event("shutdown")
     async def _shutdown():
         redis: Redis = app.state.redis
         await redis.close()
+        await close_openai_client()
+        await close_embedding_service()
+        await close_qdrant_client()
 
     @app.get("/health")
     async def health():
         return {"status": "ok"}
 
+    @app.get("/metrics")
+    async def get_metrics():
+        return metrics.snapshot()
+
     app.include_router(twilio_router)
     app.include_router(chat_router)
 
@@ -0,0 +1,133 @@
+import json
+import time
+from dataclasses import asdict, dataclass, replace
+from typing import Any
+
+import msgpack
+import structlog
+
+log = structlog.get_logger()
+
+# Subir al cambiar los campos: estados con otra versión se descartan al leer
+STATE_SCHEMA_VERSION = 2
+# Autos del último search_catalog que se recuerdan (y se muestran en el prompt)
+MAX_REMEMBERED_CARS = 8
+
+_CAR_FIELDS = ("id", "make", "model", "year", "price_mxn", "city", "transmission")
+
+
+@dataclass(frozen=True)
+class ConversationState:
+    """Resultados de tools que el modelo puede reutilizar en turnos siguientes."""
+
+    last_catalog_query: dict[str, Any] | None = None
+    last_catalog_results: tuple[dict[str, Any], ...] = ()
+    # paginación de la última búsqueda: cursor de la página siguiente y total aproximado
+    last_catalog_cursor: str | None = None
+    last_catalog_total: int | None = None
+    last_catalog_total_capped: bool = False
+    selected_car: dict[str, Any] | None = None
+    last_financing: dict[str, Any] | None = None
+    updated_at: float = 0.0
+
+    @property
+    def empty(self) -> bool:
+        return not (self.last_catalog_results or self.selected_car or self.last_financing)
+
+
+def encode_state(state: ConversationState) -> bytes:
+    data = asdict(state)
+    data["v"] = STATE_SCHEMA_VERSION
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def decode_state(raw: bytes | None) -> ConversationState:
+    if not raw:
+        return ConversationState()
+    try:
+        data = msgpack.unpackb(raw, raw=False)
+    except Exception as e:
+        log.warning("conversation_state_corrupt", error=str(e))
+        return ConversationState()
+    if data.pop("v", None) != STATE_SCHEMA_VERSION:
+        return ConversationState()
+    data["last_catalog_results"] = tuple(data.get("last_catalog_results") or ())
+    return ConversationState(**data)
+
+
+def _compact_car(car: dict[str, Any]) -> dict[str, Any]:
+    return {k: car.get(k) for k in _CAR_FIELDS}
+
+
+def _match_car(cars: tuple[dict[str, Any], ...], price: float) -> dict[str, Any] | None:
+    for car in cars:
+        if car.get("price_mxn") is not None and abs(float(car["price_mxn"]) - price) < 1:
+            return car
+    return None
+
+
+def apply_tool_calls(state: ConversationState, tool_calls: list[tuple[str, dict[str, Any], Any]]) -> ConversationState:
+    """Nuevo estado tras los tools de un turno (los que fallaron se ignoran)."""
+    changed = False
+    for name, args, out in tool_calls:
+        if isinstance(out, dict) and "error" in out:
+            continue
+        if name == "search_catalog" and isinstance(out, dict):
+            cars = tuple(_compact_car(c) for c in out.get("results", [])[:MAX_REMEMBERED_CARS])
+            query = {k: v for k, v in args.items() if k != "cursor"}
+            state = replace(
+                state,
+                last_catalog_query=query,
+                last_catalog_results=cars,
+                last_catalog_cursor=out.get("next_cursor"),
+                last_catalog_total=out.get("total"),
+                last_catalog_total_capped=bool(out.get("total_capped")),
+            )
+            changed = True
+        elif name == "calc_financing" and isinstance(out, list):
+            price = float(args.get("price_mxn", 0))
+            financing = {
+                "price_mxn": price,
+                "down_payment": float(args.get("down_payment", 0)),
+                "annual_rate": float(args.get("annual_rate", 0.10)),
+                "options": [{"months": o["months"], "monthly_payment": o["monthly_payment"]} for o in out],
+            }
+            # el auto financiado es el "seleccionado" si salió en la última búsqueda
+            selected = _match_car(state.last_catalog_results, price) or state.selected_car
+            state = replace(state, last_financing=financing, selected_car=selected)
+            changed = True
+    return replace(state, updated_at=time.time()) if changed else state
+
+
+def _car_line(car: dict[str, Any]) -> str:
+    price = f"${float(car['price_mxn']):,.0f}" if car.get("price_mxn") is not None else "?"
+    return f"{car.get('make')} {car.get('model')} {car.get('year')} · {price} · {car.get('city')} (id {car.get('id')})"
+
+
+def render_state(state: ConversationState) -> str | None:
+    """Contexto breve para el prompt; None si no hay nada que recordar."""
+    if state.empty:
+        return None
+    lines = ["Datos ya consultados en esta conversación (úsalos en lugar de repetir la tool si bastan):"]
+    if state.last_catalog_results:
+        header = "Últimos autos mostrados"
+        if state.last_catalog_total is not None:
+            plus = "+" if state.last_catalog_total_capped else ""
+            header += f" ({state.last_catalog_total}{plus} coincidencias en total)"
+        lines.append(f"{header}:")
+        lines.extend(f"{i}. {_car_line(c)}" for i, c in enumerate(state.last_catalog_results, start=1))
+        if state.last_catalog_cursor:
+            query = json.dumps(state.last_catalog_query or {}, ensure_ascii=False)
+            lines.append(
+                f'Hay más resultados: para mostrar más llama search_catalog con {query} y cursor="{state.last_catalog_cursor}".'
+            )
+    if state.selected_car:
+        lines.append(f"Auto seleccionado: {_car_line(state.selected_car)}")
+    if state.last_financing:
+        f = state.last_financing
+        plans = ", ".join(f"{o['months']}m ${float(o['monthly_payment']):,.2f}" for o in f["options"])
+        lines.append(
+            f"Último financiamiento: precio ${f['price_mxn']:,.0f}, enganche ${f['down_payment']:,.0f}, "
+            f"tasa {f['annual_rate']:.0%}: {plans}"
+        )
+    return "\n".join(lines)
@@ -1,27 +1,147 @@
 import json
-from typing import Any
+from dataclasses import dataclass, field
+from typing import Any, Iterable
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import WatchError
 from app.core.config import settings
+from app.memory.conversation_state import ConversationState, decode_state, encode_state
 
 def _key(user_id: str) -> str:
     return f"conv:{user_id}:history"
 
+def _summary_key(user_id: str) -> str:
+    return f"conv:{user_id}:summary"
+
+def _state_key(user_id: str) -> str:
+    return f"conv:{user_id}:state"
+
+def _keys(user_id: str) -> tuple[str, str, str]:
+    return _key(user_id), _summary_key(user_id), _state_key(user_id)
+
+def _encode_turn(role: str, content: str) -> str:
+    return json.dumps({"role": role, "content": content}, ensure_ascii=False)
+
+def _decode_history(raw: list[bytes]) -> list[dict[str, Any]]:
+    out: list[dict[str, Any]] = []
+    for b in raw:
+        try:
+            out.append(json.loads(b))
+        except Exception:
+            continue
+    return out
+
+def _decode_str(raw: bytes | str | None) -> str | None:
+    return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+@dataclass(frozen=True)
+class SessionSnapshot:
+    history: list[dict[str, Any]] = field(default_factory=list)
+    summary: str | None = None
+    state: ConversationState = field(default_factory=ConversationState)
+
 class SessionStore:
+    """
+    Memoria de conversación en Redis: historial (lista), resumen y estado estructurado.
+    Cada mensaje usa dos round-trips (``begin_turn`` y ``finish_turn``), ambos en MULTI,
+    y todas las llaves expiran tras SESSION_TTL_S sin actividad.
+    """
+
     def __init__(self, redis: Redis):
         self.redis = redis
 
+    @staticmethod
+    def _queue_append(pipe: Pipeline, user_id: str, items: list[str]) -> None:
+        key = _key(user_id)
+        pipe.rpush(key, *items)
+        # los turnos viejos los quita compact() una vez resumidos; esto es sólo un tope
+        pipe.ltrim(key, -settings.HISTORY_STORE_MAX_MESSAGES, -1)
+
+    @staticmethod
+    def _queue_touch(pipe: Pipeline, user_id: str) -> None:
+        for k in _keys(user_id):
+            pipe.expire(k, settings.SESSION_TTL_S)
+
+    async def begin_turn(self, user_id: str, content: str) -> SessionSnapshot:
+        """Lee historial, resumen y estado y agrega el turno del usuario, atómicamente."""
+        key, summary_key, state_key = _keys(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.get(summary_key)
+            pipe.get(state_key)
+            self._queue_append(pipe, user_id, [_encode_turn("user", content)])
+            self._queue_touch(pipe, user_id)
+            raw_history, raw_summary, raw_state, *_ = await pipe.execute()
+        return SessionSnapshot(_decode_history(raw_history), _decode_str(raw_summary), decode_state(raw_state))
+
+    async def finish_turn(self, user_id: str, reply: str, state: ConversationState | None = None) -> None:
+        """Agrega la respuesta y, si cambió, guarda el estado estructurado."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._queue_append(pipe, user_id, [_encode_turn("assistant", reply)])
+            if state is not None:
+                pipe.set(_state_key(user_id), encode_state(state))
+            self._queue_touch(pipe, user_id)
+            await pipe.execute()
+
+    async def append_turns(self, user_id: str, turns: Iterable[tuple[str, str]]) -> None:
+        items = [_encode_turn(role, content) for role, content in turns]
+        if not items:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._queue_append(pipe, user_id, items)
+            self._queue_touch(pipe, user_id)
+            await pipe.execute()
+
     async def append_turn(self, user_id: str, role: str, content: str) -> None:
-        item = json.dumps({"role": role, "content": content}, ensure_ascii=False)
-        await self.redis.rpush(_key(user_id), item)
-        max_items = settings.HISTORY_MAX_TURNS * 2
-        await self.redis.ltrim(_key(user_id), -max_items, -1)
+        await self.append_turns(user_id, [(role, content)])
+
+    async def load_many(self, user_ids: list[str]) -> dict[str, SessionSnapshot]:
+        """Snapshots de varios usuarios en un solo round-trip (sin transacción)."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                key, summary_key, state_key = _keys(user_id)
+                pipe.lrange(key, 0, -1)
+                pipe.get(summary_key)
+                pipe.get(state_key)
+            raw = await pipe.execute()
+        return {
+            user_id: SessionSnapshot(_decode_history(raw[3 * i]), _decode_str(raw[3 * i + 1]), decode_state(raw[3 * i + 2]))
+            for i, user_id in enumerate(user_ids)
+        }
+
+    async def clear_many(self, user_ids: list[str]) -> int:
+        keys = [k for user_id in user_ids for k in _keys(user_id)]
+        return int(await self.redis.delete(*keys)) if keys else 0
 
     async def get_history(self, user_id: str) -> list[dict[str, Any]]:
-        raw = await self.redis.lrange(_key(user_id), 0, -1)
-        out: list[dict[str, Any]] = []
-        for b in raw:
+        return _decode_history(await self.redis.lrange(_key(user_id), 0, -1))
+
+    async def get_summary(self, user_id: str) -> str | None:
+        return _decode_str(await self.redis.get(_summary_key(user_id)))
+
+    async def get_state(self, user_id: str) -> ConversationState:
+        return decode_state(await self.redis.get(_state_key(user_id)))
+
+    async def set_state(self, user_id: str, state: ConversationState) -> None:
+        await self.redis.set(_state_key(user_id), encode_state(state), ex=settings.SESSION_TTL_S)
+
+    async def compact(self, user_id: str, summarized: list[dict[str, Any]], summary: str) -> bool:
+        """
+        Reemplaza los primeros turnos (ya resumidos) por el resumen. Optimista: si el
+        inicio del historial cambió mientras se resumía, no toca nada y devuelve False.
+        """
+        key = _key(user_id)
+        n = len(summarized)
+        async with self.redis.pipeline(transaction=True) as pipe:
             try:
-                out.append(json.loads(b))
-            except Exception:
-                continue
-        return out
\ No newline at end of file
+                await pipe.watch(key)
+                head = [json.loads(b) for b in await pipe.lrange(key, 0, n - 1)]
+                if head != summarized:
+                    return False
+                pipe.multi()
+                pipe.ltrim(key, n, -1)
+                pipe.set(_summary_key(user_id), summary, ex=settings.SESSION_TTL_S)
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
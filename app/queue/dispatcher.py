@@ -0,0 +1,59 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+class KeyedDispatcher:
+    """Concurrencia acotada entre claves distintas, orden estricto dentro de la misma clave.
+
+    Cada tarea ocupa un slot desde que se envía hasta que termina (incluido el tiempo
+    que espera a la tarea previa del mismo usuario), así que ``wait_for_capacity``
+    sirve como backpressure para no leer más mensajes de los que se pueden atender.
+    """
+
+    def __init__(self, max_in_flight: int):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+        self._tails: dict[str, asyncio.Task] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def free_slots(self) -> int:
+        return max(0, self.max_in_flight - self._in_flight)
+
+    async def wait_for_capacity(self) -> int:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.max_in_flight)
+            return self.max_in_flight - self._in_flight
+
+    def submit(self, key: str, fn: Callable[[], Awaitable[None]]) -> asyncio.Task:
+        self._in_flight += 1
+        prev = self._tails.get(key)
+        task = asyncio.create_task(self._run(key, prev, fn))
+        self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, key: str, prev: asyncio.Task | None, fn: Callable[[], Awaitable[None]]) -> None:
+        try:
+            if prev is not None:
+                # el error de la tarea previa ya lo maneja quien la envió
+                await asyncio.gather(prev, return_exceptions=True)
+            await fn()
+        finally:
+            if self._tails.get(key) is asyncio.current_task():
+                del self._tails[key]
+            self._in_flight -= 1
+            async with self._cond:
+                self._cond.notify_all()
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
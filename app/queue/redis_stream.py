@@ -1,8 +1,13 @@
 import json
+import time
 from dataclasses import dataclass
 from redis.asyncio import Redis
 
+from app.core.config import settings
+from app.core.metrics import metrics
+
 STREAM_IN = "whatsapp_in"
+STREAM_DLQ = "whatsapp_dlq"
 GROUP = "workers"
 
 @dataclass(frozen=True)
@@ -12,9 +17,25 @@ class QueueMessage:
     body: str
     raw: dict
 
+@dataclass(frozen=True)
+class PendingEntry:
+    message_id: bytes
+    fields: dict
+    deliveries: int
+
+def retry_backoff_ms(deliveries: int) -> int:
+    # backoff exponencial según cuántas veces se ha entregado el mensaje
+    exp = max(0, deliveries - 1)
+    return min(settings.QUEUE_RETRY_MAX_MS, settings.QUEUE_RETRY_BASE_MS * (2 ** exp))
+
+def _id_str(message_id: bytes | str) -> str:
+    return message_id.decode("utf-8") if isinstance(message_id, bytes) else message_id
+
 class RedisStreamQueue:
     def __init__(self, redis: Redis):
         self.redis = redis
+        # "(<id>" exclusivo: dónde sigue el próximo escaneo de reclaim
+        self._reclaim_from = "-"
 
     async def ensure_group(self) -> None:
         try:
@@ -30,7 +51,8 @@ class RedisStreamQueue:
             "body": msg.body,
             "raw": json.dumps(msg.raw, ensure_ascii=False),
         }
-        return await self.redis.xadd(STREAM_IN, data)
+        # MAXLEN aproximado: acota memoria sin coste O(n) por XADD
+        return await self.redis.xadd(STREAM_IN, data, maxlen=settings.QUEUE_MAXLEN, approximate=True)
 
     async def consume(self, consumer: str, count: int = 10, block_ms: int = 5000):
         return await self.redis.xreadgroup(
@@ -42,4 +64,81 @@ class RedisStreamQueue:
         )
 
     async def ack(self, message_id: str) -> None:
-        await self.redis.xack(STREAM_IN, GROUP, message_id)
\ No newline at end of file
+        await self.redis.xack(STREAM_IN, GROUP, message_id)
+
+    async def reclaim(self, consumer: str, count: int = 10, exclude: set | None = None) -> list[PendingEntry]:
+        """
+        Reclama entradas pendientes cuyo backoff ya venció (de cualquier consumer,
+        incluido uno caído). Las que agotaron QUEUE_MAX_DELIVERIES van a la DLQ.
+        """
+        if count <= 0:
+            return []
+
+        # El escaneo sigue desde donde quedó el anterior (y da la vuelta una vez):
+        # entradas viejas en backoff largo o excluidas no tapan a las más nuevas.
+        start = self._reclaim_from
+        lo, hi, wrapped = start, "+", False
+        out: list[PendingEntry] = []
+        while len(out) < count:
+            page_size = count * 4
+            page = await self.redis.xpending_range(
+                STREAM_IN, GROUP, min=lo, max=hi, count=page_size, idle=settings.QUEUE_RETRY_BASE_MS
+            )
+            for p in page:
+                if len(out) >= count:
+                    break
+                lo = "(" + _id_str(p["message_id"])
+                entry = await self._claim(consumer, p, exclude)
+                if entry is not None:
+                    out.append(entry)
+            if len(out) >= count:
+                break
+            if len(page) < page_size:
+                if wrapped or start == "-":
+                    lo = "-"
+                    break
+                # fin de la lista: segunda pasada desde el inicio hasta el punto de partida
+                lo, hi, wrapped = "-", start, True
+        self._reclaim_from = lo
+        return out
+
+    async def _claim(self, consumer: str, p: dict, exclude: set | None) -> PendingEntry | None:
+        message_id = p["message_id"]
+        if exclude and message_id in exclude:
+            return None
+        delivered = int(p["times_delivered"])
+        min_idle = retry_backoff_ms(delivered)
+        if int(p["time_since_delivered"]) < min_idle:
+            return None
+
+        # XCLAIM con min_idle: si otro worker lo reclamó antes, no devuelve nada
+        claimed = await self.redis.xclaim(
+            STREAM_IN, GROUP, consumer, min_idle_time=min_idle, message_ids=[message_id]
+        )
+        if not claimed:
+            return None
+        _, fields = claimed[0]
+        if not fields:
+            # la entrada ya fue recortada del stream
+            await self.redis.xack(STREAM_IN, GROUP, message_id)
+            return None
+
+        if delivered >= settings.QUEUE_MAX_DELIVERIES:
+            await self.dead_letter(message_id, fields, delivered)
+            return None
+
+        return PendingEntry(message_id=message_id, fields=fields, deliveries=delivered + 1)
+
+    async def dead_letter(self, message_id: bytes | str, fields: dict, deliveries: int) -> None:
+        mid = _id_str(message_id)
+        data = {**fields, "original_id": mid, "deliveries": deliveries}
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(STREAM_DLQ, data, maxlen=settings.QUEUE_MAXLEN, approximate=True)
+            pipe.xack(STREAM_IN, GROUP, mid)
+            await pipe.execute()
+        metrics.inc("queue_dead_lettered_total")
+
+    async def trim(self) -> int:
+        # MINID: descarta entradas más viejas que la retención (ya procesadas o en DLQ)
+        min_id = f"{int(time.time() * 1000) - settings.QUEUE_RETENTION_S * 1000}-0"
+        return await self.redis.xtrim(STREAM_IN, minid=min_id, approximate=True)
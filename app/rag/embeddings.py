@@ -1,14 +1,195 @@
-from fastembed import TextEmbedding
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from redis.asyncio import Redis
+
+from app.core.cache import LRUCache
 from app.core.config import settings
+from app.core.metrics import metrics
 
 class Embedder:
-    def __init__(self) -> None:
+    def __init__(self, model_name: str | None = None) -> None:
         # Modelo ligero y bueno para demo
-        self.model = TextEmbedding(model_name=getattr(settings, "EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
-
-    def embed(self, texts: list[str]) -> list[list[float]]:
-        # fastembed devuelve generador de np arrays -> convertimos a list[float]
-        vectors = []
-        for v in self.model.embed(texts):
-            vectors.append([float(x) for x in v])
-        return vectors
\ No newline at end of file
+        self.model_name = model_name or getattr(settings, "EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Carga perezosa: importar el módulo no carga el modelo ONNX
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from fastembed import TextEmbedding
+
+                    self._model = TextEmbedding(model_name=self.model_name)
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def warmup(self) -> None:
+        # Carga el modelo y hace una inferencia para que la primera consulta real no pague el arranque
+        self.embed(["warmup"])
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        # (n, dim) float32 contiguo: cada vector de fastembed se copia directo a su fila,
+        # sin pasar por listas de floats de Python
+        out: np.ndarray | None = None
+        for i, v in enumerate(self.model.embed(texts)):
+            if out is None:
+                out = np.empty((len(texts), v.shape[-1]), dtype=np.float32)
+            out[i] = v
+        return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+class EmbeddingService:
+    """
+    Inferencia de embeddings fuera del event loop. Las consultas concurrentes se
+    agrupan en micro-batches (hasta max_batch textos o max_wait_ms de espera) y se
+    ejecutan en un pool de threads (onnxruntime libera el GIL durante la inferencia).
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder | None = None,
+        max_batch: int | None = None,
+        max_wait_ms: float | None = None,
+        threads: int | None = None,
+    ) -> None:
+        self.embedder = embedder or Embedder()
+        self.max_batch = max_batch or settings.EMBED_MAX_BATCH
+        self.max_wait_s = (max_wait_ms if max_wait_ms is not None else settings.EMBED_MAX_WAIT_MS) / 1000
+        threads = threads or settings.EMBED_THREADS
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embed")
+        self._running = asyncio.Semaphore(threads)
+        self._queue: asyncio.Queue[tuple[str, asyncio.Future]] = asyncio.Queue()
+        self._batcher: asyncio.Task | None = None
+        self._batches: set[asyncio.Task] = set()
+
+    @property
+    def model_name(self) -> str:
+        return self.embedder.model_name
+
+    async def warmup(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.embedder.warmup)
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if self._batcher is None or self._batcher.done():
+            self._batcher = asyncio.create_task(self._run())
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for t in texts:
+            fut = loop.create_future()
+            self._queue.put_nowait((t, fut))
+            futures.append(fut)
+        return np.stack(await asyncio.gather(*futures))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_s
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Esperar un thread libre antes de armar el siguiente batch = backpressure natural
+            await self._running.acquire()
+            task = asyncio.create_task(self._execute(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _execute(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        try:
+            batch = [(t, f) for t, f in batch if not f.cancelled()]
+            if not batch:
+                return
+            metrics.observe("embed_batch_size", len(batch))
+            try:
+                vectors = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.embedder.embed, [t for t, _ in batch]
+                )
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+            for (_, fut), vec in zip(batch, vectors):
+                if not fut.done():
+                    fut.set_result(vec)
+        finally:
+            self._running.release()
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_service: EmbeddingService | None = None
+_query_cache = LRUCache(maxsize=settings.EMBED_CACHE_SIZE)
+
+def get_embedding_service() -> EmbeddingService:
+    global _service
+    if _service is None:
+        _service = EmbeddingService()
+    return _service
+
+async def close_embedding_service() -> None:
+    global _service
+    if _service is not None:
+        await _service.close()
+        _service = None
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def _redis_key(model_name: str, text: str) -> str:
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return f"emb:{model_name}:{digest}"
+
+async def embed_query(text: str, redis: Redis | None = None, service: EmbeddingService | None = None) -> np.ndarray:
+    """Embedding (float32) de una consulta con cache LRU en proceso y, opcionalmente, en Redis."""
+    service = service or get_embedding_service()
+    norm = normalize_query(text)
+    key = (service.model_name, norm)
+
+    cached = _query_cache.get(key)
+    if cached is not None:
+        metrics.inc("embed_cache_hits_total", tier="memory")
+        return cached
+
+    if redis is not None:
+        raw = await redis.get(_redis_key(service.model_name, norm))
+        if raw:
+            vec = np.frombuffer(raw, dtype=np.float32)
+            _query_cache.set(key, vec)
+            metrics.inc("embed_cache_hits_total", tier="redis")
+            return vec
+
+    metrics.inc("embed_cache_misses_total")
+    vec = (await service.embed([norm]))[0]
+    # vista de sólo lectura: el mismo array se comparte entre llamadas
+    vec.setflags(write=False)
+    _query_cache.set(key, vec)
+    if redis is not None:
+        await redis.set(_redis_key(service.model_name, norm), vec.tobytes(), ex=settings.EMBED_CACHE_REDIS_TTL_S)
+    return vec
+
+def clear_query_cache() -> None:
+    _query_cache.clear()
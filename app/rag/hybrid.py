@@ -0,0 +1,27 @@
+import hashlib
+
+
+def stable_point_id(source: str, content: str) -> int:
+    """
+    Genera un ID estable para Qdrant basado en hash.
+    Evita duplicados al re-ingestar.
+    """
+    h = hashlib.sha256(f"{source}:{content}".encode("utf-8")).hexdigest()
+    return int(h[:16], 16)
+
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], k: int = 60) -> list[dict]:
+    """
+    Fusiona rankings (densos, léxicos, ...) con RRF: score = Σ 1 / (k + rank).
+    Los chunks repetidos entre listas se deduplican por stable_point_id.
+    """
+    fused: dict[int, dict] = {}
+    scores: dict[int, float] = {}
+    for results in result_lists:
+        for rank, r in enumerate(results, start=1):
+            pid = stable_point_id(r.get("source") or "", r["content"])
+            scores[pid] = scores.get(pid, 0.0) + 1.0 / (k + rank)
+            fused.setdefault(pid, r)
+
+    order = sorted(scores, key=lambda pid: -scores[pid])
+    return [{**fused[pid], "score": scores[pid]} for pid in order]
@@ -0,0 +1,139 @@
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import KnowledgeChunk
+
+# Recuperación léxica sobre knowledge_chunks:
+# - Postgres: columna tsvector en español + índice GIN (ver KNOWLEDGE_FTS_DDL)
+# - SQLite/dev: índice BM25 en proceso construido desde la tabla
+
+SPANISH_STOPWORDS = frozenset(
+    """
+    a al algo algunas algunos ante antes como con contra cual cuales cuando de del desde donde dos el ella
+    ellas ellos en entre era es esa esas ese eso esos esta estan estas este esto estos fue ha hay la las le
+    les lo los mas me mi mis mucho muy no nos o os otra otro para pero poco por porque que quien se sea ser
+    si sin sobre su sus tambien te tiene tienen todo tu tus un una uno unos y ya yo
+    """.split()
+)
+
+_WORD = re.compile(r"\w+")
+
+KNOWLEDGE_FTS_DDL = [
+    "ALTER TABLE knowledge_chunks ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('spanish'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('spanish'::regconfig, content), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_knowledge_chunks_search_tsv ON knowledge_chunks USING GIN (search_tsv)",
+]
+
+_FTS_SQL = text(
+    """
+    SELECT id, source, title, content, ts_rank_cd(search_tsv, q) AS score
+    FROM knowledge_chunks, to_tsquery('spanish', :q) AS q
+    WHERE search_tsv @@ q
+    ORDER BY score DESC
+    LIMIT :k
+    """
+)
+
+
+def _strip_accents(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+
+def query_terms(query: str) -> list[str]:
+    # palabras (sin stopwords) seguras para to_tsquery: sólo caracteres \w
+    seen: dict[str, None] = {}
+    for w in _WORD.findall(query.lower()):
+        if len(w) > 1 and _strip_accents(w) not in SPANISH_STOPWORDS:
+            seen.setdefault(w, None)
+    return list(seen)
+
+
+def tokenize(s: str) -> list[str]:
+    out = []
+    for w in _WORD.findall(_strip_accents(s.lower())):
+        if len(w) < 2 or w in SPANISH_STOPWORDS:
+            continue
+        # stemming mínimo: plural terminado en "s" (sedes → sede, autos → auto)
+        if len(w) > 3 and w.endswith("s"):
+            w = w[:-1]
+        out.append(w)
+    return out
+
+
+@dataclass(frozen=True)
+class _Doc:
+    source: str
+    title: str | None
+    content: str
+
+
+class BM25Index:
+    def __init__(self, docs: list[_Doc], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._lengths: list[int] = []
+        for i, d in enumerate(docs):
+            tokens = tokenize(f"{d.title or ''} {d.content}")
+            self._lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self._postings[term].append((i, tf))
+        self._avgdl = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    def search(self, query: str, top_k: int) -> list[tuple[int, float]]:
+        n = len(self.docs)
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avgdl)
+                scores[i] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:top_k]
+
+
+# Índice BM25 en proceso; se reconstruye si cambia el contenido de la tabla
+_bm25: BM25Index | None = None
+_bm25_stamp: tuple[int, int] | None = None
+
+
+async def _get_bm25(session: AsyncSession) -> BM25Index:
+    global _bm25, _bm25_stamp
+    count, max_id = (await session.execute(select(func.count(KnowledgeChunk.id), func.max(KnowledgeChunk.id)))).one()
+    stamp = (int(count or 0), int(max_id or 0))
+    if _bm25 is None or stamp != _bm25_stamp:
+        rows = (await session.execute(select(KnowledgeChunk.source, KnowledgeChunk.title, KnowledgeChunk.content))).all()
+        _bm25 = BM25Index([_Doc(r[0], r[1], r[2]) for r in rows])
+        _bm25_stamp = stamp
+    return _bm25
+
+
+def invalidate_bm25() -> None:
+    global _bm25, _bm25_stamp
+    _bm25 = None
+    _bm25_stamp = None
+
+
+async def search_lexical(session: AsyncSession, query: str, top_k: int) -> list[dict]:
+    if session.bind.dialect.name == "postgresql":
+        terms = query_terms(query)
+        if not terms:
+            return []
+        rows = (await session.execute(_FTS_SQL, {"q": " | ".join(terms), "k": top_k})).all()
+        return [{"source": r.source, "title": r.title, "content": r.content, "score": float(r.score)} for r in rows]
+
+    index = await _get_bm25(session)
+    return [
+        {"source": index.docs[i].source, "title": index.docs[i].title, "content": index.docs[i].content, "score": score}
+        for i, score in index.search(query, top_k)
+    ]
@@ -1,9 +1,51 @@
+from typing import Any, Sequence
+
+import numpy as np
 from qdrant_client import AsyncQdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import Batch, Distance, VectorParams, PointStruct
+from app.core.circuit import CircuitBreaker
 from app.core.config import settings
 
+# Cliente compartido por proceso (reutiliza conexiones) + breaker para no pagar
+# el timeout de conexión en cada petición cuando Qdrant está caído.
+_client: AsyncQdrantClient | None = None
+_breaker: CircuitBreaker | None = None
+
+def build_client(url: str | None = None) -> AsyncQdrantClient:
+    return AsyncQdrantClient(url=url or settings.QDRANT_URL, timeout=settings.QDRANT_TIMEOUT_S)
+
+def init_client(client: AsyncQdrantClient | None = None) -> AsyncQdrantClient:
+    global _client
+    if client is not None or _client is None:
+        _client = client or build_client()
+    return _client
+
 async def get_client() -> AsyncQdrantClient:
-    return AsyncQdrantClient(url=settings.QDRANT_URL)
+    return init_client()
+
+async def _probe() -> None:
+    await init_client().get_collections()
+
+def get_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            "qdrant",
+            failure_threshold=settings.QDRANT_CB_FAILURES,
+            reset_timeout_s=settings.QDRANT_CB_RESET_S,
+            probe=_probe,
+            probe_timeout_s=settings.QDRANT_TIMEOUT_S,
+        )
+    return _breaker
+
+async def close_client() -> None:
+    global _client, _breaker
+    if _breaker is not None:
+        _breaker.close()
+        _breaker = None
+    if _client is not None:
+        await _client.close()
+        _client = None
 
 async def ensure_collection(client: AsyncQdrantClient, dim: int) -> None:
     collections = await client.get_collections()
@@ -15,4 +57,24 @@ async def ensure_collection(client: AsyncQdrantClient, dim: int) -> None:
         )
 
 async def upsert_points(client: AsyncQdrantClient, points: list[PointStruct]) -> None:
-    await client.upsert(collection_name=settings.QDRANT_COLLECTION, points=points)
\ No newline at end of file
+    await client.upsert(collection_name=settings.QDRANT_COLLECTION, points=points)
+
+async def upsert_vectors(
+    client: AsyncQdrantClient,
+    ids: Sequence[int],
+    vectors: np.ndarray,
+    payloads: Sequence[dict[str, Any]],
+    batch_size: int = 256,
+) -> None:
+    # Recibe la matriz float32 tal cual; sólo cada lote se serializa para la API,
+    # así la memoria no crece con el total de chunks
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        await client.upsert(
+            collection_name=settings.QDRANT_COLLECTION,
+            points=Batch(
+                ids=list(ids[start:end]),
+                vectors=vectors[start:end].tolist(),
+                payloads=list(payloads[start:end]),
+            ),
+        )
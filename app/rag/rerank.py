@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import threading
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """Cross-encoder local (fastembed) cargado de forma perezosa."""
+
+    def __init__(self, model_name: str | None = None) -> None:
+        self.model_name = model_name or settings.RAG_RERANK_MODEL
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from fastembed.rerank.cross_encoder import TextCrossEncoder
+
+                    self._model = TextCrossEncoder(model_name=self.model_name)
+        return self._model
+
+    def score(self, query: str, documents: list[str]) -> list[float]:
+        return [float(s) for s in self.model.rerank(query, documents)]
+
+
+_reranker: Reranker | None = None
+
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        _reranker = Reranker()
+    return _reranker
+
+
+async def rerank(query: str, candidates: list[dict], budget_ms: float, reranker: Reranker | None = None) -> list[dict]:
+    """Reordena candidatos con el cross-encoder; si excede el presupuesto, conserva el orden de entrada."""
+    if len(candidates) < 2:
+        return candidates
+    reranker = reranker or get_reranker()
+    try:
+        scores = await asyncio.wait_for(
+            asyncio.to_thread(reranker.score, query, [c["content"] for c in candidates]),
+            budget_ms / 1000,
+        )
+    except asyncio.TimeoutError:
+        metrics.inc("rag_rerank_total", outcome="timeout")
+        return candidates
+    except Exception:
+        logger.exception("Error en el reranker. Se conserva el orden fusionado.")
+        metrics.inc("rag_rerank_total", outcome="error")
+        return candidates
+
+    metrics.inc("rag_rerank_total", outcome="ok")
+    order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+    return [{**candidates[i], "rerank_score": scores[i]} for i in order]
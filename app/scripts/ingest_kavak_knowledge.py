@@ -1,19 +1,19 @@
 import argparse
 import asyncio
-import hashlib
 from typing import List
 
 import httpx
 from bs4 import BeautifulSoup
+from redis.asyncio import Redis
 from sqlalchemy import delete
 
-from qdrant_client.models import PointStruct
-
 from app.core.config import settings
+from app.core.versions import KNOWLEDGE, bump_version
 from app.db.session import SessionLocal
 from app.db.models import KnowledgeChunk
 from app.rag.embeddings import Embedder
-from app.rag.qdrant_store import get_client, ensure_collection, upsert_points
+from app.rag.hybrid import stable_point_id
+from app.rag.qdrant_store import get_client, close_client, ensure_collection, upsert_vectors
 
 
 KAVAK_URL = "https://www.kavak.com/mx/blog/sedes-de-kavak-en-mexico"
@@ -42,15 +42,6 @@ def chunk_text(text: str, max_chars: int = 900) -> List[str]:
     return chunks
 
 
-def stable_point_id(source: str, content: str) -> int:
-    """
-    Genera un ID estable para Qdrant basado en hash.
-    Evita duplicados al re-ingestar.
-    """
-    h = hashlib.sha256(f"{source}:{content}".encode("utf-8")).hexdigest()
-    return int(h[:16], 16)
-
-
 async def fetch_kavak_page() -> tuple[str, str]:
     async with httpx.AsyncClient(timeout=30.0) as client:
         r = await client.get(KAVAK_URL)
@@ -63,16 +54,26 @@ async def fetch_kavak_page() -> tuple[str, str]:
     return title, text
 
 
+async def notify_knowledge_changed() -> int:
+    # Invalida respuestas cacheadas (cache semántico) en todos los procesos
+    redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+    try:
+        return await bump_version(redis, KNOWLEDGE)
+    finally:
+        await redis.close()
+
+
 async def main(truncate: bool):
     # 1️⃣ Descargar contenido
     title, text = await fetch_kavak_page()
     chunks = chunk_text(text)
 
     embedder = Embedder()
+    # (n, dim) float32 contiguo; se pasa directo a Qdrant por lotes
     vectors = embedder.embed(chunks)
 
     qdrant = await get_client()
-    dim = len(vectors[0])
+    dim = vectors.shape[1]
     await ensure_collection(qdrant, dim)
 
     async with SessionLocal() as session:
@@ -80,39 +81,22 @@ async def main(truncate: bool):
             await session.execute(delete(KnowledgeChunk))
             await session.commit()
 
-        points: list[PointStruct] = []
-
-        for content, vector in zip(chunks, vectors):
-            # Guardar en Postgres
-            kc = KnowledgeChunk(
-                source=KAVAK_URL,
-                title=title,
-                content=content,
-            )
-            session.add(kc)
-
-            # Preparar punto para Qdrant
-            pid = stable_point_id(KAVAK_URL, content)
-            points.append(
-                PointStruct(
-                    id=pid,
-                    vector=vector,
-                    payload={
-                        "source": KAVAK_URL,
-                        "title": title,
-                        "content": content,
-                    },
-                )
-            )
-
+        # Guardar en Postgres
+        session.add_all(
+            [KnowledgeChunk(source=KAVAK_URL, title=title, content=content) for content in chunks]
+        )
         await session.commit()
 
     # 2️⃣ Upsert en Qdrant
-    await upsert_points(qdrant, points)
+    ids = [stable_point_id(KAVAK_URL, content) for content in chunks]
+    payloads = [{"source": KAVAK_URL, "title": title, "content": content} for content in chunks]
+    await upsert_vectors(qdrant, ids, vectors, payloads)
+    await close_client()
+    version = await notify_knowledge_changed()
 
     print(
         f"Ingesta completada: {len(chunks)} chunks "
-        f"(Postgres + Qdrant collection='{settings.QDRANT_COLLECTION}')"
+        f"(Postgres + Qdrant collection='{settings.QDRANT_COLLECTION}', knowledge_version={version})"
     )
 
 
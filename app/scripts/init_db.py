@@ -1,10 +1,20 @@
 import asyncio
+from sqlalchemy import text
 from app.db.session import engine
-from app.db.models import Base
+from app.db.models import Base, Car, OBSOLETE_INDEXES
+from app.rag.lexical import KNOWLEDGE_FTS_DDL
 
 async def main():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all no agrega índices a tablas existentes
+        for name in OBSOLETE_INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        await conn.run_sync(lambda c: [ix.create(c, checkfirst=True) for ix in Car.__table__.indexes])
+        # Columna tsvector + índice GIN para la búsqueda léxica (idempotente)
+        if conn.dialect.name == "postgresql":
+            for ddl in KNOWLEDGE_FTS_DDL:
+                await conn.execute(text(ddl))
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
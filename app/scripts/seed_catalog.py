@@ -2,138 +2,159 @@ import argparse
 import asyncio
 import csv
 import json
-from decimal import Decimal, InvalidOperation
-from typing import Any
-
-from sqlalchemy import delete
-from app.db.session import SessionLocal
-from app.db.models import Car
-
-
-def _strip(v: Any) -> str:
-    return str(v).strip() if v is not None else ""
-
-
-def _to_int(v: Any) -> int | None:
-    s = _strip(v)
-    if not s:
-        return None
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import AsyncIterator, Iterator
+
+from redis.asyncio import Redis
+from app.core.config import settings
+from app.core.versions import CATALOG, bump_version
+from app.db.bulk_load import CarRecord, sync_cars
+from app.db.catalog_csv import ParsedChunk, byte_ranges, iter_chunks, parse_range, read_header, sniff_delimiter
+from app.db.session import engine
+from app.tools.vocabulary import invalidate_vocabulary
+
+
+async def notify_catalog_changed() -> int:
+    # Invalida caches derivados del catálogo (vocabulario make/model) en todos los procesos
+    invalidate_vocabulary()
+    redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
     try:
-        # soporta "77,400" o "77400.0"
-        s = s.replace(",", "")
-        return int(float(s))
-    except ValueError:
-        return None
-
+        return await bump_version(redis, CATALOG)
+    finally:
+        await redis.close()
+
+
+class IngestReport:
+    """Conteos del CSV y reporte de filas rechazadas (CSV: position, reason, raw)."""
+
+    def __init__(self, rejects_path: str | None):
+        self.rows_read = 0
+        self.reasons: Counter[str] = Counter()
+        self.rejects_path = rejects_path
+        self._file = open(rejects_path, "w", encoding="utf-8", newline="") if rejects_path else None
+        self._writer = csv.writer(self._file) if self._file else None
+        if self._writer:
+            self._writer.writerow(["position", "reason", "raw"])
+
+    @property
+    def rejected(self) -> int:
+        return sum(self.reasons.values())
+
+    def add(self, chunk: ParsedChunk) -> list[CarRecord]:
+        self.rows_read += chunk.rows_read
+        for r in chunk.rejected:
+            self.reasons[r.reason] += 1
+            if self._writer:
+                self._writer.writerow([r.position, r.reason, r.raw])
+        return chunk.records
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+
+
+def sequential_batches(csv_path: str, delimiter: str, batch_size: int, report: IngestReport) -> Iterator[list[CarRecord]]:
+    for chunk in iter_chunks(csv_path, delimiter, batch_size):
+        records = report.add(chunk)
+        if records:
+            yield records
+
+
+async def parallel_batches(
+    csv_path: str, delimiter: str, workers: int, chunk_bytes: int, report: IngestReport
+) -> AsyncIterator[list[CarRecord]]:
+    """
+    Parsea rangos de bytes del CSV en un pool de procesos y entrega los lotes en orden
+    de archivo mientras el writer (COPY) consume los anteriores.
+    """
+    header, data_start = read_header(csv_path, delimiter)
+    ranges = iter(byte_ranges(csv_path, data_start, chunk_bytes))
+    loop = asyncio.get_running_loop()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit(rng: tuple[int, int]) -> asyncio.Future:
+            return loop.run_in_executor(pool, parse_range, csv_path, rng[0], rng[1], header, delimiter)
+
+        # ventana acotada: a lo más 2 rangos por proceso en memoria
+        pending = deque(submit(r) for r in islice(ranges, workers * 2))
+        while pending:
+            chunk = await pending.popleft()
+            nxt = next(ranges, None)
+            if nxt is not None:
+                pending.append(submit(nxt))
+            records = report.add(chunk)
+            if records:
+                yield records
+
+
+async def main(
+    csv_path: str,
+    keep_missing: bool = False,
+    batch_size: int = 5000,
+    workers: int = 1,
+    chunk_mb: float = 8.0,
+    rejects_path: str | None = None,
+):
+    delimiter = sniff_delimiter(csv_path)
+    report = IngestReport(rejects_path)
+
+    if workers > 1:
+        batches = parallel_batches(csv_path, delimiter, workers, int(chunk_mb * 1024 * 1024), report)
+    else:
+        batches = sequential_batches(csv_path, delimiter, batch_size, report)
 
-def _to_decimal(v: Any) -> Decimal | None:
-    s = _strip(v)
-    if not s:
-        return None
     try:
-        # soporta "461999.0" y "461,999.0"
-        s = s.replace(",", "")
-        return Decimal(s)
-    except (InvalidOperation, ValueError):
-        return None
-
-
-def _to_bool(v: Any) -> bool | None:
-    s = _strip(v).lower()
-    if not s:
-        return None
-    if s in {"si", "sí", "true", "1", "yes", "y"}:
-        return True
-    if s in {"no", "false", "0", "n"}:
-        return False
-    return None
-
-
-def _sniff_delimiter(csv_path: str) -> str:
-    # intenta detectar si es ',' o ';'
-    with open(csv_path, "r", encoding="utf-8", newline="") as f:
-        sample = f.read(4096)
-    try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=[",", ";", "\t"])
-        return dialect.delimiter
-    except Exception:
-        return ","
-
-
-async def main(csv_path: str, truncate: bool):
-    delimiter = _sniff_delimiter(csv_path)
-
-    async with SessionLocal() as session:
-        if truncate:
-            await session.execute(delete(Car))
-            await session.commit()
-
-        with open(csv_path, "r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f, delimiter=delimiter)
-
-            rows = 0
-            inserted = 0
-
-            for row in reader:
-                rows += 1
-
-                make = _strip(row.get("make"))
-                model = _strip(row.get("model"))
-                year = _to_int(row.get("year"))
-
-                # Soporta price o price_mxn
-                price = _to_decimal(row.get("price")) or _to_decimal(row.get("price_mxn"))
-
-                # Soporta km o mileage_km
-                mileage = _to_int(row.get("km")) or _to_int(row.get("mileage_km"))
-
-                # Algunos CSV no traen city; default demo
-                city = _strip(row.get("city")) or "N/A"
-
-                # Extras a features (para no perder info)
-                features = {
-                    "stock_id": _to_int(row.get("stock_id")),
-                    "version": _strip(row.get("version")),
-                    "bluetooth": _to_bool(row.get("bluetooth")),
-                    "car_play": _to_bool(row.get("car_play")),
-                    "largo": _to_int(row.get("largo")),
-                    "ancho": _to_int(row.get("ancho")),
-                    "altura": _to_int(row.get("altura")),
-                }
-
-                # limpia features vacías
-                features = {k: v for k, v in features.items() if v not in (None, "", [])}
-
-                # Filtros mínimos de calidad
-                if not make or not model or not year or not price:
-                    # saltamos filas incompletas para no ensuciar DB
-                    continue
-
-                car = Car(
-                    external_id=features.get("stock_id"),  # si agregaste la columna
-                    make=make.strip(),
-                    model=model.strip(),
-                    year=year,
-                    price_mxn=price,
-                    city=city,
-                    mileage_km=mileage,
-                    transmission=_strip(row.get("transmission")) or None,
-                    fuel=_strip(row.get("fuel")) or None,
-                    body_type=_strip(row.get("body_type")) or None,
-                    features=features if features else None,
-                )
-
-                session.add(car)
-                inserted += 1
-
-            await session.commit()
-
-    print(json.dumps({"rows_read": rows, "inserted": inserted, "delimiter": delimiter}, ensure_ascii=False))
+        # Sync atómico (staging + diff por external_id): el catálogo nunca queda vacío
+        result = await sync_cars(engine, batches, remove_missing=not keep_missing)
+    finally:
+        report.close()
+
+    version = await notify_catalog_changed()
+
+    print(
+        json.dumps(
+            {
+                "rows_read": report.rows_read,
+                "rejected": report.rejected,
+                "rejected_by_reason": dict(report.reasons),
+                "rejects_file": rejects_path,
+                "inserted": result.inserted,
+                "updated": result.updated,
+                "removed": result.removed,
+                "unchanged": result.unchanged,
+                "delimiter": delimiter,
+                "catalog_version": version,
+            },
+            ensure_ascii=False,
+        )
+    )
 
 
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--csv", required=True)
-    p.add_argument("--truncate", action="store_true")
+    # compatibilidad: el sync ya reemplaza el catálogo completo de forma atómica
+    p.add_argument("--truncate", action="store_true", help="obsoleto; equivale al sync por defecto")
+    p.add_argument("--keep-missing", action="store_true", help="feed parcial: no borra autos ausentes")
+    p.add_argument("--batch-size", type=int, default=5000)
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="procesos de parseo (1 = secuencial); >1 sólo si ningún campo trae saltos de línea entre comillas",
+    )
+    p.add_argument("--chunk-mb", type=float, default=8.0, help="tamaño de cada rango de bytes")
+    p.add_argument("--rejects", default=None, help="CSV con las filas rechazadas (default: <csv>.rejects.csv)")
     args = p.parse_args()
-    asyncio.run(main(args.csv, args.truncate))
\ No newline at end of file
+    asyncio.run(
+        main(
+            args.csv,
+            keep_missing=args.keep_missing,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            chunk_mb=args.chunk_mb,
+            rejects_path=args.rejects or f"{args.csv}.rejects.csv",
+        )
+    )
@@ -1,27 +1,145 @@
+import asyncio
+from typing import AsyncIterator
+
+import numpy as np
 import structlog
 from fastapi import Request
 from redis.asyncio import Redis
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.versions import KNOWLEDGE, get_version
+from app.db.session import SessionLocal
+from app.memory.conversation_state import apply_tool_calls, render_state
 from app.memory.session_store import SessionStore
-from app.llm.orchestrator import run_agent
+from app.llm.context import split_for_compaction, summarize
+from app.llm.orchestrator import AgentEvent, AgentTrace, iter_agent
+from app.llm.semantic_cache import cache_guard, get_semantic_cache, is_self_contained, record_outcome
+from app.rag.embeddings import embed_query
+from app.tools.vocabulary import current_vocabulary
 
 log = structlog.get_logger()
 
+# Sólo se cachean respuestas generales: las que usaron exclusivamente la base de conocimiento
+_CACHEABLE_TOOLS = {"retrieve_kavak_knowledge"}
+
+# Referencias a turnos en curso de stream_message (evita que el GC los cancele)
+_turn_tasks: set[asyncio.Task] = set()
+
 class ConversationService:
     def __init__(self, redis: Redis):
+        self.redis = redis
         self.sessions = SessionStore(redis)
 
     @staticmethod
     def depends(request: Request) -> "ConversationService":
         return ConversationService(request.app.state.redis)
 
+    async def _cache_key(self, body: str, history: list[dict]) -> tuple[np.ndarray, int, frozenset[str]] | None:
+        if not settings.SEMANTIC_CACHE_ENABLED or not is_self_contained(body, history):
+            record_outcome("skip")
+            return None
+        try:
+            version = await get_version(self.redis, KNOWLEDGE)
+            vec = await embed_query(body, self.redis)
+        except Exception as e:
+            # el cache es una optimización: si falla el embedding se sigue con el agente
+            log.warning("semantic_cache_unavailable", error=str(e))
+            record_outcome("skip")
+            return None
+        vocab = current_vocabulary()
+        return vec, version, cache_guard(body, vocab.pairs if vocab else ())
+
+    async def respond(
+        self, session: AsyncSession, user_id: str, body: str, stream: bool = False
+    ) -> AsyncIterator[AgentEvent]:
+        """Eventos del turno; el último es "reply" y se emite ya persistido en SessionStore."""
+        # 1 round-trip: lectura + turno del usuario (MULTI)
+        snap = await self.sessions.begin_turn(user_id, body)
+        history, state = snap.history, snap.state
+        new_state = None
+
+        cache = get_semantic_cache()
+        key = await self._cache_key(body, history)
+        reply = cache.lookup(*key) if key else None
+        from_cache = reply is not None
+
+        if from_cache:
+            record_outcome("hit")
+        else:
+            if key:
+                record_outcome("miss")
+            trace = AgentTrace()
+            async for event in iter_agent(
+                session=session, history=history, user_message=body, redis=self.redis, trace=trace,
+                summary=snap.summary, state=render_state(state), stream=stream,
+            ):
+                if event.type == "reply":
+                    reply = event.data["text"]
+                else:
+                    yield event
+            updated = apply_tool_calls(state, trace.tool_calls)
+            new_state = updated if updated is not state else None
+            if key and trace.tools_used and trace.tools_used <= _CACHEABLE_TOOLS and not trace.has_errors:
+                vec, version, guard = key
+                cache.store(vec, reply, version, guard)
+
+        # 1 round-trip: respuesta + estado (MULTI)
+        await self.sessions.finish_turn(user_id, reply, new_state)
+
+        log.info("reply_ready", user_id=user_id, chars=len(reply), from_cache=from_cache)
+        yield AgentEvent("reply", {"text": reply})
+
     async def handle_message(self, session: AsyncSession, user_id: str, from_number: str, body: str) -> str:
-        history = await self.sessions.get_history(user_id)
-        await self.sessions.append_turn(user_id, "user", body)
+        reply = ""
+        async for event in self.respond(session, user_id, body):
+            if event.type == "reply":
+                reply = event.data["text"]
+        return reply
+
+    async def stream_message(
+        self, user_id: str, body: str, session_factory: async_sessionmaker[AsyncSession] = SessionLocal
+    ) -> AsyncIterator[AgentEvent]:
+        """
+        Versión streaming de ``handle_message``. El turno corre en su propia tarea:
+        si el cliente se desconecta, la respuesta igual se termina y se persiste.
+        """
+        queue: asyncio.Queue[AgentEvent | None] = asyncio.Queue()
+
+        async def produce() -> None:
+            try:
+                async with session_factory() as session:
+                    async for event in self.respond(session, user_id, body, stream=True):
+                        queue.put_nowait(event)
+            except Exception as e:
+                log.exception("stream_failed", user_id=user_id, error=str(e))
+                queue.put_nowait(AgentEvent("error", {"message": "internal_error"}))
+            finally:
+                queue.put_nowait(None)
+
+        task = asyncio.create_task(produce())
+        _turn_tasks.add(task)
+        task.add_done_callback(_turn_tasks.discard)
 
-        reply = await run_agent(session=session, history=history, user_message=body)
-        await self.sessions.append_turn(user_id, "assistant", reply)
+        while (event := await queue.get()) is not None:
+            yield event
 
-        log.info("reply_ready", user_id=user_id, chars=len(reply))
-        return reply
\ No newline at end of file
+    async def compact_history(self, user_id: str) -> None:
+        """
+        Resume los turnos viejos cuando el historial excede HISTORY_TOKEN_BUDGET.
+        Se llama después de enviar la respuesta, así que nunca lanza excepciones.
+        """
+        try:
+            history = await self.sessions.get_history(user_id)
+            old = split_for_compaction(history)
+            if not old:
+                return
+            previous = await self.sessions.get_summary(user_id)
+            summary = await summarize(previous, old)
+            ok = await self.sessions.compact(user_id, old, summary)
+            metrics.inc("history_compactions_total", outcome="ok" if ok else "conflict")
+            log.info("history_compacted", user_id=user_id, turns=len(old), applied=ok)
+        except Exception as e:
+            metrics.inc("history_compactions_total", outcome="error")
+            log.warning("history_compaction_failed", user_id=user_id, error=str(e))
@@ -1,17 +1,269 @@
+import json
+import re
+import time
+from email.utils import parsedate_to_datetime
+
 import httpx
+import structlog
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
 from app.core.config import settings
 from app.core.errors import ExternalServiceError
+from app.core.metrics import metrics
+from app.core.ratelimit import TokenBucket
+
+log = structlog.get_logger()
+
+# Un limiter por cuenta de Twilio, compartido por todos los senders del proceso
+_limiters: dict[str, TokenBucket] = {}
+
+_BULLET = re.compile(r"^\s*(?:[-•*]|\d+[.)])\s")
+
+class TwilioRetryableError(ExternalServiceError):
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _wait(retry_state) -> float:
+    # Retry-After manda sobre el backoff exponencial
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, TwilioRetryableError) and exc.retry_after is not None:
+        return min(exc.retry_after, settings.TWILIO_RETRY_AFTER_MAX_S)
+    return wait_random_exponential(multiplier=settings.TWILIO_RETRY_BACKOFF_S, max=10.0)(retry_state)
+
+def _split_long(line: str, max_chars: int) -> list[str]:
+    out: list[str] = []
+    while len(line) > max_chars:
+        cut = line.rfind(" ", 0, max_chars)
+        cut = cut if cut > 0 else max_chars
+        out.append(line[:cut].rstrip())
+        line = line[cut:].lstrip()
+    if line:
+        out.append(line)
+    return out
+
+def split_segments(text: str, max_chars: int) -> list[str]:
+    """
+    Parte un mensaje largo en segmentos de hasta ``max_chars``, cortando de preferencia
+    antes de una viñeta o párrafo para no separar un auto de su precio.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    segments: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in text.split("\n"):
+        for piece in _split_long(line, max_chars) or [""]:
+            extra = len(piece) + (1 if current else 0)
+            if current and size + extra > max_chars:
+                # retrocede hasta el último inicio de viñeta/párrafo del segmento
+                cut = next(
+                    (i for i in range(len(current) - 1, 0, -1) if not current[i].strip() or _BULLET.match(current[i])),
+                    len(current),
+                )
+                segments.append("\n".join(current[:cut]).strip())
+                current = current[cut:]
+                size = len("\n".join(current))
+                extra = len(piece) + (1 if current else 0)
+                if current and size + extra > max_chars:
+                    segments.append("\n".join(current).strip())
+                    current, size, extra = [], 0, len(piece)
+            current.append(piece)
+            size += extra
+    if current:
+        segments.append("\n".join(current).strip())
+    return [s for s in segments if s]
+
+def reply_segments(text: str) -> list[str]:
+    return split_segments(text, settings.TWILIO_SEGMENT_MAX_CHARS) if settings.TWILIO_SPLIT_SEGMENTS else [text]
+
+def _after_prefix(text: str, prefix: str) -> str | None:
+    # resto de ``text`` después de ``prefix``, sin tomar en cuenta espacios ni saltos
+    # (split_segments los recorta); None si ``prefix`` no es prefijo
+    i = 0
+    for ch in prefix:
+        if ch.isspace():
+            continue
+        while i < len(text) and text[i].isspace():
+            i += 1
+        if i >= len(text) or text[i] != ch:
+            return None
+        i += 1
+    return text[i:]
+
+class SegmentStream:
+    """
+    Arma segmentos a partir de tokens en streaming: el primero sale en cuanto se cierra
+    una viñeta/párrafo después de ``first_min_chars``; el resto sale de la respuesta final.
+    ``sent`` son los segmentos que un intento anterior ya envió.
+    """
+
+    def __init__(self, max_chars: int, first_min_chars: int, sent: list[str] | None = None):
+        self.max_chars = max_chars
+        self.first_min_chars = first_min_chars
+        self._buffer = ""
+        self.sent: list[str] = list(sent or [])
+
+    def feed(self, text: str) -> list[str]:
+        self._buffer += text
+        if self.sent or len(self._buffer) < self.first_min_chars:
+            return []
+        boundary = -1
+        for m in re.finditer(r"\n(?=\s*\n|\s*(?:[-•*]|\d+[.)])\s)", self._buffer):
+            if m.start() >= self.first_min_chars:
+                boundary = m.start()
+                break
+        if boundary < 0 and len(self._buffer) < self.max_chars:
+            return []
+        if boundary < 0:
+            boundary = self._buffer.rfind("\n", 0, self.max_chars)
+            if boundary <= 0:
+                return []
+        first, self._buffer = self._buffer[:boundary], self._buffer[boundary:]
+        self.sent = split_segments(first, self.max_chars)
+        return list(self.sent)
+
+    def reset(self) -> None:
+        # el paso terminó en tool calls: su texto no es parte de la respuesta final
+        self._buffer = ""
+
+    def finish(self, reply: str) -> list[str]:
+        """Segmentos de ``reply`` que faltan por enviar; así lo enviado es lo que se guarda en el historial."""
+        self._buffer = ""
+        rest = _after_prefix(reply, "\n".join(self.sent))
+        if rest is None:
+            # ya salió texto que no es prefijo de la respuesta (preámbulo de un paso con
+            # tool calls o reintento con otra respuesta): se envía la respuesta completa
+            log.warning("segment_stream_diverged", sent=len(self.sent))
+            metrics.inc("whatsapp_segments_diverged_total")
+            rest = reply
+        return split_segments(rest, self.max_chars)
+
+class DeliveryLog:
+    """
+    Segmentos enviados y pendientes de un mensaje entrante, en Redis: si el worker cae
+    a mitad de la respuesta, el reintento (reclaim) sólo envía lo que falta.
+    """
+
+    def __init__(self, redis, message_id: str):
+        self.redis = redis
+        self.key = f"wa:delivery:{message_id}"
+        self.sent: list[str] = []
+        # None mientras no se conoce la respuesta final
+        self.pending: list[str] | None = None
+
+    async def load(self) -> "DeliveryLog":
+        data = await self.redis.hgetall(self.key)
+        data = {(k.decode() if isinstance(k, bytes) else k): v for k, v in data.items()}
+        self.sent = json.loads(data["sent"]) if "sent" in data else []
+        self.pending = json.loads(data["pending"]) if "pending" in data else None
+        return self
+
+    async def _save(self) -> None:
+        mapping = {"sent": json.dumps(self.sent)}
+        if self.pending is not None:
+            mapping["pending"] = json.dumps(self.pending)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key, mapping=mapping)
+            pipe.expire(self.key, settings.QUEUE_RETENTION_S)
+            await pipe.execute()
+
+    async def plan(self, segments: list[str]) -> None:
+        self.pending = list(segments)
+        await self._save()
+
+    async def record(self, segment: str) -> None:
+        self.sent.append(segment)
+        if self.pending and self.pending[0] == segment:
+            self.pending.pop(0)
+        await self._save()
+
+    async def clear(self) -> None:
+        await self.redis.delete(self.key)
 
 class TwilioSender:
-    def __init__(self) -> None:
+    def __init__(self, client: httpx.AsyncClient | None = None) -> None:
         self.sid = settings.TWILIO_ACCOUNT_SID
         self.token = settings.TWILIO_AUTH_TOKEN
         self.from_whatsapp = settings.TWILIO_WHATSAPP_FROM
+        self._client = client
+        self._limiter = _limiters.setdefault(
+            self.sid, TokenBucket(settings.TWILIO_RATE_PER_S, settings.TWILIO_RATE_BURST)
+        )
 
-    async def send_whatsapp(self, to_number: str, body: str) -> None:
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # pool compartido: keep-alive/TLS reutilizado entre mensajes
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(15.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=settings.TWILIO_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.TWILIO_MAX_CONNECTIONS,
+                ),
+                auth=(self.sid, self.token),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _post(self, data: dict[str, str]) -> None:
         url = f"https://api.twilio.com/2010-04-01/Accounts/{self.sid}/Messages.json"
+        waited = await self._limiter.acquire()
+        if waited:
+            metrics.inc("twilio_rate_limited_total")
+        try:
+            r = await self.client.post(url, data=data)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # el POST nunca salió: reintentar no duplica el mensaje
+            raise TwilioRetryableError(f"Twilio transport error: {e}") from e
+        except httpx.TransportError as e:
+            # Messages.json no es idempotente: tras un timeout de lectura Twilio pudo haberlo
+            # aceptado. Sin reintento aquí; el mensaje queda pendiente para reclaim.
+            raise ExternalServiceError(f"Twilio transport error: {e}") from e
+        if r.status_code == 429 or r.status_code >= 500:
+            metrics.inc("twilio_errors_total", status=r.status_code)
+            raise TwilioRetryableError(
+                f"Twilio error {r.status_code}: {r.text[:200]}",
+                retry_after=_parse_retry_after(r.headers.get("Retry-After")),
+            )
+        if r.status_code >= 400:
+            metrics.inc("twilio_errors_total", status=r.status_code)
+            raise ExternalServiceError(f"Twilio error {r.status_code}: {r.text[:200]}")
+
+    async def send_segment(self, to_number: str, body: str) -> None:
         data = {"From": self.from_whatsapp, "To": to_number, "Body": body}
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            r = await client.post(url, data=data, auth=(self.sid, self.token))
-            if r.status_code >= 400:
-                raise ExternalServiceError(f"Twilio error {r.status_code}: {r.text[:200]}")
\ No newline at end of file
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(settings.TWILIO_MAX_RETRIES + 1),
+            wait=_wait,
+            retry=retry_if_exception_type(TwilioRetryableError),
+            reraise=True,
+        ):
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    metrics.inc("twilio_retries_total")
+                await self._post(data)
+        metrics.inc("twilio_messages_sent_total")
+
+    async def send_whatsapp(self, to_number: str, body: str) -> None:
+        segments = reply_segments(body)
+        # en orden: cada segmento espera al anterior
+        for segment in segments:
+            await self.send_segment(to_number, segment)
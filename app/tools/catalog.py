@@ -1,8 +1,46 @@
-from dataclasses import dataclass
-from sqlalchemy import select, and_
+import base64
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import Any, Callable
+
+from sqlalchemy import Select, select, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.db.models import Car
 
+# Paginación keyset: se ordena por (llave, id) y el cursor guarda la última fila
+# vista, así la página N cuesta lo mismo que la primera (sin OFFSET).
+
+# mileage_km es nullable: los autos sin kilometraje van al final
+_NO_MILEAGE = 2_147_483_647
+
+
+@dataclass(frozen=True)
+class _Sort:
+    key: Any
+    descending: bool
+    value: Callable[[Car], Any]
+
+
+SORTS: dict[str, _Sort] = {
+    "price_asc": _Sort(Car.price_mxn, False, lambda c: str(c.price_mxn)),
+    "price_desc": _Sort(Car.price_mxn, True, lambda c: str(c.price_mxn)),
+    "year_desc": _Sort(Car.year, True, lambda c: c.year),
+    "year_asc": _Sort(Car.year, False, lambda c: c.year),
+    "mileage_asc": _Sort(
+        func.coalesce(Car.mileage_km, _NO_MILEAGE),
+        False,
+        lambda c: c.mileage_km if c.mileage_km is not None else _NO_MILEAGE,
+    ),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
 @dataclass(frozen=True)
 class CatalogQuery:
     make: str | None = None
@@ -14,21 +52,86 @@ class CatalogQuery:
     city: str | None = None
     transmission: str | None = None
     limit: int = 5
+    sort: str = "price_asc"
+    cursor: str | None = None
+
+    def fingerprint(self) -> str:
+        # filtros + orden: un cursor sólo vale para la misma búsqueda
+        data = {k: v for k, v in asdict(self).items() if k not in ("limit", "cursor")}
+        return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class CatalogPage:
+    items: list[dict]
+    next_cursor: str | None
+    # total aproximado: con total_capped=True hay al menos ``total`` resultados
+    total: int
+    total_capped: bool
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "results": self.items,
+            "next_cursor": self.next_cursor,
+            "total": self.total,
+            "total_capped": self.total_capped,
+        }
+
+
+def encode_cursor(q: CatalogQuery, key: Any, last_id: int, total: int, capped: bool) -> str:
+    payload = {"f": q.fingerprint(), "k": key, "i": last_id, "t": total, "c": capped}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(q: CatalogQuery) -> dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(q.cursor + "=" * (-len(q.cursor) % 4))
+        payload = json.loads(raw)
+        payload["i"] = int(payload["i"])
+        payload["k"], payload["t"], payload["c"]
+    except Exception as e:
+        raise InvalidCursor("malformed cursor") from e
+    if payload.get("f") != q.fingerprint():
+        raise InvalidCursor("cursor belongs to a different search")
+    return payload
+
+
+def resolve_cursor(q: CatalogQuery) -> tuple[tuple[Any, int], int, bool]:
+    """Cursor de ``q`` -> ((llave, id) de la última fila vista, total, total_capped)."""
+    cur = decode_cursor(q)
+    try:
+        key = Decimal(cur["k"]) if SORTS[q.sort].key is Car.price_mxn else int(cur["k"])
+    except (ArithmeticError, TypeError, ValueError) as e:
+        raise InvalidCursor("malformed cursor key") from e
+    return (key, cur["i"]), cur["t"], cur["c"]
+
 
 async def known_make_model_pairs(session: AsyncSession) -> list[str]:
     rows = (await session.execute(select(Car.make, Car.model).distinct())).all()
     return [f"{r[0]} {r[1]}".strip().lower() for r in rows]
 
-async def search_catalog(session: AsyncSession, q: CatalogQuery) -> list[dict]:
+async def known_make_models(session: AsyncSession) -> list[tuple[str, str]]:
+    rows = (await session.execute(select(Car.make, Car.model).distinct())).all()
+    return [(r[0].strip().lower(), r[1].strip().lower()) for r in rows]
+
+def norm_text(v: str) -> str:
+    return v.strip().lower()
+
+
+def _filters(q: CatalogQuery) -> list:
+    # igualdad sobre lower(col): usa los índices de app.db.models (ilike no puede)
     filters = []
     if q.make:
-        filters.append(Car.make.ilike(q.make))
+        filters.append(func.lower(Car.make) == norm_text(q.make))
     if q.model:
-        filters.append(Car.model.ilike(q.model))
+        filters.append(func.lower(Car.model) == norm_text(q.model))
     if q.city:
-        filters.append(Car.city.ilike(q.city))
+        filters.append(func.lower(Car.city) == norm_text(q.city))
     if q.transmission:
-        filters.append(Car.transmission.ilike(q.transmission))
+        # el IS NOT NULL explícito habilita el índice parcial
+        filters.append(Car.transmission.is_not(None))
+        filters.append(func.lower(Car.transmission) == norm_text(q.transmission))
     if q.year_min is not None:
         filters.append(Car.year >= q.year_min)
     if q.year_max is not None:
@@ -37,25 +140,64 @@ async def search_catalog(session: AsyncSession, q: CatalogQuery) -> list[dict]:
         filters.append(Car.price_mxn >= q.price_min)
     if q.price_max is not None:
         filters.append(Car.price_mxn <= q.price_max)
+    return filters
 
-    stmt = select(Car).where(and_(*filters)) if filters else select(Car)
-    stmt = stmt.order_by(Car.price_mxn.asc()).limit(q.limit)
-
-    res = await session.execute(stmt)
-    cars = res.scalars().all()
-
-    return [
-        {
-            "id": c.id,
-            "make": c.make,
-            "model": c.model,
-            "year": c.year,
-            "price_mxn": float(c.price_mxn),
-            "city": c.city,
-            "mileage_km": c.mileage_km,
-            "transmission": c.transmission,
-            "fuel": c.fuel,
-            "body_type": c.body_type,
-        }
-        for c in cars
-    ]
\ No newline at end of file
+
+def car_dict(c: Car) -> dict:
+    return {
+        "id": c.id,
+        "make": c.make,
+        "model": c.model,
+        "year": c.year,
+        "price_mxn": float(c.price_mxn),
+        "city": c.city,
+        "mileage_km": c.mileage_km,
+        "transmission": c.transmission,
+        "fuel": c.fuel,
+        "body_type": c.body_type,
+    }
+
+
+async def count_matches(session: AsyncSession, filters: list, cap: int) -> tuple[int, bool]:
+    # COUNT sobre un LIMIT: deja de contar al llegar al tope
+    sub = select(Car.id).where(*filters).limit(cap + 1).subquery()
+    n = (await session.execute(select(func.count()).select_from(sub))).scalar_one()
+    return min(n, cap), n > cap
+
+
+def search_stmt(q: CatalogQuery, after: tuple[Any, int] | None = None) -> Select:
+    """SELECT de una página: filtros, keyset a partir de ``after`` = (llave, id) y LIMIT + 1."""
+    sort = SORTS[q.sort]
+    stmt = select(Car).where(*_filters(q))
+    if after is not None:
+        # comparación de row values: aprovecha los índices (..., llave, id)
+        row, bound = tuple_(sort.key, Car.id), tuple_(*after)
+        stmt = stmt.where(row < bound if sort.descending else row > bound)
+    if sort.descending:
+        stmt = stmt.order_by(sort.key.desc(), Car.id.desc())
+    else:
+        stmt = stmt.order_by(sort.key.asc(), Car.id.asc())
+    # una fila extra para saber si hay otra página
+    return stmt.limit(q.limit + 1)
+
+
+async def search_catalog_page(session: AsyncSession, q: CatalogQuery) -> CatalogPage:
+    sort = SORTS.get(q.sort)
+    if sort is None:
+        raise ValueError(f"unknown sort: {q.sort}")
+
+    after = None
+    if q.cursor:
+        after, total, capped = resolve_cursor(q)
+    else:
+        total, capped = await count_matches(session, _filters(q), settings.CATALOG_COUNT_CAP)
+
+    cars = (await session.execute(search_stmt(q, after))).scalars().all()
+    more = len(cars) > q.limit
+    cars = cars[: q.limit]
+    next_cursor = encode_cursor(q, sort.value(cars[-1]), cars[-1].id, total, capped) if more else None
+    return CatalogPage(items=[car_dict(c) for c in cars], next_cursor=next_cursor, total=total, total_capped=capped)
+
+
+async def search_catalog(session: AsyncSession, q: CatalogQuery) -> list[dict]:
+    return (await search_catalog_page(session, q)).items
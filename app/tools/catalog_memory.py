@@ -0,0 +1,213 @@
+import asyncio
+import math
+import time
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+import structlog
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.versions import CATALOG, get_version
+from app.db.models import Car
+from app.tools.catalog import _NO_MILEAGE, CatalogPage, CatalogQuery, car_dict, encode_cursor, norm_text, resolve_cursor
+
+log = structlog.get_logger()
+
+# Motor de búsqueda en proceso (CATALOG_ENGINE=memory): snapshot de cars en columnas
+# NumPy, filtrado vectorizado y top-k por (llave, id). Devuelve exactamente lo mismo
+# que search_catalog_page (items, cursores y total) y se recarga al cambiar version:catalog.
+
+_COLUMNS = (
+    Car.id,
+    Car.make,
+    Car.model,
+    Car.year,
+    Car.price_mxn,
+    Car.city,
+    Car.mileage_km,
+    Car.transmission,
+    Car.fuel,
+    Car.body_type,
+)
+_TEXT_FILTERS = ("make", "model", "city", "transmission")
+
+# sort -> (columna numérica, descendente); las mismas llaves que catalog.SORTS
+_SORTS = {
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+    "year_desc": ("year", True),
+    "year_asc": ("year", False),
+    "mileage_asc": ("mileage", False),
+}
+
+
+def _dictionary_encode(values: list[str | None]) -> tuple[np.ndarray, dict[str, int]]:
+    # el diccionario es sobre lower(valor), igual que los filtros SQL; NULL -> -1
+    codes: dict[str, int] = {}
+    out = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        out[i] = -1 if v is None else codes.setdefault(v.lower(), len(codes))
+    return out, codes
+
+
+def _cents(v: Any) -> int:
+    return int(Decimal(str(v)) * 100)
+
+
+class ColumnarCatalog:
+    def __init__(self, rows: list[Any], version: int = 0):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.items = [car_dict(r) for r in rows]
+        # Decimal original de price_mxn: el cursor lleva el mismo texto que en SQL
+        self._prices = [r.price_mxn for r in rows]
+
+        n = len(rows)
+        self.id = np.fromiter((r.id for r in rows), dtype=np.int64, count=n)
+        self.columns = {
+            "price": np.fromiter((_cents(r.price_mxn) for r in rows), dtype=np.int64, count=n),
+            "year": np.fromiter((r.year for r in rows), dtype=np.int64, count=n),
+            # como coalesce(mileage_km, _NO_MILEAGE) en SQL
+            "mileage": np.fromiter(
+                (r.mileage_km if r.mileage_km is not None else _NO_MILEAGE for r in rows), dtype=np.int64, count=n
+            ),
+        }
+        self.codes: dict[str, np.ndarray] = {}
+        self.dictionaries: dict[str, dict[str, int]] = {}
+        for name in _TEXT_FILTERS:
+            self.codes[name], self.dictionaries[name] = _dictionary_encode([getattr(r, name) for r in rows])
+
+        # rango de cada fila en el orden (llave, id) ascendente; el descendente es el inverso
+        self._ranks: dict[str, np.ndarray] = {}
+        for name, keys in self.columns.items():
+            rank = np.empty(n, dtype=np.int64)
+            rank[np.lexsort((self.id, keys))] = np.arange(n)
+            self._ranks[name] = rank
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _mask(self, q: CatalogQuery) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for name in _TEXT_FILTERS:
+            value = getattr(q, name)
+            if not value:
+                continue
+            code = self.dictionaries[name].get(norm_text(value))
+            if code is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.codes[name] == code
+        year, price = self.columns["year"], self.columns["price"]
+        if q.year_min is not None:
+            mask &= year >= q.year_min
+        if q.year_max is not None:
+            mask &= year <= q.year_max
+        if q.price_min is not None:
+            mask &= price >= math.ceil(Decimal(str(q.price_min)) * 100)
+        if q.price_max is not None:
+            mask &= price <= math.floor(Decimal(str(q.price_max)) * 100)
+        return mask
+
+    def _cursor_key(self, column: str, i: int) -> Any:
+        if column == "price":
+            return str(self._prices[i])
+        return int(self.columns[column][i])
+
+    def search_page(self, q: CatalogQuery) -> CatalogPage:
+        if q.sort not in _SORTS:
+            raise ValueError(f"unknown sort: {q.sort}")
+        column, descending = _SORTS[q.sort]
+        keys = self.columns[column]
+        mask = self._mask(q)
+
+        if q.cursor:
+            (key, last_id), total, capped = resolve_cursor(q)
+            key = _cents(key) if column == "price" else key
+            if descending:
+                mask &= (keys < key) | ((keys == key) & (self.id < last_id))
+            else:
+                mask &= (keys > key) | ((keys == key) & (self.id > last_id))
+            idx = np.flatnonzero(mask)
+        else:
+            idx = np.flatnonzero(mask)
+            cap = settings.CATALOG_COUNT_CAP
+            total, capped = min(len(idx), cap), len(idx) > cap
+
+        # top-k (limit + 1 para saber si hay otra página) sin ordenar todos los candidatos
+        rank = self._ranks[column][idx]
+        if descending:
+            rank = -rank
+        take = q.limit + 1
+        if len(idx) > take:
+            part = np.argpartition(rank, take - 1)[:take]
+            idx, rank = idx[part], rank[part]
+        idx = idx[np.argsort(rank)]
+
+        more = len(idx) > q.limit
+        idx = idx[: q.limit]
+        next_cursor = None
+        if more:
+            last = int(idx[-1])
+            next_cursor = encode_cursor(q, self._cursor_key(column, last), int(self.id[last]), total, capped)
+        return CatalogPage(
+            items=[dict(self.items[i]) for i in idx], next_cursor=next_cursor, total=total, total_capped=capped
+        )
+
+
+async def load_catalog(session: AsyncSession, version: int = 0) -> ColumnarCatalog:
+    started = time.perf_counter()
+    rows = (await session.execute(select(*_COLUMNS))).all()
+    # armar las columnas toma cientos de ms con el catálogo completo: fuera del event loop
+    catalog = await asyncio.to_thread(ColumnarCatalog, rows, version)
+    log.info("catalog_memory_loaded", cars=len(catalog), version=version, ms=round((time.perf_counter() - started) * 1000))
+    return catalog
+
+
+# Snapshot en proceso; se revalida contra version:catalog cada CATALOG_MEMORY_CHECK_S.
+# Sin Redis no hay versión que revisar: vale hasta invalidate_catalog().
+_cache: ColumnarCatalog | None = None
+# una sola carga a la vez: las corrutinas concurrentes esperan el mismo snapshot
+_lock: asyncio.Lock | None = None
+
+
+def invalidate_catalog() -> None:
+    global _cache
+    _cache = None
+
+
+def _load_lock() -> asyncio.Lock:
+    global _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    return _lock
+
+
+async def get_catalog(session: AsyncSession, redis: Redis | None = None) -> ColumnarCatalog:
+    global _cache
+    lock = _load_lock()
+    if _cache is not None:
+        # mientras otra corrutina recarga se sigue sirviendo el snapshot anterior
+        if redis is None or lock.locked() or time.monotonic() - _cache.loaded_at < settings.CATALOG_MEMORY_CHECK_S:
+            return _cache
+
+    version = await get_version(redis, CATALOG) if redis is not None else 0
+    if _cache is not None:
+        if _cache.version == version:
+            _cache.loaded_at = time.monotonic()
+            return _cache
+        if lock.locked():
+            return _cache
+
+    async with lock:
+        # quien esperaba el lock encuentra ya cargado el snapshot de esta versión
+        if _cache is None or _cache.version != version:
+            _cache = await load_catalog(session, version)
+        return _cache
+
+
+async def search_catalog_page_memory(session: AsyncSession, q: CatalogQuery, redis: Redis | None = None) -> CatalogPage:
+    return (await get_catalog(session, redis)).search_page(q)
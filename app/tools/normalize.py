@@ -1,5 +1,11 @@
+from collections import defaultdict
 from dataclasses import dataclass
-from rapidfuzz import process, fuzz
+from typing import Sequence
+import heapq
+import re
+
+import numpy as np
+from rapidfuzz import process, fuzz, utils
 
 @dataclass(frozen=True)
 class NormalizedMakeModel:
@@ -15,30 +21,267 @@ ALIASES = {
     "bmv": "bmw",
 }
 
+# Marcas de varias palabras: "alfa romeo giulia" no se puede partir en el primer espacio
+MULTIWORD_MAKES = (
+    "alfa romeo",
+    "aston martin",
+    "great wall",
+    "land rover",
+    "mercedes benz",
+    "rolls royce",
+)
+
+# Aliases de marca aprendidos en runtime (typo frecuente → marca, score original).
+# Compartidos entre índices para sobrevivir a recargas del vocabulario. Sólo se
+# aprenden de coincidencias confirmadas por el modelo (ver _pick) y con tope de tamaño.
+LEARNED_ALIASES: dict[str, tuple[str, float]] = {}
+MAX_LEARNED_ALIASES = 1_000
+_ALIAS_RE = re.compile(r"^[a-z0-9áéíóúüñ][a-z0-9áéíóúüñ -]{1,31}$")
+
+MAKE_SCORE_CUTOFF = 70.0
+# Marcas candidatas a probar cuando la marca no es exacta
+MAKE_CANDIDATES = 3
+ALIAS_LEARN_SCORE = 90.0
+# Por debajo de este tamaño comparar todo es más barato que bloquear por trigramas
+BLOCKING_MIN_CHOICES = 64
+BLOCKING_MAX_CANDIDATES = 64
+# Trigramas presentes en más de esta fracción de choices no discriminan
+STOP_GRAM_RATIO = 0.2
+
 def normalize_token(token: str) -> str:
     t = token.strip().lower()
     return ALIASES.get(t, t)
 
-def best_match(query: str, choices: list[str], limit: int = 5) -> list[tuple[str, float]]:
+def learn_alias(alias: str, make: str, score: float = 100.0) -> None:
+    a = alias.strip().lower()
+    if a == make or a in ALIASES or not _ALIAS_RE.match(a):
+        return
+    if a not in LEARNED_ALIASES and len(LEARNED_ALIASES) >= MAX_LEARNED_ALIASES:
+        return
+    LEARNED_ALIASES[a] = (make, score)
+
+def prepare_choices(choices: Sequence[str]) -> list[str]:
+    return [utils.default_process(c) for c in choices]
+
+def best_match(
+    query: str,
+    choices: Sequence[str],
+    limit: int = 5,
+    prepared: Sequence[str] | None = None,
+) -> list[tuple[str, float]]:
+    # Barrido lineal (referencia); el camino normal es MakeModelIndex
     if not choices:
         return []
-    matches = process.extract(query, choices, scorer=fuzz.WRatio, limit=limit)
-    return [(m[0], float(m[1])) for m in matches]
-
-def normalize_make_model(raw_make: str | None, raw_model: str | None, known_pairs: list[str]) -> NormalizedMakeModel:
-    if not raw_make and not raw_model:
-        return NormalizedMakeModel(None, None, 0.0, [])
-
-    make = normalize_token(raw_make) if raw_make else ""
-    model = normalize_token(raw_model) if raw_model else ""
-    query = (make + " " + model).strip()
-
-    candidates = best_match(query, known_pairs, limit=5)
-    if not candidates:
-        return NormalizedMakeModel(raw_make, raw_model, 0.0, [])
-
-    top, score = candidates[0]
-    parts = top.split(" ", 1)
-    norm_make = parts[0] if parts else None
-    norm_model = parts[1] if len(parts) > 1 else None
-    return NormalizedMakeModel(norm_make, norm_model, score, [c[0] for c in candidates])
\ No newline at end of file
+    if prepared is None:
+        prepared = prepare_choices(choices)
+    matches = process.extract(utils.default_process(query), prepared, scorer=fuzz.WRatio, limit=limit)
+    return [(choices[m[2]], float(m[1])) for m in matches]
+
+def _trigrams(s: str) -> set[str]:
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+class _BlockedChoices:
+    """Choices procesadas + índice invertido de trigramas para preseleccionar candidatos."""
+
+    def __init__(self, choices: Sequence[str]):
+        self.choices = [utils.default_process(c) for c in choices]
+        self._postings: dict[str, list[int]] | None = None
+        if len(self.choices) > BLOCKING_MIN_CHOICES:
+            postings: dict[str, list[int]] = defaultdict(list)
+            for i, c in enumerate(self.choices):
+                for g in _trigrams(c):
+                    postings[g].append(i)
+            self._postings = dict(postings)
+
+    def _candidates(self, query: str) -> list[int] | None:
+        if self._postings is None:
+            return None
+        stop = max(1, int(len(self.choices) * STOP_GRAM_RATIO))
+        lists = [self._postings[g] for g in _trigrams(query) if g in self._postings]
+        selective = [p for p in lists if len(p) <= stop] or lists
+        counts: dict[int, int] = defaultdict(int)
+        for p in selective:
+            for i in p:
+                counts[i] += 1
+        if not counts:
+            return None
+        return heapq.nlargest(BLOCKING_MAX_CANDIDATES, counts, key=counts.__getitem__)
+
+    def extract(self, query: str, limit: int = 5) -> list[tuple[int, float]]:
+        idx = self._candidates(query)
+        if idx is None:
+            return [(m[2], float(m[1])) for m in process.extract(query, self.choices, scorer=fuzz.WRatio, limit=limit)]
+        sub = [self.choices[i] for i in idx]
+        return [(idx[m[2]], float(m[1])) for m in process.extract(query, sub, scorer=fuzz.WRatio, limit=limit)]
+
+def split_make_model(pair: str) -> tuple[str, str] | None:
+    p = " ".join(pair.strip().lower().split())
+    for make in MULTIWORD_MAKES:
+        if p.startswith(make + " "):
+            return make, p[len(make) + 1:]
+    parts = p.split(" ", 1)
+    return (parts[0], parts[1]) if len(parts) == 2 else None
+
+class MakeModelIndex:
+    """
+    Normalizador en dos etapas: primero resuelve la marca contra el vocabulario de
+    marcas (pequeño) y luego el modelo sólo dentro de los modelos de esa marca.
+    """
+
+    def __init__(self, pairs: Sequence[tuple[str, str]]):
+        self.pairs = sorted({(mk.strip().lower(), md.strip().lower()) for mk, md in pairs if mk and md})
+        self.makes = sorted({mk for mk, _ in self.pairs})
+        self._make_set = set(self.makes)
+        self._make_choices = prepare_choices(self.makes)
+
+        models: dict[str, list[str]] = defaultdict(list)
+        for mk, md in self.pairs:
+            models[mk].append(md)
+        self._models = dict(models)
+        # Los modelos se puntúan como "marca modelo": WRatio sobre nombres cortos
+        # de modelo sueltos cae en partial_ratio y confunde modelos parecidos
+        self._model_blocks = {mk: _BlockedChoices([f"{mk} {md}" for md in mds]) for mk, mds in self._models.items()}
+
+        # Sin marca confiable: búsqueda global por modelo o por "marca modelo"
+        self._all_models = _BlockedChoices([md for _, md in self.pairs])
+        self._all_pairs = _BlockedChoices([f"{mk} {md}" for mk, md in self.pairs])
+
+    @classmethod
+    def from_strings(cls, pairs: Sequence[str]) -> "MakeModelIndex":
+        # Formato "make model" de known_make_model_pairs; preferir tuplas (known_make_models)
+        return cls([sp for sp in (split_make_model(p) for p in pairs) if sp is not None])
+
+    def _known_make(self, token: str) -> tuple[str, float] | None:
+        if token in self._make_set:
+            return token, 100.0
+        learned = LEARNED_ALIASES.get(token)
+        if learned and learned[0] in self._make_set:
+            return learned
+        return None
+
+    def _make_candidates(self, raw_make: str) -> list[tuple[str, float]]:
+        token = normalize_token(raw_make)
+        known = self._known_make(token)
+        if known:
+            return [known]
+        matches = process.extract(
+            utils.default_process(token),
+            self._make_choices,
+            scorer=fuzz.WRatio,
+            limit=MAKE_CANDIDATES,
+            score_cutoff=MAKE_SCORE_CUTOFF,
+        )
+        return [(self.makes[m[2]], float(m[1])) for m in matches]
+
+    def resolve_make(self, raw_make: str) -> tuple[str | None, float]:
+        cands = self._make_candidates(raw_make)
+        if not cands:
+            return None, 0.0
+        return cands[0]
+
+    def _pick(
+        self, raw_make: str, options: list[tuple[str, float, list[tuple[int, float]]]]
+    ) -> NormalizedMakeModel:
+        # Con marca dudosa se prueban varias marcas y gana la mejor combinación marca+modelo
+        make, make_score, hits = max(options, key=lambda o: o[1] + o[2][0][1])
+        # sólo se aprende el alias si el modelo confirma la marca
+        if make_score >= ALIAS_LEARN_SCORE and hits[0][1] >= ALIAS_LEARN_SCORE:
+            learn_alias(normalize_token(raw_make), make, make_score)
+        models = self._models[make]
+        # la confianza es la de la etapa más débil
+        return self._result([(make, models[i]) for i, _ in hits], min(make_score, hits[0][1]))
+
+    def _result(self, cands: list[tuple[str, str]], confidence: float) -> NormalizedMakeModel:
+        top_make, top_model = cands[0]
+        return NormalizedMakeModel(top_make, top_model, confidence, [f"{mk} {md}" for mk, md in cands])
+
+    def normalize(self, raw_make: str | None, raw_model: str | None) -> NormalizedMakeModel:
+        if not raw_make and not raw_model:
+            return NormalizedMakeModel(None, None, 0.0, [])
+
+        model_q = utils.default_process(normalize_token(raw_model)) if raw_model else ""
+
+        if raw_make and not model_q:
+            make, make_score = self.resolve_make(raw_make)
+            if make is not None:
+                return NormalizedMakeModel(make, None, make_score, [f"{make} {md}" for md in self._models[make][:5]])
+
+        if raw_make and model_q:
+            options = []
+            for make, make_score in self._make_candidates(raw_make):
+                hits = self._model_blocks[make].extract(utils.default_process(f"{make} {model_q}"), limit=5)
+                if hits:
+                    options.append((make, make_score, hits))
+            if options:
+                return self._pick(raw_make, options)
+
+        if raw_make:
+            # la marca no se reconoció: puede venir mezclada con el modelo
+            query = utils.default_process(f"{normalize_token(raw_make)} {model_q}")
+            hits = self._all_pairs.extract(query, limit=5)
+        else:
+            hits = self._all_models.extract(model_q, limit=5)
+
+        if not hits:
+            return NormalizedMakeModel(raw_make, raw_model, 0.0, [])
+        return self._result([self.pairs[i] for i, _ in hits], hits[0][1])
+
+    def normalize_many(self, items: Sequence[tuple[str | None, str | None]]) -> list[NormalizedMakeModel]:
+        """Normaliza varios autos a la vez puntuando en lote (process.cdist) por etapa."""
+        n = len(items)
+        make_cands: list[list[tuple[str, float]]] = [[] for _ in range(n)]
+
+        # 1) marcas: exactas/alias por dict, el resto en un solo cdist
+        pending: list[int] = []
+        for i, (raw_make, raw_model) in enumerate(items):
+            if not raw_make or not raw_model:
+                continue
+            known = self._known_make(normalize_token(raw_make))
+            if known:
+                make_cands[i] = [known]
+            else:
+                pending.append(i)
+
+        if pending and self._make_choices:
+            queries = [utils.default_process(normalize_token(items[i][0])) for i in pending]
+            scores = process.cdist(queries, self._make_choices, scorer=fuzz.WRatio, workers=-1, dtype=np.float64)
+            for row, i in enumerate(pending):
+                order = np.argsort(-scores[row], kind="stable")[:MAKE_CANDIDATES]
+                make_cands[i] = [
+                    (self.makes[j], float(scores[row, j])) for j in order if scores[row, j] >= MAKE_SCORE_CUTOFF
+                ]
+
+        # 2) modelos agrupados por marca: un cdist por marca
+        groups: dict[str, list[int]] = defaultdict(list)
+        for i, cands in enumerate(make_cands):
+            for mk, _ in cands:
+                groups[mk].append(i)
+
+        hits: dict[tuple[int, str], list[tuple[int, float]]] = {}
+        for mk, idxs in groups.items():
+            queries = [utils.default_process(f"{mk} {normalize_token(items[i][1])}") for i in idxs]
+            scores = process.cdist(queries, self._model_blocks[mk].choices, scorer=fuzz.WRatio, workers=-1, dtype=np.float64)
+            for row, i in enumerate(idxs):
+                order = np.argsort(-scores[row], kind="stable")[:5]
+                hits[(i, mk)] = [(int(j), float(scores[row, j])) for j in order]
+
+        # 3) elegir la mejor marca por fila; el resto (sin marca o sin modelo) por el camino individual
+        results: list[NormalizedMakeModel] = []
+        for i, cands in enumerate(make_cands):
+            options = [(mk, ms, hits[(i, mk)]) for mk, ms in cands if hits.get((i, mk))]
+            results.append(self._pick(items[i][0], options) if options else self.normalize(*items[i]))
+        return results
+
+def normalize_make_model(
+    raw_make: str | None,
+    raw_model: str | None,
+    known_pairs: Sequence[str] | Sequence[tuple[str, str]] | MakeModelIndex,
+) -> NormalizedMakeModel:
+    if isinstance(known_pairs, MakeModelIndex):
+        index = known_pairs
+    elif known_pairs and isinstance(known_pairs[0], tuple):
+        index = MakeModelIndex(known_pairs)
+    else:
+        index = MakeModelIndex.from_strings(known_pairs)
+    return index.normalize(raw_make, raw_model)
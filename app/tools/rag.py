@@ -1,79 +1,119 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+from typing import Any
+
+from redis.asyncio import Redis
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.db.models import KnowledgeChunk
-from app.rag.embeddings import Embedder
-from app.rag.qdrant_store import get_client
+from app.rag.embeddings import embed_query
+from app.rag.hybrid import reciprocal_rank_fusion
+from app.rag.lexical import search_lexical
+from app.rag.qdrant_store import get_breaker, get_client
+from app.rag.rerank import rerank
 
 logger = logging.getLogger(__name__)
-_embedder = Embedder()
 
-async def retrieve_kavak_knowledge(session: AsyncSession, query: str, top_k: int = 4) -> list[dict]:
-    # 1) Intento vectorial con Qdrant (API async compatible)
-    try:
-        client = await get_client()
-        qvec = _embedder.embed([query])[0]
+def _hit_to_dict(hit: Any) -> dict | None:
+    payload = getattr(hit, "payload", None) or {}
+    content = payload.get("content")
+    if not content:
+        return None
+    return {
+        "source": payload.get("source"),
+        "title": payload.get("title"),
+        "content": content,
+        "score": float(getattr(hit, "score", 0.0) or 0.0),
+    }
 
-        # API nueva: query_points()
-        if hasattr(client, "query_points"):
-            resp = await client.query_points(
-                collection_name=settings.QDRANT_COLLECTION,
-                query=qvec,
-                limit=top_k,
-                with_payload=True,
-            )
-            hits = getattr(resp, "points", None) or []
-            results = []
-            for p in hits:
-                payload = p.payload or {}
-                content = payload.get("content")
-                if not content:
-                    continue
-                results.append(
-                    {
-                        "source": payload.get("source"),
-                        "title": payload.get("title"),
-                        "content": content,
-                        "score": float(getattr(p, "score", 0.0) or 0.0),
-                    }
-                )
-            if results:
-                return results[:top_k]
+async def _qdrant_search(qvec: Any, top_k: int) -> list[dict]:
+    client = await get_client()
 
-        # API vieja (sync o async dependiendo versión): search()
-        if hasattr(client, "search"):
-            hits = await client.search(  # type: ignore[attr-defined]
-                collection_name=settings.QDRANT_COLLECTION,
-                query_vector=qvec,
-                limit=top_k,
-                with_payload=True,
-            )
-            results = []
-            for h in hits:
-                payload = getattr(h, "payload", None) or {}
-                content = payload.get("content")
-                if not content:
-                    continue
-                results.append(
-                    {
-                        "source": payload.get("source"),
-                        "title": payload.get("title"),
-                        "content": content,
-                        "score": float(getattr(h, "score", 0.0) or 0.0),
-                    }
-                )
-            if results:
-                return results[:top_k]
+    # API nueva: query_points()
+    if hasattr(client, "query_points"):
+        resp = await client.query_points(
+            collection_name=settings.QDRANT_COLLECTION,
+            query=qvec,
+            limit=top_k,
+            with_payload=True,
+        )
+        hits = getattr(resp, "points", None) or []
+    # API vieja (sync o async dependiendo versión): search()
+    elif hasattr(client, "search"):
+        hits = await client.search(  # type: ignore[attr-defined]
+            collection_name=settings.QDRANT_COLLECTION,
+            query_vector=qvec,
+            limit=top_k,
+            with_payload=True,
+        )
+    else:
+        raise RuntimeError("El cliente Qdrant no tiene query_points() ni search()")
 
-        logger.warning("El cliente Qdrant no tiene query_points() ni search(). Se recurre a Postgres.")
+    return [r for r in (_hit_to_dict(h) for h in hits) if r is not None][:top_k]
+
+async def _dense_search(query: str, top_k: int, redis: Redis | None) -> list[dict]:
+    # Qdrant, salvo que el breaker esté abierto; cualquier fallo devuelve [] (el léxico cubre)
+    breaker = get_breaker()
+    if not breaker.allow():
+        metrics.inc("rag_short_circuit_total")
+        return []
+    try:
+        qvec = await embed_query(query, redis)
     except Exception:
-        logger.exception("Error en la recuperación de Qdrant. Se está volviendo a Postgres.")
+        logger.exception("Error generando el embedding de la consulta. Sólo búsqueda léxica.")
+        return []
+    try:
+        results = await asyncio.wait_for(_qdrant_search(qvec, top_k), settings.QDRANT_TIMEOUT_S)
+    except Exception:
+        breaker.record_failure()
+        logger.exception("Error en la recuperación de Qdrant. Sólo búsqueda léxica.")
+        return []
+    breaker.record_success()
+    return results
+
+async def _lexical_search(session: AsyncSession, query: str, top_k: int) -> list[dict]:
+    # Igual que el denso: un fallo (p.ej. falta search_tsv) no tumba la tool, se fusiona lo que haya
+    try:
+        return await search_lexical(session, query, top_k)
+    except Exception:
+        metrics.inc("rag_lexical_errors_total")
+        logger.exception("Error en la búsqueda léxica. Sólo búsqueda densa.")
+        # en Postgres la transacción queda abortada: se limpia para el fallback de abajo
+        await session.rollback()
+        return []
+
+async def retrieve_kavak_knowledge(
+    session: AsyncSession,
+    query: str,
+    top_k: int = 4,
+    redis: Redis | None = None,
+) -> list[dict]:
+    top_k = max(1, min(top_k, settings.RAG_TOP_K_MAX))
+    n_candidates = max(top_k, settings.RAG_CANDIDATES)
+
+    # 1) Denso (Qdrant) y léxico (Postgres FTS / BM25) en paralelo
+    dense, lexical = await asyncio.gather(
+        _dense_search(query, n_candidates, redis),
+        _lexical_search(session, query, n_candidates),
+    )
+
+    # 2) Fusión RRF (dedup por stable_point_id) y rerank opcional dentro del presupuesto
+    fused = reciprocal_rank_fusion([dense, lexical], k=settings.RAG_RRF_K)
+    if settings.RAG_RERANK and fused:
+        fused = await rerank(query, fused[:n_candidates], settings.RAG_RERANK_BUDGET_MS)
+
+    if fused:
+        path = "hybrid" if dense and lexical else ("qdrant" if dense else "postgres")
+        metrics.inc("rag_served_total", path=path)
+        return fused[:top_k]
 
-    # 2) Fallback: Postgres. Nunca falla si hay chunks.
+    # 3) Sin coincidencias: últimos chunks. Nunca falla si hay chunks.
+    metrics.inc("rag_served_total", path="postgres")
     stmt = select(KnowledgeChunk).order_by(KnowledgeChunk.id.desc()).limit(top_k)
     rows = (await session.execute(stmt)).scalars().all()
-    return [{"source": r.source, "title": r.title, "content": r.content, "score": 0.0} for r in rows]
\ No newline at end of file
+    return [{"source": r.source, "title": r.title, "content": r.content, "score": 0.0} for r in rows]
@@ -0,0 +1,74 @@
+import json
+import time
+from dataclasses import dataclass
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.versions import CATALOG, get_version
+from app.tools.catalog import known_make_models
+from app.tools.normalize import MakeModelIndex
+
+
+@dataclass(frozen=True)
+class MakeModelVocabulary:
+    pairs: tuple[tuple[str, str], ...]  # (make, model) en minúsculas
+    index: MakeModelIndex               # índice de dos etapas ya construido
+    version: int
+    loaded_at: float
+
+
+# Cache en proceso; se revalida contra version:catalog en Redis al vencer el TTL
+_cache: MakeModelVocabulary | None = None
+
+
+def _vocab_key(version: int) -> str:
+    return f"catalog:vocab:{version}"
+
+
+def build_vocabulary(pairs: list[tuple[str, str]], version: int = 0) -> MakeModelVocabulary:
+    index = MakeModelIndex(pairs)
+    return MakeModelVocabulary(
+        pairs=tuple(index.pairs),
+        index=index,
+        version=version,
+        loaded_at=time.monotonic(),
+    )
+
+
+def current_vocabulary() -> MakeModelVocabulary | None:
+    # lo que ya esté en memoria, sin ir a la DB (p.ej. para el guard del cache semántico)
+    return _cache
+
+
+def invalidate_vocabulary() -> None:
+    global _cache
+    _cache = None
+
+
+async def get_vocabulary(session: AsyncSession, redis: Redis | None = None) -> MakeModelVocabulary:
+    global _cache
+    now = time.monotonic()
+    if _cache is not None and now - _cache.loaded_at < settings.VOCAB_CACHE_TTL_S:
+        return _cache
+
+    version = await get_version(redis, CATALOG) if redis is not None else 0
+    if _cache is not None and redis is not None and _cache.version == version:
+        # catálogo sin cambios: sólo renovamos el TTL
+        _cache = MakeModelVocabulary(_cache.pairs, _cache.index, version, now)
+        return _cache
+
+    pairs: list[tuple[str, str]] | None = None
+    if redis is not None:
+        raw = await redis.get(_vocab_key(version))
+        if raw:
+            pairs = [(mk, md) for mk, md in json.loads(raw)]
+
+    if pairs is None:
+        pairs = await known_make_models(session)
+        if redis is not None:
+            await redis.set(_vocab_key(version), json.dumps(pairs, ensure_ascii=False), ex=settings.VOCAB_REDIS_TTL_S)
+
+    _cache = build_vocabulary(pairs, version)
+    return _cache
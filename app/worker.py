@@ -5,13 +5,110 @@ from redis.asyncio import Redis
 
 from app.core.config import settings
 from app.core.logging import configure_logging
+from app.core.metrics import metrics
 from app.db.session import SessionLocal
+from app.llm.client import init_openai_client, close_openai_client
+from app.queue.dispatcher import KeyedDispatcher
+from app.rag.embeddings import get_embedding_service, close_embedding_service
+from app.rag.qdrant_store import close_client as close_qdrant_client
 from app.queue.redis_stream import RedisStreamQueue
 from app.services.conversation_service import ConversationService
-from app.services.twilio_sender import TwilioSender
+from app.services.twilio_sender import DeliveryLog, SegmentStream, TwilioSender, reply_segments
 
 log = structlog.get_logger()
 
+async def _send(sender: TwilioSender, delivery: DeliveryLog, from_number: str, segment: str) -> None:
+    await sender.send_segment(from_number, segment)
+    await delivery.record(segment)
+
+async def _reply_in_segments(
+    svc: ConversationService,
+    sender: TwilioSender,
+    delivery: DeliveryLog,
+    user_id: str,
+    from_number: str,
+    body: str,
+) -> None:
+    # El primer segmento se envía mientras el modelo sigue generando el resto
+    segments = SegmentStream(
+        settings.TWILIO_SEGMENT_MAX_CHARS, settings.WHATSAPP_FIRST_SEGMENT_MIN_CHARS, sent=delivery.sent
+    )
+    async with SessionLocal() as db:
+        async for event in svc.respond(db, user_id, body, stream=True):
+            if event.type == "token":
+                for segment in segments.feed(event.data["text"]):
+                    await _send(sender, delivery, from_number, segment)
+            elif event.type == "reset":
+                segments.reset()
+            elif event.type == "reply":
+                await delivery.plan(segments.finish(event.data["text"]))
+
+async def process_message(
+    queue: RedisStreamQueue,
+    svc: ConversationService,
+    sender: TwilioSender,
+    message_id: bytes | str,
+    fields: dict,
+) -> None:
+    try:
+        user_id = fields[b"user_id"].decode("utf-8")
+        from_number = fields[b"from_number"].decode("utf-8")
+        body = fields[b"body"].decode("utf-8")
+        mid = message_id.decode("utf-8") if isinstance(message_id, bytes) else message_id
+
+        # Un reintento con la respuesta ya planeada no vuelve a llamar al modelo:
+        # sólo envía los segmentos que faltan
+        delivery = await DeliveryLog(queue.redis, mid).load()
+        if delivery.pending is None:
+            if settings.WHATSAPP_STREAM_SEGMENTS:
+                await _reply_in_segments(svc, sender, delivery, user_id, from_number, body)
+            else:
+                async with SessionLocal() as db:
+                    reply = await svc.handle_message(
+                        session=db, user_id=user_id, from_number=from_number, body=body
+                    )
+                await delivery.plan(reply_segments(reply))
+        else:
+            log.info("delivery_resumed", message_id=mid, sent=len(delivery.sent), pending=len(delivery.pending))
+        # en orden: cada segmento espera al anterior
+        while delivery.pending:
+            await _send(sender, delivery, from_number, delivery.pending[0])
+
+        await queue.ack(mid)
+        await delivery.clear()
+        log.info("message_processed", message_id=message_id, user_id=user_id)
+
+        # fuera del camino crítico: la respuesta ya se envió. Se mantiene dentro de la
+        # tarea del usuario para no competir con su siguiente mensaje.
+        await svc.compact_history(user_id)
+
+    except Exception as e:
+        log.error("message_failed", message_id=message_id, error=str(e))
+        # No ack → queda pendiente; reclaim_loop lo reintenta con backoff o lo manda a la DLQ
+
+async def reclaim_loop(
+    queue: RedisStreamQueue,
+    consumer: str,
+    dispatcher: KeyedDispatcher,
+    submit,
+    inflight_ids: set,
+) -> None:
+    ticks = 0
+    while True:
+        await asyncio.sleep(settings.QUEUE_RECLAIM_INTERVAL_S)
+        try:
+            for entry in await queue.reclaim(consumer, count=dispatcher.free_slots, exclude=inflight_ids):
+                log.info("message_reclaimed", message_id=entry.message_id, deliveries=entry.deliveries)
+                metrics.inc("queue_reclaimed_total")
+                submit(entry.message_id, entry.fields)
+
+            ticks += 1
+            if ticks % 60 == 0:
+                trimmed = await queue.trim()
+                log.info("stream_trimmed", removed=trimmed)
+        except Exception as e:
+            log.error("reclaim_failed", error=str(e))
+
 async def worker_loop(consumer: str):
     redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
     queue = RedisStreamQueue(redis)
@@ -20,36 +117,50 @@ async def worker_loop(consumer: str):
     svc = ConversationService(redis)
     sender = TwilioSender()
 
-    while True:
-        resp = await queue.consume(consumer=consumer, count=5, block_ms=5000)
-        if not resp:
-            continue
+    # Usuarios distintos en paralelo; mensajes del mismo usuario en orden
+    dispatcher = KeyedDispatcher(settings.WORKER_CONCURRENCY)
+    inflight_ids: set = set()
 
-        for _, messages in resp:
-            for message_id, fields in messages:
-                try:
-                    user_id = fields[b"user_id"].decode("utf-8")
-                    from_number = fields[b"from_number"].decode("utf-8")
-                    body = fields[b"body"].decode("utf-8")
+    def submit(message_id: bytes, fields: dict) -> None:
+        async def _run() -> None:
+            try:
+                await process_message(queue, svc, sender, message_id, fields)
+            finally:
+                inflight_ids.discard(message_id)
 
-                    async with SessionLocal() as db:
-                        reply = await svc.handle_message(
-                            session=db, user_id=user_id, from_number=from_number, body=body
-                        )
+        inflight_ids.add(message_id)
+        dispatcher.submit(fields.get(b"user_id", b"").decode("utf-8"), _run)
 
-                    await sender.send_whatsapp(to_number=from_number, body=reply)
+    reclaimer = asyncio.create_task(reclaim_loop(queue, consumer, dispatcher, submit, inflight_ids))
 
-                    await queue.ack(message_id.decode("utf-8") if isinstance(message_id, bytes) else message_id)
-                    log.info("message_processed", message_id=message_id, user_id=user_id)
+    try:
+        while True:
+            # Backpressure: sólo leemos tantos mensajes como slots libres
+            free = await dispatcher.wait_for_capacity()
+            resp = await queue.consume(consumer=consumer, count=free, block_ms=5000)
+            if not resp:
+                continue
 
-                except Exception as e:
-                    log.error("message_failed", message_id=message_id, error=str(e))
-                    # No ack → queda pendiente (prod: retry/backoff + DLQ)
+            for _, messages in resp:
+                for message_id, fields in messages:
+                    submit(message_id, fields)
+    finally:
+        reclaimer.cancel()
+        await dispatcher.drain()
+        await sender.close()
 
 async def main():
     configure_logging(settings.LOG_LEVEL)
     consumer = os.environ.get("WORKER_NAME", "worker-1")
-    await worker_loop(consumer)
+    await init_openai_client()
+    if settings.EMBED_WARMUP:
+        await get_embedding_service().warmup()
+    try:
+        await worker_loop(consumer)
+    finally:
+        await close_openai_client()
+        await close_embedding_service()
+        await close_qdrant_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Benchmark: search_catalog por SQL vs el motor columnar en memoria (CATALOG_ENGINE=memory).
+
+    python -m benchmarks.bench_catalog_search --cars 50000 --queries 500
+    python -m benchmarks.bench_catalog_search --database-url "$DATABASE_URL"   # catálogo real (sólo lectura)
+
+Sin --database-url se genera un catálogo sintético en SQLite; contra Postgres la
+diferencia es mayor porque cada búsqueda SQL además paga el round-trip de red.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.models import Base, Car
+from app.tools.catalog import SORTS, CatalogQuery, search_catalog_page
+from app.tools.catalog_memory import load_catalog
+
+MAKES = {
+    "Nissan": ["Versa", "Sentra", "March", "Kicks"],
+    "Volkswagen": ["Jetta", "Vento", "Tiguan"],
+    "Chevrolet": ["Aveo", "Onix", "Spark"],
+    "Toyota": ["Corolla", "Yaris", "RAV4"],
+}
+CITIES = ["CDMX", "Monterrey", "Guadalajara", "Puebla", "Querétaro"]
+
+
+def synthetic_rows(n: int, seed: int = 3) -> list[dict]:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        make = rng.choice(list(MAKES))
+        rows.append({
+            "make": make,
+            "model": rng.choice(MAKES[make]),
+            "year": rng.randint(2012, 2024),
+            "price_mxn": Decimal(rng.randint(150, 900) * 1000),
+            "city": rng.choice(CITIES),
+            "mileage_km": None if rng.random() < 0.05 else rng.randint(1, 200) * 1000,
+            "transmission": rng.choice(["automática", "manual"]),
+            "fuel": "gasolina",
+            "body_type": "sedán",
+        })
+    return rows
+
+
+def random_queries(n: int, seed: int = 5) -> list[CatalogQuery]:
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        make = rng.choice([None, *MAKES])
+        queries.append(CatalogQuery(
+            make=make,
+            model=rng.choice([None, *MAKES[make]]) if make else None,
+            year_min=rng.choice([None, 2016, 2019]),
+            price_max=rng.choice([None, 300000.0, 500000.0]),
+            city=rng.choice([None, *CITIES]),
+            limit=5,
+            sort=rng.choice(list(SORTS)),
+        ))
+    return queries
+
+
+def report(label: str, timings: list[float]) -> float:
+    ms = sorted(t * 1000 for t in timings)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    print(f"{label:<8} media={statistics.fmean(ms):.3f}ms  p50={statistics.median(ms):.3f}ms  p95={p95:.3f}ms")
+    return statistics.fmean(ms)
+
+
+async def run(url: str, cars: int, n_queries: int) -> None:
+    engine = create_async_engine(url)
+    if cars:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(Car.__table__), synthetic_rows(cars))
+
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with Session() as session:
+        t0 = time.perf_counter()
+        catalog = await load_catalog(session)
+        print(f"snapshot: {len(catalog):,} autos cargados en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+        queries = random_queries(n_queries)
+        sql_t, mem_t = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            expected = await search_catalog_page(session, q)
+            sql_t.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            page = catalog.search_page(q)
+            mem_t.append(time.perf_counter() - t0)
+            assert page == expected, "los resultados deben coincidir"
+
+    await engine.dispose()
+    sql_ms = report("sql", sql_t)
+    mem_ms = report("memoria", mem_t)
+    print(f"speedup: {sql_ms / mem_ms:.0f}x")
+
+
+def main(database_url: str | None, cars: int, n_queries: int) -> None:
+    if database_url:
+        asyncio.run(run(database_url, 0, n_queries))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(f"sqlite+aiosqlite:///{os.path.join(tmp, 'catalog.db')}", cars, n_queries))
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--database-url", default=None)
+    p.add_argument("--cars", type=int, default=50_000)
+    p.add_argument("--queries", type=int, default=500)
+    args = p.parse_args()
+    main(args.database_url, args.cars, args.queries)
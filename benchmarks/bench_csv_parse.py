@@ -0,0 +1,87 @@
+"""
+Benchmark: parseo/validación del CSV de inventario, secuencial vs rangos de bytes en un pool de procesos.
+
+    python -m benchmarks.bench_csv_parse --rows 2000000 --workers 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.db.catalog_csv import byte_ranges, iter_chunks, parse_range, read_header
+
+MAKES = {
+    "Nissan": ["Versa", "Sentra", "March", "Kicks"],
+    "Volkswagen": ["Jetta", "Vento", "Tiguan"],
+    "Chevrolet": ["Aveo", "Onix", "Spark"],
+    "Toyota": ["Corolla", "Yaris", "RAV4"],
+}
+CITIES = ["CDMX", "Monterrey", "Guadalajara", "Puebla", "Querétaro"]
+
+
+def write_synthetic_csv(path: str, rows: int, seed: int = 3) -> None:
+    rng = random.Random(seed)
+    makes = list(MAKES)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("stock_id,km,price,make,model,year,version,bluetooth,largo,ancho,altura,car_play,city\n")
+        for i in range(rows):
+            make = rng.choice(makes)
+            price = "" if rng.random() < 0.01 else f"{rng.randint(150, 900) * 1000}.0"  # ~1% rechazadas
+            f.write(
+                f"{i},{rng.randint(1, 200) * 1000},{price},{make},{rng.choice(MAKES[make])},{rng.randint(2012, 2024)},"
+                f"1.6 SENSE,{rng.choice(['Sí', 'No'])},4500,1750,1500,{rng.choice(['Sí', 'No'])},{rng.choice(CITIES)}\n"
+            )
+
+
+def sequential(path: str) -> tuple[float, int, int]:
+    t0 = time.perf_counter()
+    records = rejected = 0
+    for chunk in iter_chunks(path, ",", batch_size=5000):
+        records += len(chunk.records)
+        rejected += len(chunk.rejected)
+    return time.perf_counter() - t0, records, rejected
+
+
+def parallel(path: str, workers: int, chunk_mb: float) -> tuple[float, int, int]:
+    t0 = time.perf_counter()
+    header, start = read_header(path, ",")
+    ranges = byte_ranges(path, start, int(chunk_mb * 1024 * 1024))
+    records = rejected = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(parse_range, path, s, e, header, ",") for s, e in ranges]
+        for fut in futures:
+            chunk = fut.result()
+            records += len(chunk.records)
+            rejected += len(chunk.rejected)
+    return time.perf_counter() - t0, records, rejected
+
+
+def main(rows: int, workers: int, chunk_mb: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "inventory.csv")
+        t0 = time.perf_counter()
+        write_synthetic_csv(path, rows)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"csv: {rows:,} filas, {size_mb:.1f} MB (generado en {time.perf_counter() - t0:.1f}s)")
+
+        t_seq, n_seq, rej_seq = sequential(path)
+        print(f"secuencial: {t_seq:.2f}s  {n_seq / t_seq:,.0f} filas/s  válidas={n_seq:,} rechazadas={rej_seq:,}")
+
+        t_par, n_par, rej_par = parallel(path, workers, chunk_mb)
+        print(
+            f"paralelo ({workers} procesos, rangos de {chunk_mb:g} MB): {t_par:.2f}s  "
+            f"{n_par / t_par:,.0f} filas/s  válidas={n_par:,} rechazadas={rej_par:,}"
+        )
+        assert (n_par, rej_par) == (n_seq, rej_seq), "los resultados deben coincidir"
+        print(f"speedup: {t_seq / t_par:.1f}x")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=2_000_000)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    p.add_argument("--chunk-mb", type=float, default=8.0)
+    args = p.parse_args()
+    main(args.rows, args.workers, args.chunk_mb)
@@ -0,0 +1,63 @@
+"""
+Benchmark: memoria/CPU de vectores como listas de floats de Python vs matriz float32.
+
+Simula la salida de fastembed (un np.ndarray por texto) sin cargar el modelo.
+
+    python -m benchmarks.bench_embedding_memory --chunks 20000 --dim 384
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.rag.embeddings import Embedder
+
+
+class _FakeModel:
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, texts):
+        rng = np.random.default_rng(0)
+        for _ in texts:
+            yield rng.standard_normal(self.dim, dtype=np.float32)
+
+
+def as_python_lists(model: _FakeModel, texts: list[str]) -> list[list[float]]:
+    # camino anterior: [float(x) for x in v] por vector
+    return [[float(x) for x in v] for v in model.embed(texts)]
+
+
+def as_matrix(model: _FakeModel, texts: list[str]) -> np.ndarray:
+    e = Embedder(model_name="bench")
+    e._model = model
+    return e.embed(texts)
+
+
+def measure(fn, *args) -> tuple[float, float]:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del out
+    return elapsed, peak / 1e6
+
+
+def main(n_chunks: int, dim: int) -> None:
+    model = _FakeModel(dim)
+    texts = ["chunk"] * n_chunks
+    print(f"chunks={n_chunks} dim={dim}")
+    for name, fn in (("python_lists", as_python_lists), ("float32_matrix", as_matrix)):
+        elapsed, peak_mb = measure(fn, model, texts)
+        print(f"{name:15s} time={elapsed * 1000:9.1f}ms peak_mem={peak_mb:9.1f}MB")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--chunks", type=int, default=20_000)
+    p.add_argument("--dim", type=int, default=384)
+    args = p.parse_args()
+    main(args.chunks, args.dim)
@@ -0,0 +1,79 @@
+"""
+Benchmark: normalización make/model con barrido lineal vs MakeModelIndex.
+
+    python -m benchmarks.bench_normalize --pairs 20000 --queries 500
+"""
+import argparse
+import random
+import string
+import time
+
+from app.tools.normalize import MakeModelIndex, best_match, prepare_choices
+
+
+def _word(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(n))
+
+
+def _typo(rng: random.Random, s: str) -> str:
+    i = rng.randrange(len(s))
+    return s[:i] + rng.choice(string.ascii_lowercase) + s[i + 1:]
+
+
+def synthetic_pairs(n_pairs: int, n_makes: int, seed: int = 7) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    makes = [_word(rng, rng.randint(3, 10)) for _ in range(n_makes)]
+    pairs: set[tuple[str, str]] = set()
+    while len(pairs) < n_pairs:
+        pairs.add((rng.choice(makes), f"{_word(rng, rng.randint(3, 8))} {rng.randint(1, 9)}"))
+    return sorted(pairs)
+
+
+def linear(pairs: list[tuple[str, str]], queries: list[tuple[str, str]]) -> tuple[float, list[str]]:
+    joined = [f"{mk} {md}" for mk, md in pairs]
+    prepared = prepare_choices(joined)
+    t0 = time.perf_counter()
+    out = [best_match(f"{mk} {md}", joined, limit=5, prepared=prepared)[0][0] for mk, md in queries]
+    return time.perf_counter() - t0, out
+
+
+def indexed(index: MakeModelIndex, queries: list[tuple[str, str]]) -> tuple[float, list[str]]:
+    t0 = time.perf_counter()
+    out = [index.normalize(mk, md).candidates[0] for mk, md in queries]
+    return time.perf_counter() - t0, out
+
+
+def batched(index: MakeModelIndex, queries: list[tuple[str, str]]) -> tuple[float, list[str]]:
+    t0 = time.perf_counter()
+    out = [n.candidates[0] for n in index.normalize_many(queries)]
+    return time.perf_counter() - t0, out
+
+
+def main(n_pairs: int, n_makes: int, n_queries: int) -> None:
+    rng = random.Random(11)
+    pairs = synthetic_pairs(n_pairs, n_makes)
+    targets = [rng.choice(pairs) for _ in range(n_queries)]
+    queries = [(_typo(rng, mk), _typo(rng, md)) for mk, md in targets]
+    expected = [f"{mk} {md}" for mk, md in targets]
+
+    t0 = time.perf_counter()
+    index = MakeModelIndex(pairs)
+    build = time.perf_counter() - t0
+
+    print(f"pairs={n_pairs} makes={n_makes} queries={n_queries} index_build={build * 1000:.1f}ms")
+    for name, (elapsed, out) in (
+        ("linear", linear(pairs, queries)),
+        ("indexed", indexed(index, queries)),
+        ("batched", batched(index, queries)),
+    ):
+        acc = sum(o == e for o, e in zip(out, expected)) / n_queries
+        print(f"{name:8s} total={elapsed * 1000:9.1f}ms per_query={elapsed / n_queries * 1e6:9.1f}us accuracy={acc:.3f}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--pairs", type=int, default=20_000)
+    p.add_argument("--makes", type=int, default=80)
+    p.add_argument("--queries", type=int, default=500)
+    args = p.parse_args()
+    main(args.pairs, args.makes, args.queries)
@@ -68,8 +68,7 @@ fi
 CSV_PATH="/app/catalog.csv"
 echo "📥 Sembrando catálogo..."
 docker compose exec api python -m app.scripts.seed_catalog \
-  --csv "$CSV_PATH" \
-  --truncate
+  --csv "$CSV_PATH"
 
 # ----------- Ingest Knowledge (RAG) -----------
 echo "📚 Consumiendo conocimiento Kavak (RAG) desde https://www.kavak.com/mx/blog/sedes-de-kavak-en-mexico a través de web scrapping ..."
@@ -0,0 +1,10 @@
+import os
+
+# Settings() exige estas variables; los tests no tocan servicios reales.
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test-token")
+os.environ.setdefault("TWILIO_WHATSAPP_FROM", "whatsapp:+10000000000")
+os.environ.setdefault("TOKENIZER", "heuristic")
@@ -0,0 +1,69 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.bulk_load import sync_cars
+from app.db.models import Base, Car
+
+
+def rec(ext, model="Versa", price="250000", year=2020):
+    return (ext, "Nissan", model, year, Decimal(price), "CDMX", 40000, "automatic", None, None, {"stock_id": ext})
+
+
+@pytest.fixture
+async def engine():
+    eng = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with eng.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield eng
+    await eng.dispose()
+
+
+async def cars(engine) -> dict:
+    async with engine.connect() as conn:
+        rows = (await conn.execute(select(Car.external_id, Car.model, Car.price_mxn))).all()
+    return {r.external_id: (r.model, Decimal(r.price_mxn)) for r in rows}
+
+
+async def test_sync_inserts_updates_and_removes(engine):
+    first = await sync_cars(engine, [[rec(1), rec(2)], [rec(3)]])
+    assert (first.inserted, first.updated, first.removed) == (3, 0, 0)
+
+    second = await sync_cars(engine, [[rec(1), rec(2, price="239000"), rec(4, model="Sentra")]])
+    assert (second.inserted, second.updated, second.removed, second.unchanged) == (1, 1, 1, 1)
+    assert await cars(engine) == {
+        1: ("Versa", Decimal("250000")),
+        2: ("Versa", Decimal("239000")),
+        4: ("Sentra", Decimal("250000")),
+    }
+
+
+async def test_partial_feed_keeps_missing_and_last_duplicate_wins(engine):
+    await sync_cars(engine, [[rec(1), rec(2)]])
+    result = await sync_cars(engine, [[rec(2, price="1"), rec(2, price="2")]], remove_missing=False)
+    assert (result.updated, result.removed) == (1, 0)
+    assert (await cars(engine))[2][1] == Decimal("2")
+    assert 1 in await cars(engine)
+
+
+@pytest.mark.parametrize("remove_missing", [True, False])
+async def test_unkeyed_rows_are_replaced_not_duplicated(engine, remove_missing):
+    for _ in range(3):
+        await sync_cars(engine, [[rec(None), rec(1)]], remove_missing=remove_missing)
+    async with engine.connect() as conn:
+        rows = (await conn.execute(select(Car.external_id))).scalars().all()
+    assert sorted(rows, key=lambda e: e or 0) == [None, 1]
+
+
+async def test_failed_sync_leaves_catalog_untouched(engine):
+    await sync_cars(engine, [[rec(1)]])
+
+    def broken_feed():
+        yield [rec(2)]
+        raise ValueError("csv roto")
+
+    with pytest.raises(ValueError):
+        await sync_cars(engine, broken_feed())
+    assert list(await cars(engine)) == [1]
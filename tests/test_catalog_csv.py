@@ -0,0 +1,123 @@
+import csv
+from decimal import Decimal
+
+import pytest
+
+from app.db import catalog_csv as catalog_csv_module
+from app.db.catalog_csv import byte_ranges, iter_chunks, parse_range, parse_row, read_header, validate_row
+from app.scripts.seed_catalog import IngestReport, parallel_batches, sequential_batches
+
+
+@pytest.fixture
+def catalog_csv(tmp_path):
+    path = tmp_path / "cars.csv"
+    lines = ["stock_id,make,model,year,price,km,city"]
+    for i in range(500):
+        lines.append(f'{i},Nissan,Versa,{2015 + i % 8},"{200000 + i:,}",{i * 100},CDMX')
+    lines[10] = "9,Nissan,,2020,1,0,CDMX"       # sin modelo
+    lines[20] = "19,Nissan,Versa,2020,gratis,0,CDMX"  # precio inválido
+    lines[30] = "29,Nissan,Versa"                 # columnas faltantes
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_validate_row_reports_reasons():
+    record, reason = validate_row({"make": " Nissan ", "model": "Versa", "year": "2020", "price": "461,999.0", "km": "77,400", "stock_id": "99"})
+    assert reason is None
+    assert record[:7] == (99, "Nissan", "Versa", 2020, Decimal("461999.0"), "N/A", 77400)
+    assert record[-1] == {"stock_id": 99}
+    assert validate_row({"make": "Nissan", "model": "", "year": "2020", "price": "1"}) == (None, "missing_model")
+    assert validate_row({"make": "Nissan", "model": "Versa", "year": "x", "price": "1"}) == (None, "invalid_year")
+    assert parse_row({"make": "Nissan", "model": "Versa", "year": "2020", "price": "0"}) is None
+
+
+@pytest.mark.parametrize(
+    "cells, reason",
+    [
+        ({"price": "nan"}, "invalid_price"),
+        ({"price": "inf"}, "invalid_price"),
+        ({"price": "-Infinity"}, "invalid_price"),
+        ({"price": "12,345,678,901.5"}, "invalid_price"),
+        ({"year": "inf"}, "invalid_year"),
+        ({"year": "nan"}, "invalid_year"),
+        ({"year": "99999999999"}, "invalid_year"),
+        ({"year": "1850"}, "invalid_year"),
+        ({"year": "2999"}, "invalid_year"),
+        ({"km": "1e12"}, "invalid_mileage"),
+        ({"stock_id": "1e25"}, "invalid_stock_id"),
+        ({"stock_id": "-99999999999999999999"}, "invalid_stock_id"),
+    ],
+)
+def test_validate_row_rejects_non_finite_and_out_of_range(cells, reason):
+    row = {"make": "Nissan", "model": "Versa", "year": "2020", "price": "200000", **cells}
+    assert validate_row(row) == (None, reason)
+    if "stock_id" not in cells:
+        # stock_id infinito se descarta en lugar de abortar
+        assert validate_row({**row, "stock_id": "inf"})[1] == reason
+
+
+def test_bad_cells_are_rejected_not_raised(tmp_path):
+    path = tmp_path / "cars.csv"
+    path.write_text(
+        "\ufeff stock_id ,make,model,year,price\n"
+        "1,Nissan,Versa,2020,200000\n"
+        "2,Nissan,Versa,2020,nan\n"
+        "3,Nissan,Versa,inf,200000\n"
+        "4,Nissan,Versa,2020,99999999999\n",
+        encoding="utf-8",
+    )
+    header, start = read_header(str(path), ",")
+    assert header == ["stock_id", "make", "model", "year", "price"]
+
+    chunks = list(iter_chunks(str(path), ",", batch_size=100))
+    by_range = parse_range(str(path), start, path.stat().st_size, header, ",")
+    for records, rejected in (
+        ([r for c in chunks for r in c.records], [r for c in chunks for r in c.rejected]),
+        (by_range.records, by_range.rejected),
+    ):
+        # el BOM no cambia el nombre de la columna: stock_id llega en ambos caminos
+        assert [r[0] for r in records] == [1]
+        assert [r.reason for r in rejected] == ["invalid_price", "invalid_year", "invalid_price"]
+
+
+def test_byte_ranges_match_sequential_parse(catalog_csv):
+    header, start = read_header(catalog_csv, ",")
+    ranges = byte_ranges(catalog_csv, start, chunk_bytes=1000)
+    assert len(ranges) > 5
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+    by_range = [parse_range(catalog_csv, s, e, header, ",") for s, e in ranges]
+    sequential = list(iter_chunks(catalog_csv, ",", batch_size=10_000))
+
+    assert [r for c in by_range for r in c.records] == [r for c in sequential for r in c.records]
+    assert sum(c.rows_read for c in by_range) == 500
+    reasons = sorted(r.reason for c in by_range for r in c.rejected)
+    assert reasons == ["invalid_price", "malformed", "missing_model"]
+
+
+async def test_parallel_pipeline_and_rejects_report(catalog_csv, tmp_path):
+    rejects = tmp_path / "rejects.csv"
+    report = IngestReport(str(rejects))
+    batches = [b async for b in parallel_batches(catalog_csv, ",", workers=2, chunk_bytes=2000, report=report)]
+    report.close()
+
+    seq_report = IngestReport(None)
+    expected = [r for b in sequential_batches(catalog_csv, ",", 100, seq_report) for r in b]
+
+    assert [r for b in batches for r in b] == expected
+    assert (report.rows_read, report.rejected) == (500, 3)
+    assert report.reasons == seq_report.reasons
+    with open(rejects, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert {r["reason"] for r in rows} == {"missing_model", "invalid_price", "malformed"}
+    assert rows[0]["raw"].startswith("9,Nissan,,2020")
+
+
+def test_unexpected_validation_error_is_a_malformed_row(catalog_csv, monkeypatch):
+    def boom(row):
+        raise RuntimeError("celda rara")
+
+    monkeypatch.setattr(catalog_csv_module, "validate_row", boom)
+    chunk = next(iter_chunks(catalog_csv, ",", batch_size=10_000))
+    assert chunk.rows_read == 500 and not chunk.records
+    assert {r.reason for r in chunk.rejected} == {"malformed"}
@@ -0,0 +1,155 @@
+import asyncio
+import random
+from decimal import Decimal
+
+import fakeredis
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.config import settings
+from app.core.versions import CATALOG, bump_version
+from app.db.models import Base, Car
+from app.llm import tools
+from app.llm.schemas import ToolCatalogArgs
+from app.tools import catalog_memory
+from app.tools.catalog import CatalogQuery, SORTS, search_catalog_page
+from app.tools.catalog_memory import get_catalog, search_catalog_page_memory
+
+MAKES = {"Nissan": ["Versa", "Sentra"], "NISSAN": ["versa"], "Mazda": ["Mazda3", "CX-5"], "Kia": ["Rio"]}
+CITIES = ["CDMX", "cdmx", "Monterrey", "Guadalajara"]
+
+
+def random_cars(n: int, seed: int = 11) -> list[Car]:
+    rng = random.Random(seed)
+    cars = []
+    for _ in range(n):
+        make = rng.choice(list(MAKES))
+        cars.append(
+            Car(
+                make=make,
+                model=rng.choice(MAKES[make]),
+                year=rng.randint(2015, 2023),
+                # precios repetidos y con centavos para los desempates
+                price_mxn=Decimal(rng.choice([199999.99, 250000, 250000, 310500.5, rng.randint(150, 600) * 1000])),
+                city=rng.choice(CITIES),
+                mileage_km=None if rng.random() < 0.2 else rng.randint(0, 20) * 5000,
+                transmission=rng.choice([None, "Automática", "manual"]),
+                fuel="gasolina",
+                body_type="sedán",
+            )
+        )
+    return cars
+
+
+def random_query(rng: random.Random) -> CatalogQuery:
+    make = rng.choice([None, "nissan", " NISSAN ", "Mazda", "Tesla"])
+    return CatalogQuery(
+        make=make,
+        model=rng.choice([None, "versa", "Sentra"]) if make else None,
+        year_min=rng.choice([None, 2018]),
+        year_max=rng.choice([None, 2021]),
+        price_min=rng.choice([None, 199999.99, 250000.0]),
+        price_max=rng.choice([None, 310500.5, 450000.0]),
+        city=rng.choice([None, "CDMX", "monterrey"]),
+        transmission=rng.choice([None, "automática", "MANUAL"]),
+        limit=rng.randint(1, 10),
+        sort=rng.choice(list(SORTS)),
+    )
+
+
+@pytest.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with Session() as s:
+        s.add_all(random_cars(300))
+        await s.commit()
+        yield s
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def fresh_snapshot(monkeypatch):
+    # el lock queda ligado al event loop de cada test
+    monkeypatch.setattr(catalog_memory, "_lock", None)
+    catalog_memory.invalidate_catalog()
+    yield
+    catalog_memory.invalidate_catalog()
+
+
+async def test_pages_match_the_sql_path(session, monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_COUNT_CAP", 40)
+    catalog = await get_catalog(session)
+    rng = random.Random(5)
+    for _ in range(60):
+        q = random_query(rng)
+        for _ in range(6):
+            expected = await search_catalog_page(session, q)
+            assert catalog.search_page(q) == expected, q
+            if expected.next_cursor is None:
+                break
+            q = CatalogQuery(**{**vars(q), "cursor": expected.next_cursor})
+
+
+async def test_full_walk_for_every_sort(session):
+    catalog = await get_catalog(session)
+    for sort in SORTS:
+        q = CatalogQuery(make="nissan", sort=sort, limit=7)
+        seen = 0
+        while True:
+            page = catalog.search_page(q)
+            assert page == await search_catalog_page(session, q)
+            seen += len(page.items)
+            if page.next_cursor is None:
+                break
+            q = CatalogQuery(make="nissan", sort=sort, limit=7, cursor=page.next_cursor)
+        assert seen == sum(1 for c in catalog.items if c["make"].lower() == "nissan")
+
+
+async def test_snapshot_reloads_on_catalog_version_bump(session, monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_MEMORY_CHECK_S", 0.0)
+    redis = fakeredis.FakeAsyncRedis()
+    q = CatalogQuery(make="Tesla")
+    assert (await search_catalog_page_memory(session, q, redis)).items == []
+
+    session.add(Car(make="Tesla", model="Model 3", year=2022, price_mxn=900000, city="CDMX"))
+    await session.commit()
+    # sin cambio de versión se sigue usando el snapshot
+    assert (await search_catalog_page_memory(session, q, redis)).items == []
+
+    await bump_version(redis, CATALOG)
+    page = await search_catalog_page_memory(session, q, redis)
+    assert [c["model"] for c in page.items] == ["Model 3"]
+    assert page == await search_catalog_page(session, q)
+
+
+async def test_concurrent_first_loads_share_one_snapshot(session, monkeypatch):
+    loads = 0
+    load = catalog_memory.load_catalog
+
+    async def counting_load(*args):
+        nonlocal loads
+        loads += 1
+        return await load(*args)
+
+    monkeypatch.setattr(catalog_memory, "load_catalog", counting_load)
+    snapshots = await asyncio.gather(*(get_catalog(session) for _ in range(5)))
+    assert loads == 1 and all(s is snapshots[0] for s in snapshots)
+
+    # sin Redis el snapshot no se recarga por tiempo, sólo con invalidate_catalog()
+    monkeypatch.setattr(settings, "CATALOG_MEMORY_CHECK_S", 0.0)
+    assert await get_catalog(session) is snapshots[0] and loads == 1
+    catalog_memory.invalidate_catalog()
+    assert await get_catalog(session) is not snapshots[0] and loads == 2
+
+
+async def test_tool_dispatches_to_the_configured_engine(session, monkeypatch):
+    args = ToolCatalogArgs(make="mazda", sort="year_desc")
+    ctx = tools.ToolContext(session)
+    expected = await tools.TOOLS["search_catalog"].handler(ctx, args)
+
+    monkeypatch.setattr(settings, "CATALOG_ENGINE", "memory")
+    assert await tools.TOOLS["search_catalog"].handler(ctx, args) == expected
+    assert len(await get_catalog(session)) == 300
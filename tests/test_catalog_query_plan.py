@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.models import OBSOLETE_INDEXES, Base, Car
+from app.tools.catalog import CatalogQuery, search_stmt
+
+# Regresión de planes: las búsquedas de catálogo deben resolverse con los índices
+# de app.db.models (SEARCH ... USING INDEX), nunca con un SCAN completo de cars.
+
+QUERIES = [
+    CatalogQuery(make="Nissan"),
+    CatalogQuery(make="Nissan", model="Sentra"),
+    CatalogQuery(make="nissan", model="sentra", sort="year_desc"),
+    CatalogQuery(make="Nissan", year_min=2018, price_max=300000),
+    CatalogQuery(city="CDMX"),
+    CatalogQuery(transmission="Automática"),
+]
+
+
+@pytest.fixture
+async def conn():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as c:
+        await c.run_sync(Base.metadata.create_all)
+        yield c
+    await engine.dispose()
+
+
+async def query_plan(conn, stmt) -> list[str]:
+    sql = str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")).all()]
+
+
+@pytest.mark.parametrize("q", QUERIES, ids=lambda q: ",".join(f"{k}={v}" for k, v in vars(q).items() if v and k != "limit"))
+@pytest.mark.parametrize("paged", [False, True], ids=["first_page", "next_page"])
+async def test_filtered_search_uses_an_index_and_skips_the_sort(conn, q, paged):
+    key = Decimal("250000") if q.sort.startswith("price") else 2019
+    after = (key, 10) if paged else None
+    plan = await query_plan(conn, search_stmt(q, after))
+    assert plan[0].startswith("SEARCH cars USING INDEX ix_cars_"), plan
+    if q.sort == "price_asc" and q.year_min is None:
+        # el índice ya entrega el orden (llave, id)
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+async def test_unfiltered_search_walks_the_price_index(conn):
+    plan = await query_plan(conn, search_stmt(CatalogQuery(sort="price_desc")))
+    assert plan == ["SCAN cars USING INDEX ix_cars_price_id"]
+
+
+def test_obsolete_indexes_are_not_declared():
+    # los filtros usan lower(col): los btree sobre la columna cruda sólo frenan el sync
+    declared = {ix.name for ix in Car.__table__.indexes}
+    assert not declared & set(OBSOLETE_INDEXES)
+    assert {"ix_cars_make", "ix_cars_model", "ix_cars_city"} <= set(OBSOLETE_INDEXES)
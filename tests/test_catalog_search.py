@@ -1,7 +1,8 @@
 import pytest
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.db.models import Base, Car
-from app.tools.catalog import search_catalog, CatalogQuery
+from app.core.config import settings
+from app.tools.catalog import search_catalog, search_catalog_page, CatalogQuery, InvalidCursor
 
 @pytest.mark.asyncio
 async def test_search_catalog_sqlite():
@@ -19,4 +20,74 @@ async def test_search_catalog_sqlite():
 
         out = await search_catalog(s, CatalogQuery(make="nissan", limit=5))
         assert len(out) == 1
-        assert out[0]["model"] == "sentra"
\ No newline at end of file
+        assert out[0]["model"] == "sentra"
+
+        # comparación case-insensitive sobre lower(col)
+        out = await search_catalog(s, CatalogQuery(make=" NISSAN ", model="Sentra", city="CDMX"))
+        assert [c["model"] for c in out] == ["sentra"]
+
+@pytest.fixture
+async def catalog_session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with Session() as s:
+        # precios repetidos y kilometrajes nulos para probar desempates
+        s.add_all([
+            Car(make="nissan", model="versa", year=2015 + i % 6, price_mxn=200000 + (i // 3) * 10000, city="cdmx",
+                mileage_km=None if i % 4 == 0 else 10000 * (i % 5), transmission="auto")
+            for i in range(13)
+        ])
+        s.add(Car(make="mazda", model="mazda3", year=2021, price_mxn=150000, city="cdmx", mileage_km=1))
+        await s.commit()
+        yield s
+    await engine.dispose()
+
+
+async def _walk(session, **kw) -> list[dict]:
+    seen, cursor = [], None
+    while True:
+        page = await search_catalog_page(session, CatalogQuery(make="nissan", limit=4, cursor=cursor, **kw))
+        assert page.total == 13 and not page.total_capped
+        seen.extend(page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "sort,key",
+    [
+        ("price_asc", lambda c: (c["price_mxn"], c["id"])),
+        ("price_desc", lambda c: (-c["price_mxn"], -c["id"])),
+        ("year_desc", lambda c: (-c["year"], -c["id"])),
+        ("year_asc", lambda c: (c["year"], c["id"])),
+        ("mileage_asc", lambda c: (c["mileage_km"] if c["mileage_km"] is not None else 10**12, c["id"])),
+    ],
+)
+async def test_keyset_pages_cover_results_once_in_order(catalog_session, sort, key):
+    seen = await _walk(catalog_session, sort=sort)
+    assert len(seen) == 13
+    assert len({c["id"] for c in seen}) == 13
+    assert seen == sorted(seen, key=key)
+
+
+@pytest.mark.asyncio
+async def test_cursor_is_bound_to_its_search(catalog_session):
+    page = await search_catalog_page(catalog_session, CatalogQuery(make="nissan", limit=4))
+    assert page.next_cursor
+    with pytest.raises(InvalidCursor):
+        await search_catalog_page(catalog_session, CatalogQuery(make="nissan", sort="year_desc", cursor=page.next_cursor))
+    with pytest.raises(InvalidCursor):
+        await search_catalog_page(catalog_session, CatalogQuery(make="nissan", cursor="no-es-un-cursor"))
+
+
+@pytest.mark.asyncio
+async def test_total_is_capped(catalog_session, monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_COUNT_CAP", 5)
+    page = await search_catalog_page(catalog_session, CatalogQuery(limit=2))
+    assert (page.total, page.total_capped) == (5, True)
+    assert [c["make"] for c in page.items] == ["mazda", "nissan"]
+    assert await search_catalog(catalog_session, CatalogQuery(limit=2)) == page.items
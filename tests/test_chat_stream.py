@@ -0,0 +1,129 @@
+import json
+from types import SimpleNamespace
+
+import fakeredis
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.api import routes_chat
+from app.llm import orchestrator, tool_cache, tools
+from app.services import conversation_service
+from app.services.conversation_service import ConversationService
+from app.tools.catalog import CatalogPage
+
+
+def delta(content=None, tool_calls=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=tool_calls))])
+
+
+def tc_delta(index, id_=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=id_, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+class ScriptedStream:
+    """Sustituto de stream_chat_completion: cada llamada consume una lista de chunks."""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.requests = []
+
+    async def __call__(self, **kwargs):
+        self.requests.append(list(kwargs["messages"]))
+        for chunk in self.steps.pop(0):
+            yield chunk
+
+
+def parse_sse(text: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    tool_cache.clear_tool_cache()
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    factory = async_sessionmaker(engine, class_=AsyncSession)
+    monkeypatch.setattr(conversation_service.settings, "SEMANTIC_CACHE_ENABLED", False)
+
+    svc = ConversationService(fakeredis.FakeAsyncRedis())
+    original = svc.stream_message
+    svc.stream_message = lambda user_id, body: original(user_id, body, session_factory=factory)
+
+    app = FastAPI()
+    app.include_router(routes_chat.router)
+    app.dependency_overrides[ConversationService.depends] = lambda: svc
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        c.svc = svc
+        yield c
+    await engine.dispose()
+    tool_cache.clear_tool_cache()
+
+
+async def test_stream_emits_tool_progress_tokens_and_persists_reply(monkeypatch, client):
+    async def fake_search(session, q):
+        car = {"id": 7, "make": "Nissan", "model": "Versa", "year": 2020, "price_mxn": 250000.0, "city": "CDMX"}
+        return CatalogPage([car], None, 1, False)
+
+    monkeypatch.setattr(tools, "search_catalog_page", fake_search)
+    llm = ScriptedStream(
+        [
+            delta(tool_calls=[tc_delta(0, "call_1", "search_", '{"make":')]),
+            delta(tool_calls=[tc_delta(0, name="catalog", arguments=' "Nissan"}')]),
+        ],
+        [delta("Tengo "), delta("un Versa "), delta("2020.")],
+    )
+    monkeypatch.setattr(orchestrator, "stream_chat_completion", llm)
+
+    resp = await client.post("/chat/stream", json={"user_id": "u1", "message": "busco un versa"})
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(resp.text)
+
+    assert events[0] == ("tool_start", {"tool": "search_catalog"})
+    assert events[1] == ("tool_end", {"tool": "search_catalog", "ok": True})
+    assert [d["text"] for t, d in events if t == "token"] == ["Tengo ", "un Versa ", "2020."]
+    assert events[-1] == ("reply", {"text": "Tengo un Versa 2020."})
+
+    # las tool calls fragmentadas se arman antes de ejecutarse
+    tool_msg = [m for m in llm.requests[1] if m["role"] == "tool"][0]
+    assert tool_msg["tool_call_id"] == "call_1"
+
+    history = await client.svc.sessions.get_history("u1")
+    assert history[-1] == {"role": "assistant", "content": "Tengo un Versa 2020."}
+    assert (await client.svc.sessions.get_state("u1")).last_catalog_results[0]["id"] == 7
+
+
+async def test_preamble_of_a_tool_step_is_reset(monkeypatch, client):
+    async def fake_search(session, q):
+        return CatalogPage([], None, 0, False)
+
+    monkeypatch.setattr(tools, "search_catalog_page", fake_search)
+    llm = ScriptedStream(
+        [delta("Déjame buscar... "), delta(tool_calls=[tc_delta(0, "call_1", "search_catalog", "{}")])],
+        [delta("No encontré "), delta("autos.")],
+    )
+    monkeypatch.setattr(orchestrator, "stream_chat_completion", llm)
+
+    resp = await client.post("/chat/stream", json={"user_id": "u1", "message": "busco un versa"})
+    events = parse_sse(resp.text)
+    assert [t for t, _ in events] == ["token", "reset", "tool_start", "tool_end", "token", "token", "reply"]
+
+    # el texto visible (tokens desde el último reset) es exactamente la respuesta guardada
+    last_reset = max(i for i, (t, _) in enumerate(events) if t == "reset")
+    visible = "".join(d["text"] for t, d in events[last_reset:] if t == "token")
+    assert visible == events[-1][1]["text"] == "No encontré autos."
+
+
+async def test_stream_reports_errors_as_events(monkeypatch, client):
+    async def broken(**kwargs):
+        raise RuntimeError("openai down")
+        yield
+
+    monkeypatch.setattr(orchestrator, "stream_chat_completion", broken)
+    resp = await client.post("/chat/stream", json={"user_id": "u1", "message": "hola"})
+    assert parse_sse(resp.text) == [("error", {"message": "internal_error"})]
@@ -0,0 +1,129 @@
+import sys
+
+import fakeredis
+import pytest
+
+from app.core.config import settings
+from app.llm import context
+from app.llm.context import build_messages, count_tokens, fit_history, split_for_compaction
+from app.memory.session_store import SessionStore
+from app.services import conversation_service
+from app.services.conversation_service import ConversationService
+
+
+def turns(n: int, size: int = 70) -> list[dict]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i:02d} " + "x" * size}
+        for i in range(n)
+    ]
+
+
+def test_heuristic_token_count():
+    assert count_tokens("") == 0
+    assert count_tokens("x" * 35) == 10
+
+
+def test_history_is_trimmed_to_the_token_budget(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 100)
+    history = turns(10)  # ~25 tokens por mensaje
+
+    kept = fit_history(history, 100)
+    assert kept == history[-4:]
+
+    messages = build_messages("sys", history, "hola", summary="Busca un Sentra 2020")
+    assert messages[0] == {"role": "system", "content": "sys"}
+    assert "Sentra" in messages[1]["content"]
+    assert messages[-1] == {"role": "user", "content": "hola"}
+    # el resumen consume parte del presupuesto
+    assert len(messages) - 3 < 4
+
+
+def test_split_for_compaction(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 100)
+    monkeypatch.setattr(settings, "HISTORY_KEEP_MESSAGES", 4)
+    assert split_for_compaction(turns(3)) is None
+    history = turns(10)
+    assert split_for_compaction(history) == history[:-4]
+
+
+def test_compaction_waits_for_a_minimum_chunk(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 1)
+    monkeypatch.setattr(settings, "HISTORY_KEEP_MESSAGES", 4)
+    monkeypatch.setattr(settings, "HISTORY_COMPACT_MIN_MESSAGES", 6)
+    # recién compactado (4 conservados) + 1-2 turnos nuevos: no se resume todavía
+    assert split_for_compaction(turns(6)) is None
+    assert split_for_compaction(turns(8)) is None
+    assert len(split_for_compaction(turns(10))) == 6
+
+
+async def test_history_is_not_trimmed_before_it_is_summarized(redis, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TURNS", 2)
+    store = SessionStore(redis)
+    for t in turns(20):
+        await store.append_turn("u1", t["role"], t["content"])
+    # HISTORY_MAX_TURNS sólo limita el prompt; Redis guarda todo hasta compactar
+    assert len(await store.get_history("u1")) == 20
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis()
+
+
+async def test_compact_replaces_prefix_with_summary(redis):
+    store = SessionStore(redis)
+    for t in turns(6):
+        await store.append_turn("u1", t["role"], t["content"])
+
+    history = await store.get_history("u1")
+    assert await store.compact("u1", history[:4], "resumen")
+    assert await store.get_history("u1") == history[4:]
+    assert await store.get_summary("u1") == "resumen"
+
+    # el inicio ya no coincide: no se toca nada
+    assert not await store.compact("u1", history[:2], "otro")
+    assert await store.get_summary("u1") == "resumen"
+
+
+async def test_service_compacts_after_reply(monkeypatch, redis):
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 100)
+    monkeypatch.setattr(settings, "HISTORY_KEEP_MESSAGES", 4)
+    seen = {}
+
+    async def fake_summarize(previous, old):
+        seen["old"] = old
+        return "Cliente busca Sentra, enganche 50k"
+
+    monkeypatch.setattr(conversation_service, "summarize", fake_summarize)
+    svc = ConversationService(redis)
+    for t in turns(10):
+        await svc.sessions.append_turn("u1", t["role"], t["content"])
+
+    await svc.compact_history("u1")
+    assert len(seen["old"]) == 6
+    assert len(await svc.sessions.get_history("u1")) == 4
+    assert await svc.sessions.get_summary("u1") == "Cliente busca Sentra, enganche 50k"
+
+
+async def test_compaction_failures_are_swallowed(monkeypatch, redis):
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 10)
+
+    async def broken(previous, old):
+        raise RuntimeError("openai down")
+
+    monkeypatch.setattr(conversation_service, "summarize", broken)
+    svc = ConversationService(redis)
+    for t in turns(8):
+        await svc.sessions.append_turn("u1", t["role"], t["content"])
+    await svc.compact_history("u1")
+    assert len(await svc.sessions.get_history("u1")) == 8
+
+
+def test_tokenizer_falls_back_without_encoding(monkeypatch):
+    monkeypatch.setattr(settings, "TOKENIZER", "tiktoken")
+    monkeypatch.setitem(sys.modules, "tiktoken", None)  # ImportError
+    context._encoder.cache_clear()
+    try:
+        assert count_tokens("x" * 35) == 10
+    finally:
+        context._encoder.cache_clear()
@@ -0,0 +1,67 @@
+import fakeredis
+import msgpack
+
+from app.memory.conversation_state import (
+    ConversationState,
+    apply_tool_calls,
+    decode_state,
+    encode_state,
+    render_state,
+)
+from app.memory.session_store import SessionStore
+
+CARS = [
+    {"id": 1, "make": "Nissan", "model": "Sentra", "year": 2020, "price_mxn": 250000.0, "city": "CDMX",
+     "mileage_km": 40000, "transmission": "automatic", "fuel": "gasoline", "body_type": "sedan"},
+    {"id": 2, "make": "Nissan", "model": "Sentra", "year": 2021, "price_mxn": 289000.0, "city": "Monterrey",
+     "mileage_km": 30000, "transmission": "automatic", "fuel": "gasoline", "body_type": "sedan"},
+]
+PAGE = {"results": CARS, "next_cursor": "abc", "total": 12, "total_capped": False}
+FINANCING = [
+    {"years": 3, "months": 36, "monthly_payment": "7743.99", "total_paid": "278783.64", "total_interest": "39783.64"},
+    {"years": 4, "months": 48, "monthly_payment": "6061.61", "total_paid": "290957.28", "total_interest": "51957.28"},
+]
+
+
+def test_tool_results_update_state_and_render():
+    state = apply_tool_calls(ConversationState(), [("search_catalog", {"make": "Nissan"}, PAGE)])
+    assert state.last_catalog_query == {"make": "Nissan"}
+    assert state.last_catalog_results[1]["city"] == "Monterrey"
+    assert "mileage_km" not in state.last_catalog_results[0]
+    assert (state.last_catalog_cursor, state.last_catalog_total) == ("abc", 12)
+
+    state = apply_tool_calls(
+        state, [("calc_financing", {"price_mxn": 289000, "down_payment": 50000, "annual_rate": 0.1}, FINANCING)]
+    )
+    assert state.selected_car["id"] == 2
+    assert state.last_financing["options"][1] == {"months": 48, "monthly_payment": "6061.61"}
+
+    text = render_state(state)
+    assert "2. Nissan Sentra 2021 · $289,000 · Monterrey (id 2)" in text
+    assert "48m $6,061.61" in text
+    assert "(12 coincidencias en total)" in text
+    assert 'search_catalog con {"make": "Nissan"} y cursor="abc"' in text
+
+
+def test_unrelated_or_failed_tools_keep_the_same_state():
+    state = ConversationState()
+    assert apply_tool_calls(state, [("retrieve_kavak_knowledge", {}, [])]) is state
+    assert apply_tool_calls(state, [("search_catalog", {}, {"error": "timeout"})]) is state
+    assert render_state(state) is None
+
+
+def test_msgpack_roundtrip_and_schema_version():
+    state = apply_tool_calls(ConversationState(), [("search_catalog", {"make": "Nissan"}, PAGE)])
+    assert decode_state(encode_state(state)) == state
+
+    stale = msgpack.packb({"v": 1, "last_catalog_results": []})
+    assert decode_state(stale) == ConversationState()
+    assert decode_state(b"\xc1garbage") == ConversationState()
+
+
+async def test_state_is_stored_per_user():
+    store = SessionStore(fakeredis.FakeAsyncRedis())
+    state = apply_tool_calls(ConversationState(), [("search_catalog", {}, PAGE)])
+    await store.set_state("u1", state)
+    assert await store.get_state("u1") == state
+    assert (await store.get_state("u2")).empty
@@ -0,0 +1,65 @@
+import asyncio
+
+from app.queue.dispatcher import KeyedDispatcher
+
+
+async def test_same_key_runs_in_order_other_keys_in_parallel():
+    d = KeyedDispatcher(max_in_flight=4)
+    events: list[str] = []
+
+    def job(name: str, delay: float):
+        async def _run():
+            events.append(f"start:{name}")
+            await asyncio.sleep(delay)
+            events.append(f"end:{name}")
+        return _run
+
+    d.submit("a", job("a1", 0.05))
+    d.submit("a", job("a2", 0.0))
+    d.submit("b", job("b1", 0.0))
+    await d.drain()
+
+    # b1 no espera a a1; a2 sí
+    assert events.index("end:b1") < events.index("end:a1")
+    assert events.index("end:a1") < events.index("start:a2")
+
+
+async def test_capacity_bounds_in_flight():
+    d = KeyedDispatcher(max_in_flight=2)
+    release = asyncio.Event()
+    peak = 0
+
+    async def blocked():
+        nonlocal peak
+        peak = max(peak, d.in_flight)
+        await release.wait()
+
+    d.submit("a", blocked)
+    d.submit("b", blocked)
+    assert d.free_slots == 0
+
+    waiter = asyncio.create_task(d.wait_for_capacity())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    release.set()
+    assert await asyncio.wait_for(waiter, 1) >= 1
+    await d.drain()
+    assert peak == 2
+    assert d.in_flight == 0
+
+
+async def test_failure_does_not_block_next_message_of_same_key():
+    d = KeyedDispatcher(max_in_flight=2)
+    done: list[str] = []
+
+    async def boom():
+        raise RuntimeError("boom")
+
+    async def ok():
+        done.append("ok")
+
+    d.submit("a", boom)
+    d.submit("a", ok)
+    await d.drain()
+    assert done == ["ok"]
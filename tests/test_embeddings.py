@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import fakeredis
+import numpy as np
+import pytest
+
+from app.rag import embeddings
+from app.rag.embeddings import Embedder, EmbeddingService, embed_query
+
+
+class CountingModel:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: list[list[str]] = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        time.sleep(self.delay)
+        for t in texts:
+            yield np.full(4, float(len(t)), dtype=np.float32)
+
+
+def make_service(delay: float = 0.0, **kw) -> EmbeddingService:
+    e = Embedder(model_name="test-model")
+    e._model = CountingModel(delay)
+    return EmbeddingService(e, **kw)
+
+
+@pytest.fixture
+async def service():
+    embeddings.clear_query_cache()
+    svc = make_service()
+    yield svc
+    await svc.close()
+    embeddings.clear_query_cache()
+
+
+def test_embedder_does_not_load_model_on_init():
+    assert not Embedder(model_name="test-model").loaded
+
+
+async def test_query_embeddings_hit_lru_by_normalized_text(service):
+    v1 = await embed_query("  ¿Dónde están las SEDES? ", service=service)
+    v2 = await embed_query("¿dónde están las sedes?", service=service)
+    assert v1 is v2
+    assert v1.dtype == np.float32
+    assert service.embedder._model.calls == [["¿dónde están las sedes?"]]
+
+
+async def test_redis_tier_shared_between_processes(service):
+    redis = fakeredis.FakeAsyncRedis()
+    v1 = await embed_query("garantía", redis=redis, service=service)
+
+    # Otro proceso: LRU vacío, Redis con el vector
+    embeddings.clear_query_cache()
+    v2 = await embed_query("garantía", redis=redis, service=service)
+    np.testing.assert_array_equal(v1, v2)
+    assert len(service.embedder._model.calls) == 1
+
+
+async def test_concurrent_queries_are_micro_batched_off_the_loop():
+    svc = make_service(delay=0.05, max_batch=8, max_wait_ms=20, threads=1)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    t = asyncio.create_task(ticker())
+    try:
+        out = await asyncio.gather(*(svc.embed([f"q{i}"]) for i in range(8)))
+    finally:
+        t.cancel()
+        await svc.close()
+
+    assert svc.embedder._model.calls == [[f"q{i}" for i in range(8)]]
+    assert all(o.shape == (1, 4) for o in out)
+    # el loop siguió atendiendo otras tareas durante la inferencia
+    assert ticks >= 5
+
+
+def test_embed_returns_contiguous_float32_matrix():
+    e = Embedder(model_name="test-model")
+    e._model = CountingModel()
+    out = e.embed(["a", "bb", "ccc"])
+    assert out.shape == (3, 4)
+    assert out.dtype == np.float32
+    assert out.flags["C_CONTIGUOUS"]
+    assert out[:, 0].tolist() == [1.0, 2.0, 3.0]
+
+
+async def test_upsert_vectors_sends_matrix_in_batches():
+    from app.rag.qdrant_store import upsert_vectors
+
+    class StubQdrant:
+        def __init__(self):
+            self.batches = []
+
+        async def upsert(self, collection_name, points):
+            self.batches.append(points)
+
+    client = StubQdrant()
+    vectors = np.arange(20, dtype=np.float32).reshape(5, 4)
+    await upsert_vectors(client, [1, 2, 3, 4, 5], vectors, [{"i": i} for i in range(5)], batch_size=2)
+
+    assert [b.ids for b in client.batches] == [[1, 2], [3, 4], [5]]
+    assert client.batches[2].vectors == [[16.0, 17.0, 18.0, 19.0]]
@@ -0,0 +1,39 @@
+import asyncio
+
+from app.rag.hybrid import reciprocal_rank_fusion
+from app.rag.rerank import rerank
+
+
+def _r(content: str, source: str = "s") -> dict:
+    return {"source": source, "title": None, "content": content, "score": 0.0}
+
+
+def test_rrf_rewards_agreement_between_retrievers():
+    dense = [_r("a"), _r("b"), _r("c")]
+    lexical = [_r("c"), _r("d")]
+    fused = reciprocal_rank_fusion([dense, lexical], k=60)
+    assert [f["content"] for f in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["score"] == 1 / 63 + 1 / 61
+
+
+class SlowReranker:
+    def score(self, query, documents):
+        import time
+
+        time.sleep(0.2)
+        return list(range(len(documents)))
+
+
+class ReverseReranker:
+    def score(self, query, documents):
+        return list(range(len(documents)))
+
+
+async def test_rerank_reorders_within_budget_and_keeps_order_on_timeout():
+    cands = [_r("a"), _r("b"), _r("c")]
+    out = await rerank("q", cands, budget_ms=1000, reranker=ReverseReranker())
+    assert [c["content"] for c in out] == ["c", "b", "a"]
+
+    out = await rerank("q", cands, budget_ms=10, reranker=SlowReranker())
+    assert out == cands
+    await asyncio.sleep(0.25)
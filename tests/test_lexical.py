@@ -0,0 +1,20 @@
+from app.rag.lexical import BM25Index, _Doc, query_terms, tokenize
+
+
+def test_tokenize_strips_accents_stopwords_and_plurals():
+    assert tokenize("¿Dónde están las Sedes de Kavak? Garantías") == ["sede", "kavak", "garantia"]
+
+
+def test_query_terms_are_safe_for_tsquery():
+    assert query_terms("garantía & sedes | 'x'; de la") == ["garantía", "sedes"]
+
+
+def test_bm25_prefers_rare_terms():
+    index = BM25Index([
+        _Doc("s", None, "kavak vende autos seminuevos con garantía"),
+        _Doc("s", None, "kavak tiene sedes en cdmx"),
+        _Doc("s", None, "kavak financia autos"),
+    ])
+    hits = index.search("sedes kavak", top_k=3)
+    assert hits[0][0] == 1
+    assert index.search("helicópteros", top_k=3) == []
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.llm.client import build_openai_client, create_chat_completion
+
+_COMPLETION = {
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [
+        {"index": 0, "message": {"role": "assistant", "content": "hola"}, "finish_reason": "stop"}
+    ],
+}
+
+
+class StubOpenAI:
+    """Servidor HTTP/1.1 mínimo con keep-alive que cuenta conexiones y peticiones."""
+
+    def __init__(self, statuses: list[int] | None = None):
+        self.statuses = list(statuses or [])
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+
+                status = self.statuses.pop(0) if self.statuses else 200
+                payload = _COMPLETION if status == 200 else {"error": {"message": "busy"}}
+                body = json.dumps(payload).encode()
+                writer.write(
+                    b"HTTP/1.1 %d STUB\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+                    % (status, len(body))
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest.fixture
+async def stub():
+    s = StubOpenAI()
+    server = await asyncio.start_server(s.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    s.base_url = f"http://127.0.0.1:{port}/v1"
+    yield s
+    server.close()
+
+
+async def test_shared_client_reuses_connection(stub):
+    client = build_openai_client(base_url=stub.base_url)
+    try:
+        for _ in range(5):
+            resp = await create_chat_completion(client, model="stub", messages=[{"role": "user", "content": "hi"}])
+            assert resp.choices[0].message.content == "hola"
+    finally:
+        await client.close()
+
+    assert stub.requests == 5
+    assert stub.connections == 1
+
+
+async def test_retries_on_server_error(stub, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_RETRY_BACKOFF_S", 0.0)
+    stub.statuses = [503, 429]
+    client = build_openai_client(base_url=stub.base_url)
+    try:
+        resp = await create_chat_completion(client, model="stub", messages=[{"role": "user", "content": "hi"}])
+    finally:
+        await client.close()
+
+    assert resp.choices[0].message.content == "hola"
+    assert stub.requests == 3
@@ -1,4 +1,4 @@
-from app.tools.normalize import normalize_make_model
+from app.tools.normalize import LEARNED_ALIASES, MakeModelIndex, normalize_make_model
 
 def test_normalize_exact():
     pairs = ["nissan sentra", "mazda mazda3", "toyota corolla"]
@@ -11,4 +11,54 @@ def test_normalize_typo():
     pairs = ["nissan sentra", "mazda mazda3", "toyota corolla"]
     out = normalize_make_model("Nisssan", "Sentra", pairs)
     assert out.make == "nissan"
-    assert out.confidence >= 70
\ No newline at end of file
+    assert out.confidence >= 70
+
+PAIRS = [("nissan", "sentra"), ("nissan", "versa"), ("mazda", "mazda3"), ("land rover", "discovery sport"), ("toyota", "corolla")]
+
+def test_index_resolves_multiword_make_and_model_within_make():
+    idx = MakeModelIndex(PAIRS)
+    out = idx.normalize("Land Rober", "discovery")
+    assert (out.make, out.model) == ("land rover", "discovery sport")
+
+def test_index_model_only_and_make_only():
+    idx = MakeModelIndex(PAIRS)
+    out = idx.normalize(None, "corola")
+    assert (out.make, out.model) == ("toyota", "corolla")
+
+    out = idx.normalize("nissan", None)
+    assert out.make == "nissan" and out.model is None
+    assert out.candidates == ["nissan sentra", "nissan versa"]
+
+def test_index_learns_make_aliases():
+    LEARNED_ALIASES.pop("nisssan", None)
+    idx = MakeModelIndex(PAIRS)
+    idx.normalize("Nisssan", "versa")
+    assert LEARNED_ALIASES["nisssan"][0] == "nissan"
+
+def test_aliases_are_learned_only_from_confirmed_matches():
+    LEARNED_ALIASES.pop("nisssan", None)
+    idx = MakeModelIndex(PAIRS)
+    # sólo la marca, o un modelo que no coincide: no se aprende nada
+    idx.normalize("Nisssan", None)
+    idx.normalize("Nisssan", "zzzz")
+    assert "nisssan" not in LEARNED_ALIASES
+    # basura del usuario nunca entra al diccionario
+    idx.normalize("nissan!!! <script>", "sentra")
+    assert not any("<" in a for a in LEARNED_ALIASES)
+
+def test_from_strings_keeps_multiword_makes():
+    out = normalize_make_model("Alfa Romeo", "Giulia", ["alfa romeo giulia", "nissan sentra"])
+    assert (out.make, out.model) == ("alfa romeo", "giulia")
+    out = normalize_make_model("alfa romeo", "giulia", [("alfa romeo", "giulia"), ("nissan", "sentra")])
+    assert (out.make, out.model) == ("alfa romeo", "giulia")
+
+def test_normalize_many_matches_single_calls():
+    idx = MakeModelIndex(PAIRS)
+    items = [("nisan", "sentra"), ("vw", None), (None, "mazda 3"), ("toyota", "corola")]
+    assert idx.normalize_many(items) == [idx.normalize(mk, md) for mk, md in items]
+
+def test_index_blocks_large_vocabularies():
+    pairs = [("nissan", f"modelo{i:04d}") for i in range(2000)] + [("nissan", "sentra")]
+    idx = MakeModelIndex(pairs)
+    out = idx.normalize("nissan", "sentre")
+    assert out.model == "sentra"
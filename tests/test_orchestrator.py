@@ -0,0 +1,159 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import dataclasses
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.metrics import metrics
+from app.llm import orchestrator, tool_cache, tools
+from app.llm.orchestrator import AgentTrace, run_agent
+from app.tools.catalog import CatalogPage
+
+
+def tool_call(id_: str, name: str, args: dict) -> SimpleNamespace:
+    return SimpleNamespace(id=id_, function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+
+
+def completion(content: str = "", tool_calls=None) -> SimpleNamespace:
+    msg = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(message=msg)])
+
+
+class ScriptedLLM:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests: list[list[dict]] = []
+
+    async def __call__(self, **kwargs):
+        self.requests.append(list(kwargs["messages"]))
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def clean_tool_cache():
+    tool_cache.clear_tool_cache()
+    yield
+    tool_cache.clear_tool_cache()
+
+
+@pytest.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with async_sessionmaker(engine, class_=AsyncSession)() as s:
+        yield s
+    await engine.dispose()
+
+
+@pytest.fixture
+def slow_tools(monkeypatch):
+    sessions: list[AsyncSession] = []
+
+    async def fake_search(session, q):
+        sessions.append(session)
+        await asyncio.sleep(0.2)
+        return CatalogPage([{"make": "Nissan", "model": "Versa"}], None, 1, False)
+
+    async def fake_rag(session, query, top_k, redis=None):
+        sessions.append(session)
+        await asyncio.sleep(0.2)
+        return [{"content": "sedes"}]
+
+    monkeypatch.setattr(tools, "search_catalog_page", fake_search)
+    monkeypatch.setattr(tools, "retrieve_kavak_knowledge", fake_rag)
+    return sessions
+
+
+async def test_tool_calls_of_a_step_run_concurrently_in_order(monkeypatch, session, slow_tools):
+    llm = ScriptedLLM(
+        completion(
+            tool_calls=[
+                tool_call("call_1", "search_catalog", {"make": "Nissan"}),
+                tool_call("call_2", "retrieve_kavak_knowledge", {"query": "sedes"}),
+                tool_call("call_3", "calc_financing", {"price_mxn": 200000, "down_payment": 40000}),
+            ]
+        ),
+        completion("listo"),
+    )
+    monkeypatch.setattr(orchestrator, "create_chat_completion", llm)
+    trace = AgentTrace()
+
+    t0 = time.perf_counter()
+    reply = await run_agent(session, [], "hola", trace=trace)
+    elapsed = time.perf_counter() - t0
+
+    assert reply == "listo"
+    assert elapsed < 0.35  # max() de las tools, no la suma
+    tool_msgs = [m for m in llm.requests[1] if m["role"] == "tool"]
+    assert [m["tool_call_id"] for m in tool_msgs] == ["call_1", "call_2", "call_3"]
+    assert [name for name, _, _ in trace.tool_calls] == ["search_catalog", "retrieve_kavak_knowledge", "calc_financing"]
+    # cada tool concurrente usa su propia sesión
+    assert len({id(s) for s in slow_tools}) == 2
+    assert session not in slow_tools
+
+
+async def test_single_tool_reuses_session_and_timeouts_are_reported(monkeypatch, session, slow_tools):
+    spec = dataclasses.replace(tools.TOOLS["search_catalog"], timeout_s=0.05)
+    monkeypatch.setitem(tools.TOOLS, "search_catalog", spec)
+    llm = ScriptedLLM(
+        completion(tool_calls=[tool_call("c1", "search_catalog", {})]),
+        completion(tool_calls=[tool_call("c2", "retrieve_kavak_knowledge", {"query": "sedes"})]),
+        completion("ok"),
+    )
+    monkeypatch.setattr(orchestrator, "create_chat_completion", llm)
+    trace = AgentTrace()
+
+    assert await run_agent(session, [], "hola", trace=trace) == "ok"
+    assert trace.tool_calls[0][2] == {"error": "timeout"}
+    assert trace.has_errors
+    assert slow_tools[-1] is session
+
+
+def test_tool_definitions_are_precomputed():
+    defs = tools.tool_definitions()
+    assert defs is tools.tool_definitions()
+    assert [d["function"]["name"] for d in defs] == [
+        "search_catalog",
+        "calc_financing",
+        "retrieve_kavak_knowledge",
+        "normalize_make_model",
+    ]
+
+
+async def test_unknown_tools_and_bad_arguments_are_reported(monkeypatch, session):
+    metrics.reset()
+    llm = ScriptedLLM(
+        completion(
+            tool_calls=[
+                tool_call("c1", "book_test_drive", {}),
+                tool_call("c2", "calc_financing", {"price_mxn": "mucho"}),
+                tool_call("c3", "calc_financing", {"price_mxn": 200000, "down_payment": 40000}),
+            ]
+        ),
+        completion("ok"),
+    )
+    monkeypatch.setattr(orchestrator, "create_chat_completion", llm)
+    trace = AgentTrace()
+
+    await run_agent(session, [], "hola", trace=trace)
+    outs = [out for _, _, out in trace.tool_calls]
+    assert outs[0] == {"error": "unknown_tool"}
+    assert outs[1] == {"error": "invalid_arguments"}
+    assert outs[2][0]["months"] == 36
+    assert metrics.counter("tool_calls_total", tool="calc_financing", outcome="ok") == 1
+    assert metrics.counter("tool_calls_total", tool="calc_financing", outcome="invalid_arguments") == 1
+    assert metrics.snapshot()["timings"]["tool_latency_seconds{tool=calc_financing}"]["count"] == 1
+
+
+async def test_repeated_deterministic_calls_hit_the_tool_cache(monkeypatch, session, slow_tools):
+    def call(i: int) -> SimpleNamespace:
+        return completion(tool_calls=[tool_call(f"c{i}", "search_catalog", {"make": "Nissan", "model": "Sentra"})])
+
+    llm = ScriptedLLM(call(1), call(2), completion("ok"))
+    monkeypatch.setattr(orchestrator, "create_chat_completion", llm)
+
+    await run_agent(session, [], "sentras más baratos")
+    assert len(slow_tools) == 1
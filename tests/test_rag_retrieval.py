@@ -0,0 +1,137 @@
+import asyncio
+
+import numpy as np
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.metrics import metrics
+from app.db.models import Base, KnowledgeChunk
+from app.rag import qdrant_store
+from app.tools import rag
+from app.tools.rag import retrieve_kavak_knowledge
+
+
+SEDES = "Tenemos sedes en Monterrey, Guadalajara y CDMX."
+
+
+class Hit:
+    def __init__(self, source: str, content: str, score: float):
+        self.payload = {"source": source, "title": "t", "content": content}
+        self.score = score
+
+
+class StubQdrant:
+    """Sustituto de AsyncQdrantClient: puede estar caído o sano."""
+
+    def __init__(self):
+        self.down = False
+        self.queries = 0
+
+    async def query_points(self, collection_name, query, limit, with_payload):
+        self.queries += 1
+        if self.down:
+            raise ConnectionError("qdrant down")
+        points = [Hit("qdrant", "Compra tu auto 100% en línea.", 0.95), Hit("pg", SEDES, 0.9)]
+        return type("Resp", (), {"points": points})()
+
+    async def get_collections(self):
+        if self.down:
+            raise ConnectionError("qdrant down")
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with Session() as s:
+        s.add_all([
+            KnowledgeChunk(source="pg", title="Garantía", content="Todos los autos tienen garantía de 3 meses."),
+            KnowledgeChunk(source="pg", title="Sedes", content=SEDES),
+        ])
+        await s.commit()
+        yield s
+    await engine.dispose()
+
+
+@pytest.fixture
+async def qdrant(monkeypatch):
+    monkeypatch.setattr(qdrant_store.settings, "QDRANT_CB_FAILURES", 2)
+    monkeypatch.setattr(qdrant_store.settings, "QDRANT_CB_RESET_S", 0.01)
+
+    async def fake_embed(query, redis=None):
+        return np.zeros(4, dtype=np.float32)
+
+    monkeypatch.setattr(rag, "embed_query", fake_embed)
+    stub = StubQdrant()
+    qdrant_store.init_client(stub)
+    metrics.reset()
+    yield stub
+    await qdrant_store.close_client()
+
+
+async def test_hybrid_fuses_dense_and_lexical_and_dedups(session, qdrant):
+    out = await retrieve_kavak_knowledge(session, "sedes", top_k=4)
+    # El chunk de sedes aparece en ambos rankings: se fusiona una sola vez y sube al primer lugar
+    assert out[0]["content"] == SEDES
+    assert [r["content"] for r in out].count(SEDES) == 1
+    assert {r["source"] for r in out} == {"pg", "qdrant"}
+    assert metrics.counter("rag_served_total", path="hybrid") == 1
+
+
+async def test_top_k_from_llm_is_capped(session, qdrant, monkeypatch):
+    monkeypatch.setattr(rag.settings, "RAG_TOP_K_MAX", 1)
+    assert len(await retrieve_kavak_knowledge(session, "sedes garantía", top_k=10)) == 1
+
+
+async def test_breaker_short_circuits_to_postgres_and_recovers(session, qdrant):
+    qdrant.down = True
+    for _ in range(2):
+        out = await retrieve_kavak_knowledge(session, "sedes")
+        assert out[0]["source"] == "pg"
+    assert qdrant_store.get_breaker().state == "open"
+
+    # Abierto: no se toca Qdrant
+    calls = qdrant.queries
+    await retrieve_kavak_knowledge(session, "sedes")
+    assert qdrant.queries == calls
+    assert metrics.counter("rag_short_circuit_total") == 1
+    assert metrics.counter("rag_served_total", path="postgres") == 3
+
+    # El probe en background detecta la recuperación y cierra el breaker
+    qdrant.down = False
+    for _ in range(50):
+        if qdrant_store.get_breaker().state == "closed":
+            break
+        await asyncio.sleep(0.01)
+    out = await retrieve_kavak_knowledge(session, "sedes")
+    assert "qdrant" in {r["source"] for r in out}
+
+
+async def test_fallback_ranks_chunks_by_query_relevance(session, qdrant):
+    qdrant.down = True
+    out = await retrieve_kavak_knowledge(session, "¿En qué sedes de Monterrey están?", top_k=1)
+    assert out[0]["title"] == "Sedes"
+    out = await retrieve_kavak_knowledge(session, "qué garantia tienen los autos", top_k=2)
+    assert out[0]["title"] == "Garantía"
+    assert out[0]["score"] > 0
+
+
+async def test_lexical_failure_still_serves_dense_results(session, qdrant, monkeypatch):
+    async def broken_lexical(session, query, top_k):
+        raise RuntimeError('column "search_tsv" does not exist')
+
+    monkeypatch.setattr(rag, "search_lexical", broken_lexical)
+    out = await retrieve_kavak_knowledge(session, "sedes")
+    assert {r["source"] for r in out} == {"pg", "qdrant"}
+    assert metrics.counter("rag_served_total", path="qdrant") == 1
+    assert metrics.counter("rag_lexical_errors_total") == 1
+
+    # ambos caídos: el fallback de últimos chunks sigue respondiendo
+    qdrant.down = True
+    out = await retrieve_kavak_knowledge(session, "sedes")
+    assert out and out[0]["score"] == 0.0
@@ -0,0 +1,75 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.core.config import settings
+from app.queue.redis_stream import (
+    GROUP,
+    STREAM_DLQ,
+    STREAM_IN,
+    QueueMessage,
+    RedisStreamQueue,
+    retry_backoff_ms,
+)
+
+
+@pytest.fixture
+async def queue(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_RETRY_BASE_MS", 10)
+    monkeypatch.setattr(settings, "QUEUE_RETRY_MAX_MS", 40)
+    monkeypatch.setattr(settings, "QUEUE_MAX_DELIVERIES", 2)
+    q = RedisStreamQueue(fakeredis.FakeAsyncRedis())
+    await q.ensure_group()
+    return q
+
+
+def test_retry_backoff_is_exponential_and_capped(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_RETRY_BASE_MS", 100)
+    monkeypatch.setattr(settings, "QUEUE_RETRY_MAX_MS", 350)
+    assert [retry_backoff_ms(n) for n in (1, 2, 3, 4)] == [100, 200, 350, 350]
+
+
+async def test_failed_message_is_reclaimed_then_dead_lettered(queue):
+    await queue.publish(QueueMessage(user_id="u1", from_number="whatsapp:+1", body="hola", raw={}))
+    resp = await queue.consume("c1", count=1, block_ms=10)
+    message_id = resp[0][1][0][0]
+
+    # Sin ack: antes de vencer el backoff no se reclama
+    assert await queue.reclaim("c2") == []
+
+    await asyncio.sleep(0.02)
+    entries = await queue.reclaim("c2")
+    assert [e.message_id for e in entries] == [message_id]
+    assert entries[0].deliveries == 2
+    assert entries[0].fields[b"body"] == b"hola"
+
+    # Segundo fallo: agotó QUEUE_MAX_DELIVERIES → DLQ y sale de pendientes
+    await asyncio.sleep(0.03)
+    assert await queue.reclaim("c2") == []
+    dlq = await queue.redis.xrange(STREAM_DLQ)
+    assert dlq[0][1][b"original_id"] == message_id
+    assert await queue.redis.xpending_range(STREAM_IN, GROUP, min="-", max="+", count=10) == []
+
+
+async def test_reclaim_skips_messages_in_flight_locally(queue):
+    await queue.publish(QueueMessage(user_id="u1", from_number="whatsapp:+1", body="hola", raw={}))
+    resp = await queue.consume("c1", count=1, block_ms=10)
+    message_id = resp[0][1][0][0]
+    await asyncio.sleep(0.02)
+    assert await queue.reclaim("c1", exclude={message_id}) == []
+
+
+async def test_reclaim_is_not_blocked_by_ineligible_entries_at_the_head(queue):
+    for i in range(6):
+        await queue.publish(QueueMessage(user_id=f"u{i}", from_number="whatsapp:+1", body="hola", raw={}))
+    resp = await queue.consume("c1", count=6, block_ms=10)
+    ids = [mid for mid, _ in resp[0][1]]
+    await asyncio.sleep(0.02)
+
+    # con count=1 se escanean 4 por página: las 5 primeras (en proceso) ya no tapan la sexta
+    entries = await queue.reclaim("c2", count=1, exclude=set(ids[:5]))
+    assert [e.message_id for e in entries] == [ids[5]]
+    # el siguiente escaneo da la vuelta desde el inicio
+    entries = await queue.reclaim("c2", count=1, exclude=set(ids[1:]))
+    assert [e.message_id for e in entries] == [ids[0]]
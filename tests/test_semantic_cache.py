@@ -0,0 +1,120 @@
+import fakeredis
+import numpy as np
+import pytest
+
+from app.core.versions import KNOWLEDGE, bump_version
+from app.llm import semantic_cache
+from app.llm.orchestrator import AgentEvent
+from app.llm.semantic_cache import SemanticCache, cache_guard, is_self_contained
+from app.services import conversation_service
+from app.services.conversation_service import ConversationService
+
+
+def vec(*xs: float) -> np.ndarray:
+    return np.array(xs, dtype=np.float32)
+
+
+def test_lookup_by_cosine_similarity_and_version():
+    cache = SemanticCache(threshold=0.9, ttl_s=60, max_entries=4)
+    cache.store(vec(1, 0, 0), "sedes: CDMX", knowledge_version=1)
+
+    assert cache.lookup(vec(2, 0.1, 0), knowledge_version=1) == "sedes: CDMX"
+    assert cache.lookup(vec(0, 1, 0), knowledge_version=1) is None
+    # re-ingesta: la versión cambió y la entrada ya no se sirve
+    assert cache.lookup(vec(1, 0, 0), knowledge_version=2) is None
+
+
+def test_expired_entries_and_ring_buffer():
+    cache = SemanticCache(threshold=0.9, ttl_s=0, max_entries=2)
+    cache.store(vec(1, 0), "a", 0)
+    assert cache.lookup(vec(1, 0), 0) is None
+
+    cache = SemanticCache(threshold=0.9, ttl_s=60, max_entries=2)
+    cache.store(vec(1, 0), "a", 0)
+    cache.store(vec(0, 1), "b", 0)
+    cache.store(vec(1, 1), "c", 0)
+    assert len(cache) == 2
+    assert cache.lookup(vec(1, 0), 0) is None
+    assert cache.lookup(vec(1, 1), 0) == "c"
+
+
+@pytest.mark.parametrize(
+    "message,expected",
+    [
+        ("¿Dónde están las sedes de Kavak?", True),
+        ("¿Qué garantía tienen los autos?", True),
+        ("¿y el segundo?", False),
+        ("ese pero a 48 meses", False),
+        ("sí", False),
+    ],
+)
+def test_self_contained_heuristic(message, expected):
+    history = [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "¡Hola!"}]
+    assert is_self_contained(message, history) is expected
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "_cache", SemanticCache(threshold=0.9, ttl_s=60, max_entries=8))
+
+    async def fake_embed(text, redis=None):
+        return vec(1, 0) if "sede" in text.lower() else vec(0, 1)
+
+    calls: list[str] = []
+
+    async def fake_agent(session, history, user_message, redis=None, trace=None, summary=None, state=None, stream=False):
+        calls.append(user_message)
+        tool = "retrieve_kavak_knowledge" if "sede" in user_message.lower() else "search_catalog"
+        trace.tool_calls.append((tool, {}, []))
+        yield AgentEvent("reply", {"text": f"respuesta {len(calls)}"})
+
+    monkeypatch.setattr(conversation_service, "embed_query", fake_embed)
+    monkeypatch.setattr(conversation_service, "iter_agent", fake_agent)
+    svc = ConversationService(fakeredis.FakeAsyncRedis())
+    svc.calls = calls
+    return svc
+
+
+async def test_knowledge_answers_are_served_from_cache(service):
+    r1 = await service.handle_message(None, "u1", "+52", "¿Dónde están las sedes?")
+    r2 = await service.handle_message(None, "u2", "+52", "¿En qué ciudades tienen sedes?")
+    assert r1 == r2
+    assert len(service.calls) == 1
+    # el turno servido desde cache también queda en el historial
+    assert len(await service.sessions.get_history("u2")) == 2
+
+    await bump_version(service.redis, KNOWLEDGE)
+    await service.handle_message(None, "u3", "+52", "¿Dónde están las sedes?")
+    assert len(service.calls) == 2
+
+
+async def test_hits_require_the_same_entities_and_numbers(service):
+    # el embedding falso da similitud 1.0 a todo lo que menciona "sede"
+    r1 = await service.handle_message(None, "u1", "+52", "sedes en Monterrey")
+    r2 = await service.handle_message(None, "u2", "+52", "sedes en Guadalajara")
+    assert r1 != r2
+    await service.handle_message(None, "u3", "+52", "sedes abiertas 24 horas")
+    await service.handle_message(None, "u4", "+52", "sedes abiertas 12 horas")
+    assert len(service.calls) == 4
+
+    assert await service.handle_message(None, "u5", "+52", "¿Sedes en Monterrey?") == r1
+    assert len(service.calls) == 4
+
+
+def test_cache_guard_only_keeps_discriminating_entities():
+    # paráfrasis: sin números ni entidades, decide el umbral del embedding
+    assert cache_guard("¿Cuáles son los beneficios de comprar en Kavak?") == cache_guard(
+        "¿Qué beneficios tiene comprar con Kavak?"
+    )
+    assert cache_guard("¿Dónde están las sedes?") == cache_guard("¿En qué ciudades tienen sedes?")
+    assert cache_guard("sedes en Monterrey") != cache_guard("sedes en Guadalajara")
+    assert cache_guard("garantía de 3 meses") != cache_guard("garantía de 6 meses")
+    # los modelos vienen del vocabulario del catálogo
+    pairs = (("nissan", "versa"), ("nissan", "sentra"))
+    assert cache_guard("garantía del Versa", pairs) != cache_guard("garantía del Sentra", pairs)
+
+
+async def test_catalog_answers_are_not_cached(service):
+    await service.handle_message(None, "u1", "+52", "Busco un Versa 2020")
+    await service.handle_message(None, "u2", "+52", "Busco un Versa 2020")
+    assert len(service.calls) == 2
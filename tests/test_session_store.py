@@ -0,0 +1,57 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.core.config import settings
+from app.memory.conversation_state import ConversationState, apply_tool_calls
+from app.memory.session_store import SessionStore
+
+
+@pytest.fixture
+def store():
+    return SessionStore(fakeredis.FakeAsyncRedis())
+
+
+async def test_begin_and_finish_turn(store):
+    snap = await store.begin_turn("u1", "hola")
+    assert snap.history == [] and snap.summary is None and snap.state.empty
+
+    state = apply_tool_calls(ConversationState(), [("search_catalog", {}, {"results": [{"id": 1, "price_mxn": 1.0}]})])
+    await store.finish_turn("u1", "¡Hola! ¿Qué auto buscas?", state)
+
+    snap = await store.begin_turn("u1", "un sentra")
+    assert [m["content"] for m in snap.history] == ["hola", "¡Hola! ¿Qué auto buscas?"]
+    assert snap.state == state
+    assert len(await store.get_history("u1")) == 3
+
+
+async def test_keys_expire_when_idle(store):
+    await store.begin_turn("u1", "hola")
+    await store.finish_turn("u1", "hola", ConversationState(updated_at=1.0))
+    for key in ("conv:u1:history", "conv:u1:state"):
+        ttl = await store.redis.ttl(key)
+        assert 0 < ttl <= settings.SESSION_TTL_S
+
+
+async def test_history_is_capped(store, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_STORE_MAX_MESSAGES", 4)
+    await store.append_turns("u1", [("user", str(i)) for i in range(7)])
+    assert [m["content"] for m in await store.get_history("u1")] == ["3", "4", "5", "6"]
+
+
+async def test_concurrent_begin_turns_see_consistent_history(store):
+    snaps = await asyncio.gather(*(store.begin_turn("u1", f"m{i}") for i in range(8)))
+    # cada lectura es atómica con su append: los tamaños vistos son 0..7 sin repetirse
+    assert sorted(len(s.history) for s in snaps) == list(range(8))
+
+
+async def test_batch_load_and_clear(store):
+    await store.append_turn("u1", "user", "a")
+    await store.append_turn("u2", "user", "b")
+    snaps = await store.load_many(["u1", "u2", "u3"])
+    assert snaps["u1"].history[0]["content"] == "a"
+    assert snaps["u3"].history == []
+
+    assert await store.clear_many(["u1", "u2"]) == 2
+    assert await store.get_history("u1") == []
@@ -0,0 +1,86 @@
+import fakeredis
+import pytest
+
+from app.core.versions import CATALOG, bump_version
+from app.llm import tool_cache, tools
+from app.llm.schemas import ToolCatalogArgs
+from app.llm.tool_cache import canonical_args, get_or_compute
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    tool_cache.clear_tool_cache()
+    yield
+    tool_cache.clear_tool_cache()
+
+
+class Counter:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+def test_canonical_args_apply_defaults_and_sort_keys():
+    a = ToolCatalogArgs(make="Nissan", model="Sentra")
+    b = ToolCatalogArgs(model="Sentra", make="Nissan", limit=5)
+    assert canonical_args(a) == canonical_args(b)
+    assert canonical_args(a) != canonical_args(ToolCatalogArgs(make="Nissan", model="Sentra", price_max=300000))
+
+
+async def test_memory_and_redis_tiers():
+    redis = fakeredis.FakeAsyncRedis()
+    args = ToolCatalogArgs(make="Nissan", model="Sentra")
+    compute = Counter([{"make": "Nissan", "model": "Sentra", "price_mxn": "250000"}])
+
+    r1 = await get_or_compute("search_catalog", args, (CATALOG,), redis, compute)
+    r2 = await get_or_compute("search_catalog", args, (CATALOG,), redis, compute)
+    # otro worker: LRU vacío, resultado en Redis
+    tool_cache.clear_tool_cache()
+    r3 = await get_or_compute("search_catalog", args, (CATALOG,), redis, compute)
+
+    assert r1 == r2 == r3
+    assert compute.calls == 1
+
+
+async def test_catalog_version_bump_invalidates():
+    redis = fakeredis.FakeAsyncRedis()
+    args = ToolCatalogArgs(make="Nissan")
+    compute = Counter([])
+
+    await get_or_compute("search_catalog", args, (CATALOG,), redis, compute)
+    await bump_version(redis, CATALOG)  # seed_catalog
+    await get_or_compute("search_catalog", args, (CATALOG,), redis, compute)
+    assert compute.calls == 2
+
+
+async def test_errors_are_not_cached():
+    compute = Counter({"error": "timeout"})
+    args = ToolCatalogArgs()
+    await get_or_compute("search_catalog", args, (CATALOG,), None, compute)
+    await get_or_compute("search_catalog", args, (CATALOG,), None, compute)
+    assert compute.calls == 2
+
+
+class DownRedis:
+    async def get(self, key):
+        raise ConnectionError("redis down")
+
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+async def test_redis_errors_fall_back_to_computing():
+    compute = Counter([{"id": 1}])
+    args = ToolCatalogArgs(make="Nissan")
+    assert await get_or_compute("search_catalog", args, (CATALOG,), DownRedis(), compute) == [{"id": 1}]
+    assert await get_or_compute("search_catalog", args, (), DownRedis(), compute) == [{"id": 1}]
+    assert compute.calls == 2
+
+
+def test_rag_results_are_not_cached():
+    # dependen del breaker de Qdrant y del rerank: no son deterministas
+    assert not tools.TOOLS["retrieve_kavak_knowledge"].cacheable
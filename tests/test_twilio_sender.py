@@ -0,0 +1,213 @@
+import time
+
+import fakeredis
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.errors import ExternalServiceError
+from app import worker
+from app.core.ratelimit import TokenBucket
+from app.llm.orchestrator import AgentEvent
+from app.services import twilio_sender
+from app.services.twilio_sender import DeliveryLog, SegmentStream, TwilioSender, _parse_retry_after, split_segments
+
+LISTING = "Opciones:\n" + "\n".join(
+    f"- Nissan Versa 20{i} · $2{i}0,000 · CDMX, automático" for i in range(10)
+) + "\n\n¿Te cotizo alguno?"
+
+
+class FakeTwilio:
+    def __init__(self, *statuses, headers=None):
+        self.statuses = list(statuses)
+        self.headers = headers or {}
+        self.bodies: list[str] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.bodies.append(dict(httpx.QueryParams(request.content.decode()))["Body"])
+        status = self.statuses.pop(0) if self.statuses else 201
+        return httpx.Response(status, headers=self.headers if status != 201 else {}, json={})
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    monkeypatch.setattr(settings, "TWILIO_RETRY_BACKOFF_S", 0.001)
+    monkeypatch.setattr(twilio_sender, "_limiters", {})
+
+
+def make_sender(handler) -> TwilioSender:
+    return TwilioSender(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+async def test_retries_429_honoring_retry_after():
+    twilio = FakeTwilio(429, 503, headers={"Retry-After": "0.05"})
+    sender = make_sender(twilio)
+    t0 = time.perf_counter()
+    await sender.send_segment("whatsapp:+52", "hola")
+    assert time.perf_counter() - t0 >= 0.1
+    assert len(twilio.bodies) == 3
+    await sender.close()
+
+
+async def test_client_errors_are_not_retried():
+    twilio = FakeTwilio(400)
+    sender = make_sender(twilio)
+    with pytest.raises(ExternalServiceError):
+        await sender.send_segment("whatsapp:+52", "hola")
+    assert len(twilio.bodies) == 1
+
+
+@pytest.mark.parametrize(
+    "error, retried",
+    [
+        (httpx.ConnectError("refused"), True),
+        (httpx.ConnectTimeout("connect"), True),
+        (httpx.PoolTimeout("pool"), True),
+        # el POST ya salió: Twilio pudo aceptarlo, reintentar duplicaría el WhatsApp
+        (httpx.ReadTimeout("read"), False),
+        (httpx.RemoteProtocolError("closed"), False),
+    ],
+)
+async def test_only_unsent_requests_are_retried(error, retried):
+    attempts = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise error
+        return httpx.Response(201, json={})
+
+    sender = make_sender(handler)
+    if retried:
+        await sender.send_segment("whatsapp:+52", "hola")
+        assert attempts == 2
+    else:
+        with pytest.raises(ExternalServiceError):
+            await sender.send_segment("whatsapp:+52", "hola")
+        assert attempts == 1
+    await sender.close()
+
+
+async def test_long_replies_are_sent_in_bullet_segments(monkeypatch):
+    monkeypatch.setattr(settings, "TWILIO_SEGMENT_MAX_CHARS", 200)
+    twilio = FakeTwilio()
+    sender = make_sender(twilio)
+    await sender.send_whatsapp("whatsapp:+52", LISTING)
+    assert len(twilio.bodies) > 1
+    assert "\n".join(twilio.bodies).replace("\n", "") == LISTING.replace("\n", "")
+
+
+def test_split_segments_cuts_before_bullets():
+    segments = split_segments(LISTING, 200)
+    assert all(len(s) <= 200 for s in segments)
+    assert all(s.startswith("- ") for s in segments[1:])
+    assert split_segments("x " * 300, 100)[0] == ("x " * 50).strip()
+    assert split_segments("corto", 100) == ["corto"]
+
+
+def test_segment_stream_releases_first_segment_early():
+    stream = SegmentStream(max_chars=1500, first_min_chars=60)
+    out: list[str] = []
+    tokens = [LISTING[i:i + 7] for i in range(0, len(LISTING), 7)]
+    emitted_at = None
+    for i, tok in enumerate(tokens):
+        ready = stream.feed(tok)
+        if ready and emitted_at is None:
+            emitted_at = i
+        out.extend(ready)
+    out.extend(stream.finish(LISTING))
+    assert emitted_at is not None and emitted_at < len(tokens) // 2
+    assert len(out) == 2
+    assert "".join(out).replace("\n", "") == LISTING.replace("\n", "")
+
+    # sin tokens (p.ej. respuesta desde cache) se usa la respuesta completa
+    assert SegmentStream(1500, 60).finish("hola") == ["hola"]
+
+
+def test_segment_stream_sends_the_final_reply_not_the_tool_preamble():
+    stream = SegmentStream(max_chars=1500, first_min_chars=60)
+    assert stream.feed("Déjame buscar eso en el catálogo…") == []
+    stream.reset()
+    out: list[str] = []
+    for i in range(0, len(LISTING), 7):
+        out.extend(stream.feed(LISTING[i:i + 7]))
+    # la respuesta final (la del historial) difiere del texto recibido por tokens
+    reply = LISTING.replace("¿Te cotizo alguno?", "¿Quieres agendar una prueba?")
+    out.extend(stream.finish(reply))
+    assert "Déjame" not in "".join(out)
+    assert "".join(out).replace("\n", "") == reply.replace("\n", "")
+
+    # lo ya enviado por un intento anterior no se repite
+    retry = SegmentStream(1500, 60, sent=out[:1])
+    assert retry.feed(reply) == []
+    assert retry.finish(reply) == out[1:]
+
+
+def test_parse_retry_after():
+    assert _parse_retry_after("3") == 3.0
+    assert _parse_retry_after(None) is None
+    assert _parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=2)
+    t0 = time.perf_counter()
+    for _ in range(7):
+        await bucket.acquire()
+    # 2 en ráfaga + 5 a 50/s ≈ 0.1s
+    assert time.perf_counter() - t0 >= 0.09
+
+
+class FlakySender:
+    def __init__(self, fail_at: int):
+        self.fail_at = fail_at
+        self.sent: list[str] = []
+
+    async def send_segment(self, to_number: str, body: str) -> None:
+        if len(self.sent) == self.fail_at:
+            self.fail_at = -1
+            raise ExternalServiceError("twilio down")
+        self.sent.append(body)
+
+
+class FakeQueue:
+    def __init__(self):
+        self.redis = fakeredis.FakeAsyncRedis()
+        self.acked: list[str] = []
+
+    async def ack(self, message_id: str) -> None:
+        self.acked.append(message_id)
+
+
+class FakeService:
+    def __init__(self):
+        self.calls = 0
+
+    async def respond(self, session, user_id, body, stream=False):
+        self.calls += 1
+        yield AgentEvent("token", {"text": "Déjame buscar…"})
+        yield AgentEvent("reset", {})
+        for i in range(0, len(LISTING), 7):
+            yield AgentEvent("token", {"text": LISTING[i:i + 7]})
+        yield AgentEvent("reply", {"text": LISTING})
+
+    async def compact_history(self, user_id: str) -> None:
+        pass
+
+
+async def test_reclaimed_message_only_sends_missing_segments(monkeypatch):
+    monkeypatch.setattr(settings, "WHATSAPP_STREAM_SEGMENTS", True)
+    monkeypatch.setattr(settings, "WHATSAPP_FIRST_SEGMENT_MIN_CHARS", 60)
+    queue, svc, sender = FakeQueue(), FakeService(), FlakySender(fail_at=1)
+    fields = {b"user_id": b"u1", b"from_number": b"whatsapp:+52", b"body": b"versa"}
+
+    await worker.process_message(queue, svc, sender, b"1-0", fields)
+    assert queue.acked == [] and len(sender.sent) == 1
+    assert (await DeliveryLog(queue.redis, "1-0").load()).pending
+
+    # el reintento no vuelve a llamar al modelo ni repite el primer segmento
+    await worker.process_message(queue, svc, sender, b"1-0", fields)
+    assert queue.acked == ["1-0"] and svc.calls == 1
+    assert "".join(sender.sent).replace("\n", "") == LISTING.replace("\n", "")
+    assert await queue.redis.exists("wa:delivery:1-0") == 0
@@ -0,0 +1,70 @@
+import fakeredis
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.versions import CATALOG, bump_version
+from app.db.models import Base, Car
+from app.tools import vocabulary
+from app.tools.normalize import normalize_make_model
+
+
+@pytest.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with Session() as s:
+        s.add_all([
+            Car(make="Nissan", model="Sentra", year=2020, price_mxn=200000, city="cdmx"),
+            Car(make="Mazda", model="Mazda3", year=2021, price_mxn=280000, city="cdmx"),
+        ])
+        await s.commit()
+        yield s
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def count_queries(monkeypatch):
+    vocabulary.invalidate_vocabulary()
+    calls = []
+    original = vocabulary.known_make_models
+
+    async def counting(session):
+        calls.append(1)
+        return await original(session)
+
+    monkeypatch.setattr(vocabulary, "known_make_models", counting)
+    yield calls
+    vocabulary.invalidate_vocabulary()
+
+
+async def test_vocabulary_is_cached_in_process(session, count_queries):
+    v1 = await vocabulary.get_vocabulary(session)
+    v2 = await vocabulary.get_vocabulary(session)
+    assert v1 is v2
+    assert v1.pairs == (("mazda", "mazda3"), ("nissan", "sentra"))
+    assert len(count_queries) == 1
+
+    norm = normalize_make_model("nisan", "sentra", v1.index)
+    assert (norm.make, norm.model) == ("nissan", "sentra")
+
+
+async def test_version_bump_reloads_and_redis_is_shared(session, count_queries, monkeypatch):
+    monkeypatch.setattr(vocabulary.settings, "VOCAB_CACHE_TTL_S", 0)
+    redis = fakeredis.FakeAsyncRedis()
+
+    await vocabulary.get_vocabulary(session, redis)
+    # Otro proceso (cache vacío) lee los pares desde Redis, no desde la DB
+    vocabulary.invalidate_vocabulary()
+    await vocabulary.get_vocabulary(session, redis)
+    assert len(count_queries) == 1
+
+    session.add(Car(make="Toyota", model="Corolla", year=2019, price_mxn=250000, city="gdl"))
+    await session.commit()
+    await bump_version(redis, CATALOG)
+
+    v = await vocabulary.get_vocabulary(session, redis)
+    assert ("toyota", "corolla") in v.pairs
+    assert v.version == 1
+    assert len(count_queries) == 2